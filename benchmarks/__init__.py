@@ -0,0 +1,5 @@
+from .genre_filter import GenreFilterBenchmarks
+from .indexes import IndexBenchmarks
+from .sqlite_tuning import SQLiteTuningBenchmarks
+from .serializers import SerializerBenchmarks
+from .renderers import RendererBenchmarks
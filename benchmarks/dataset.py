@@ -0,0 +1,112 @@
+"""Generation of a large, deterministic dataset for benchmarks"""
+import os
+import random
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rmmapi.models import Artist, Genre, List, ListFavorite, ListSong, Rater, Rating, Song, SongGenre, SongSource
+from rmmapi.models.sort_key import get_sort_key
+
+def get_scale():
+    """Number of songs to generate, set with the RMM_BENCHMARK_SONGS environment variable"""
+    return int(os.environ.get('RMM_BENCHMARK_SONGS', 20000))
+
+def generate_dataset(songs=None, seed=17):
+    """Bulk create users, raters, artists, genres, songs (with genres and sources),
+    ratings, and lists (with songs and favorites), scaled by the number of songs.
+    Returns: the key of an auth token for the first generated rater
+    """
+    songs = songs or get_scale()
+    rng = random.Random(seed)
+    now = timezone.now()
+
+    rater_count = max(songs // 100, 10)
+    artist_count = max(songs // 20, 10)
+    genre_count = 20
+    list_count = max(songs // 40, 10)
+
+    User = get_user_model()
+    User.objects.bulk_create([
+        User(id=id, username=f"user{id}", email=f"user{id}@example.com", password='!', first_name='Test', last_name=f"User {id}")
+        for id in range(1, rater_count + 1)
+    ])
+    Rater.objects.bulk_create([ Rater(id=id, user_id=id, bio='A generated rater.') for id in range(1, rater_count + 1) ])
+
+    artists = [
+        Artist(
+            id=id,
+            name=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {id}",
+            description='A generated artist.',
+            founded_year=rng.randint(1950, 2020),
+            creator_id=rng.randint(1, rater_count)
+        )
+        for id in range(1, artist_count + 1)
+    ]
+    # bulk_create skips save(), which maintains the sort keys
+    for artist in artists:
+        artist.sort_name = get_sort_key(artist.name)
+    Artist.objects.bulk_create(artists, batch_size=500)
+
+    Genre.objects.bulk_create([ Genre(id=id, name=f"Genre {id}") for id in range(1, genre_count + 1) ])
+
+    song_objects = []
+    song_genres = []
+    song_sources = []
+    ratings = []
+    for id in range(1, songs + 1):
+        raters = rng.sample(range(1, rater_count + 1), rng.randint(0, min(10, rater_count)))
+        values = [ rng.randint(1, 5) for _ in raters ]
+
+        song_objects.append(Song(
+            id=id,
+            name=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}",
+            year=rng.randint(1950, 2020),
+            artist_id=rng.randint(1, artist_count),
+            creator_id=rng.randint(1, rater_count),
+            created_at=now - timedelta(minutes=id),
+            rating_count=len(values),
+            rating_sum=sum(values),
+            avg_rating=sum(values) / len(values) if values else None
+        ))
+
+        for genre_id in rng.sample(range(1, genre_count + 1), rng.randint(1, 4)):
+            song_genres.append(SongGenre(song_id=id, genre_id=genre_id))
+
+        song_sources.append(SongSource(song_id=id, url=f"https://www.youtube.com/watch?v={id}", service='YouTube', is_primary=True))
+
+        for rater_id, value in zip(raters, values):
+            ratings.append(Rating(
+                song_id=id,
+                rater_id=rater_id,
+                rating=value,
+                review='A generated review.',
+                created_at=now - timedelta(seconds=rng.randint(0, 10 ** 7))
+            ))
+
+    for song in song_objects:
+        song.sort_name = get_sort_key(song.name)
+    Song.objects.bulk_create(song_objects, batch_size=500)
+    SongGenre.objects.bulk_create(song_genres, batch_size=500)
+    SongSource.objects.bulk_create(song_sources, batch_size=500)
+    Rating.objects.bulk_create(ratings, batch_size=500)
+
+    List.objects.bulk_create([
+        List(id=id, name=f"{rng.choice(ADJECTIVES)} list {id}", description='A generated list.', creator_id=rng.randint(1, rater_count), created_at=now)
+        for id in range(1, list_count + 1)
+    ], batch_size=500)
+    ListSong.objects.bulk_create([
+        ListSong(list_id=list_id, song_id=song_id, description='A generated list entry.')
+        for list_id in range(1, list_count + 1)
+        for song_id in rng.sample(range(1, songs + 1), min(10, songs))
+    ], batch_size=500)
+    ListFavorite.objects.bulk_create([
+        ListFavorite(list_id=list_id, rater_id=rater_id)
+        for list_id in range(1, list_count + 1)
+        for rater_id in rng.sample(range(1, rater_count + 1), rng.randint(0, min(5, rater_count)))
+    ], batch_size=500)
+
+    return Token.objects.create(user_id=1).key
+
+ADJECTIVES = [ 'Magnetic', 'Electric', 'Velvet', 'Silver', 'Neon', 'Broken', 'Golden', 'Quiet', 'Wild', 'Strange' ]
+NOUNS = [ 'Fields', 'Moon', 'Secret', 'Powers', 'Heart', 'River', 'Dream', 'Summer', 'Ghost', 'Garden' ]
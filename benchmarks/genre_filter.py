@@ -0,0 +1,89 @@
+import os
+import tempfile
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from rmmapi.cache import genre_bitmap_index
+from rmmapi.models import Song
+from rmmapi.views import SongViewSet
+from .dataset import generate_dataset
+from .timing import measure, report
+
+class GenreFilterBenchmarks(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.token = generate_dataset()
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        # the dataset is bulk created without signals, so build the bitmaps from it
+        genre_bitmap_index.clear()
+
+        # the bitmaps are only used when writes reach the other workers
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        channel_settings = override_settings(RMM_INVALIDATION_CHANNEL=os.path.join(directory.name, 'channel'))
+        channel_settings.enable()
+        self.addCleanup(channel_settings.disable)
+
+    def test_genre_filter_query_count_and_timing(self):
+        rows = []
+        query_counts = set()
+
+        for genre_mode in [ 'all', 'any' ]:
+            for genre_count in range(1, 6):
+                seconds, queries = measure(lambda: self._genre_filter_subquery(genre_count, genre_mode))
+                query_counts.add(queries)
+                rows.append((f"single subquery, genreMode={genre_mode}, {genre_count} genre(s)", seconds, queries))
+
+        for genre_mode in [ 'all', 'any' ]:
+            for genre_count in range(1, 6):
+                seconds, queries = measure(lambda: self._genre_filter(genre_count, genre_mode))
+                rows.append((f"bitmaps or subquery, genreMode={genre_mode}, {genre_count} genre(s)", seconds, queries))
+
+        for genre_count in range(1, 6):
+            with override_settings(RMM_GENRE_BITMAP_MAX_CANDIDATES=Song.objects.count()):
+                seconds, queries = measure(lambda: self._genre_filter(genre_count, 'all'))
+            rows.append((f"bitmaps up to the query parameter limit, genreMode=all, {genre_count} genre(s)", seconds, queries))
+
+        for genre_count in range(1, 6):
+            seconds, queries = measure(lambda: self._legacy_genre_filter(genre_count))
+            rows.append((f"chained joins (before), {genre_count} genre(s)", seconds, queries))
+
+        for genre_mode in [ 'all', 'any' ]:
+            def get_songs():
+                # measure the count query too, rather than a cached count
+                cache.clear()
+                self.client.get(f"/songs?genres=1,2&genreMode={genre_mode}&page=1")
+
+            seconds, queries = measure(get_songs)
+            rows.append((f"GET /songs?genres=1,2&genreMode={genre_mode}", seconds, queries))
+
+        report('Genre filter: count and first page of songs', rows)
+
+        # one count and one page query, whatever the number of genres or the mode
+        self.assertEqual(query_counts, { 2 })
+
+    def _genre_filter(self, genre_count, genre_mode):
+        genre_ids = [ str(genre_id) for genre_id in range(1, genre_count + 1) ]
+        songs = SongViewSet()._filter_by_genres(Song.objects.all(), genre_ids, genre_mode)
+
+        songs.count()
+        list(songs[:10])
+
+    def _genre_filter_subquery(self, genre_count, genre_mode):
+        genre_ids = set(range(1, genre_count + 1))
+        songs = SongViewSet()._filter_by_genres_subquery(Song.objects.all(), genre_ids, genre_mode)
+
+        songs.count()
+        list(songs[:10])
+
+    def _legacy_genre_filter(self, genre_count):
+        """Filter the way SongViewSet.list used to, with one self-join of SongGenre
+        per genre and a DISTINCT over the result"""
+        songs = Song.objects.all()
+        for genre_id in range(1, genre_count + 1):
+            songs = songs.filter(genres__genre_id=genre_id).distinct()
+
+        songs.count()
+        list(songs[:10])
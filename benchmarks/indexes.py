@@ -0,0 +1,56 @@
+from django.core.cache import cache
+from django.db import connection
+from rest_framework.test import APITestCase
+from rmmapi.cache import genre_bitmap_index
+from rmmapi.models import ListFavorite, Rating, Song
+from .dataset import generate_dataset
+from .timing import measure, report
+
+ENDPOINTS = [
+    '/ratings?userId=2&orderBy=date&page=1',
+    '/ratings?songId=2&orderBy=date&direction=desc&page=1',
+    '/songs?artist=2&orderBy=year&page=1',
+    '/songs?startYear=1990&endYear=1991&page=1',
+    '/songs?orderBy=year&direction=desc&page=1',
+    '/lists?songId=2&page=1',
+    '/lists?favoritedBy=2&page=1',
+]
+
+class IndexBenchmarks(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.token = generate_dataset()
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        genre_bitmap_index.clear()
+
+    def test_endpoint_timing_with_and_without_indexes(self):
+        rows = [ (f"GET {url} (after)", *measure(lambda: self._get(url))) for url in ENDPOINTS ]
+        rows.append(("rating of a song by a rater (after)", *measure(self._get_rating)))
+
+        # SQLite can not drop the unique constraints, which are part of their tables, so
+        # only the composite indexes are dropped for the "before" timings
+        schema_editor = connection.schema_editor()
+        indexes = [ (model, index) for model in [ Rating, ListFavorite, Song ] for index in model._meta.indexes ]
+        with connection.cursor() as cursor:
+            for model, index in indexes:
+                cursor.execute(str(index.remove_sql(model, schema_editor)))
+
+            try:
+                rows.extend((f"GET {url} (before)", *measure(lambda: self._get(url))) for url in ENDPOINTS)
+                rows.append(("rating of a song by a rater (before)", *measure(self._get_rating)))
+            finally:
+                for model, index in indexes:
+                    cursor.execute(str(index.create_sql(model, schema_editor)))
+
+        report('Filtered and sorted list endpoints, with and without composite indexes', rows)
+
+    def _get(self, url):
+        # measure the count query too, rather than a cached count
+        cache.clear()
+        self.client.get(url)
+
+    def _get_rating(self):
+        for song_id in range(1, 101):
+            Rating.objects.filter(song_id=song_id, rater_id=2).exists()
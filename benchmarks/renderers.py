@@ -0,0 +1,39 @@
+import hashlib
+import json
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.test import APITestCase
+from rmmapi.cache import serialize_fragments
+from rmmapi.helpers import get_etag
+from rmmapi.renderers import FastJSONRenderer, dumps
+from rmmapi.views.song import SongSerializer, get_song_queryset
+from .dataset import generate_dataset
+from .timing import measure, report
+
+class RendererBenchmarks(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.token = generate_dataset()
+
+    def test_render_timing(self):
+        """Rendering of a page of 100 songs to JSON, as GET /songs?pageSize=100 responds with it"""
+        page = {
+            'data': serialize_fragments(SongSerializer, get_song_queryset(), list(range(1, 101))),
+            'count': 100
+        }
+
+        rows = [
+            ('100 songs, JSONRenderer (before)', *measure(lambda: JSONRenderer().render(page), repeat=50)),
+            ('100 songs, FastJSONRenderer (after)', *measure(lambda: FastJSONRenderer().render(page), repeat=50)),
+            ('ETag of 100 songs, json module (before)', *measure(lambda: self._legacy_etag(page), repeat=50)),
+            ('ETag of 100 songs, dumps (after)', *measure(lambda: get_etag(page), repeat=50)),
+        ]
+        report('Rendering of a page of songs', rows)
+
+        self.assertEqual(FastJSONRenderer().render(page), JSONRenderer().render(page))
+        self.assertEqual(dumps(page), JSONRenderer().render(page))
+
+    def _legacy_etag(self, data):
+        """Hash data the way get_etag used to, with the json module"""
+        content = json.dumps(data, cls=JSONEncoder, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha1(content.encode()).hexdigest()
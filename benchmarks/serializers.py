@@ -0,0 +1,55 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rmmapi.cache import CachedFragmentMixin
+from rmmapi.models import List, Rating
+from rmmapi.views.artist import ArtistSerializer, get_artist_queryset
+from rmmapi.views.list import SimpleListSerializer, annotate_lists, serialize_simple_lists
+from rmmapi.views.rating import RatingSerializer, serialize_ratings
+from rmmapi.views.song import SongSerializer, get_song_queryset
+from .dataset import generate_dataset
+from .timing import measure, report
+
+# the largest page size of the list endpoints
+PAGE_SIZE = 100
+
+class SerializerBenchmarks(APITestCase):
+    """Serialization of a page of uncached objects from model instances through the
+    ModelSerializers (before), and from values() rows (after). Fragments are never cached
+    inside the transaction of a test, so every run renders every object."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.token = generate_dataset()
+
+    def test_serializer_timing(self):
+        ids = list(range(1, PAGE_SIZE + 1))
+        rows = []
+
+        for name, serializer, queryset in [
+            ('songs', SongSerializer(), get_song_queryset()),
+            ('artists', ArtistSerializer(), get_artist_queryset())
+        ]:
+            rows.append((
+                f"{PAGE_SIZE} {name}, ModelSerializer (before)",
+                *measure(lambda: self._render(CachedFragmentMixin.render_fragments(serializer, queryset, ids)))
+            ))
+            rows.append((
+                f"{PAGE_SIZE} {name}, values() rows (after)",
+                *measure(lambda: self._render(serializer.render_fragments(queryset, ids)))
+            ))
+
+        rows.append((
+            f"{PAGE_SIZE} ratings, ModelSerializer (before)",
+            *measure(lambda: self._render(RatingSerializer(Rating.objects.filter(pk__in=ids), many=True).data))
+        ))
+        rows.append((f"{PAGE_SIZE} ratings, values() rows (after)", *measure(lambda: self._render(serialize_ratings(ids)))))
+
+        rows.append((
+            f"{PAGE_SIZE} lists, ModelSerializer (before)",
+            *measure(lambda: self._render(SimpleListSerializer(annotate_lists(List.objects.filter(pk__in=ids)), many=True).data))
+        ))
+        rows.append((f"{PAGE_SIZE} lists, values() rows (after)", *measure(lambda: self._render(serialize_simple_lists(ids)))))
+
+        report('Serialization of a page of uncached objects, rendered to JSON', rows)
+
+    def _render(self, data):
+        return JSONRenderer().render(data)
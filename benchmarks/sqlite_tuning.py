@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from django.conf import settings
+from django.test import SimpleTestCase
+from rmmapi.signals.sqlite import apply_pragmas
+from .dataset import get_scale
+
+READERS = 4
+WRITERS = 2
+DURATION = 3
+
+class SQLiteTuningBenchmarks(SimpleTestCase):
+    """Concurrent reads and writes from separate processes, like gunicorn workers, on a
+    database file with SQLite's defaults and with RMM_SQLITE_PRAGMAS"""
+
+    def test_concurrent_throughput_with_and_without_pragmas(self):
+        print(f"\nSQLite: {READERS} reader and {WRITERS} writer processes for {DURATION}s each")
+        for label, pragmas in [ ('defaults (before)', {}), ('RMM_SQLITE_PRAGMAS (after)', settings.RMM_SQLITE_PRAGMAS) ]:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'db.sqlite3')
+                _create_database(path, pragmas)
+                results = _run_workers(path, pragmas)
+
+            reads = sum(ops for kind, ops, errors in results if kind == 'read')
+            writes = sum(ops for kind, ops, errors in results if kind == 'write')
+            errors = sum(errors for kind, ops, errors in results)
+            print(
+                f"  {label:<32} {reads / DURATION:>9.0f} reads/s {writes / DURATION:>7.0f} writes/s "
+                f"{errors:>5} 'database is locked' errors"
+            )
+
+def _connect(path, pragmas):
+    # autocommit, like Django, so every write is its own transaction
+    database = sqlite3.connect(path, isolation_level=None)
+    apply_pragmas(database.cursor(), pragmas)
+    return database
+
+def _create_database(path, pragmas):
+    database = _connect(path, pragmas)
+    rng = random.Random(17)
+    database.execute('CREATE TABLE song (id INTEGER PRIMARY KEY, name TEXT, year INTEGER)')
+    database.execute('CREATE INDEX song_year ON song (year)')
+    database.execute('BEGIN')
+    database.executemany(
+        'INSERT INTO song (name, year) VALUES (?, ?)',
+        ((f"Song {id}", rng.randint(1950, 2020)) for id in range(get_scale()))
+    )
+    database.execute('COMMIT')
+    database.close()
+
+def _run_workers(path, pragmas):
+    # fork, so the workers do not import Django again
+    context = multiprocessing.get_context('fork')
+    with context.Pool(READERS + WRITERS) as pool:
+        return pool.starmap(_work, [ (path, pragmas, 'read') ] * READERS + [ (path, pragmas, 'write') ] * WRITERS)
+
+def _work(path, pragmas, kind):
+    """Read or write as fast as possible for DURATION seconds
+    Returns: tuple of (kind, number of operations, number of "database is locked" errors)
+    """
+    database = _connect(path, pragmas)
+    rng = random.Random(os.getpid())
+    ops = errors = 0
+
+    end = time.monotonic() + DURATION
+    while time.monotonic() < end:
+        try:
+            if kind == 'read':
+                database.execute('SELECT id, name FROM song WHERE year = ? ORDER BY name LIMIT 10', (rng.randint(1950, 2020),)).fetchall()
+            else:
+                database.execute('INSERT INTO song (name, year) VALUES (?, ?)', ('New song', rng.randint(1950, 2020)))
+            ops += 1
+        except sqlite3.OperationalError as ex:
+            if 'locked' not in str(ex):
+                raise
+            errors += 1
+
+    database.close()
+    return kind, ops, errors
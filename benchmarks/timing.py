@@ -0,0 +1,26 @@
+"""Helpers to time code and count its queries in benchmarks"""
+import statistics
+import time
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+def measure(function, repeat=5):
+    """Run function `repeat` times after one warm-up run
+    Returns: tuple of (median seconds per run, number of queries in one run)
+    """
+    function()
+
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings), len(queries)
+
+def report(title, rows):
+    """Print the results of a benchmark as a table of (label, seconds, queries) rows"""
+    print(f"\n{title}")
+    for label, seconds, queries in rows:
+        print(f"  {label:<64} {seconds * 1000:>9.2f} ms {queries:>5} queries")
@@ -5,4 +5,13 @@ class RmmapiConfig(AppConfig):
     name = 'rmmapi'
 
     def ready(self):
+        import rmmapi.checks
         import rmmapi.signals.handlers
+        import rmmapi.signals.counts
+        import rmmapi.signals.search
+        import rmmapi.signals.genre_bitmap
+        import rmmapi.signals.fragments
+        import rmmapi.signals.tokens
+        import rmmapi.signals.stats
+        import rmmapi.signals.sqlite
+        import rmmapi.signals.instrumentation
@@ -0,0 +1,143 @@
+"""Authentication classes for the API
+
+Two token formats are accepted in the `Authorization: Token <token>` header:
+
+* database tokens - DRF Token keys, resolved with one query (or none, once cached)
+* signed tokens - HMAC-signed payloads holding the user and rater ids and an expiry,
+  verified without the database. Revoked signed tokens are kept in a denylist in the
+  cache until they would have expired anyway. That cache must be shared by every worker
+  (see rmmapi.checks), or the others keep accepting tokens revoked by one of them.
+
+Which format login and registration hand out is set by RMM_AUTH_TOKEN_FORMAT. Signed
+tokens are only accepted when it is 'signed', which is when rmmapi.checks makes sure the
+denylist is shared.
+"""
+import time
+import uuid
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, router
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rmmapi.cache import token_cache, CachedToken
+from rmmapi.models import Rater
+
+SIGNED_TOKEN_SALT = 'rmmapi.authentication.signed_token'
+
+class RaterTokenAuthentication(TokenAuthentication):
+    """Token authentication that resolves the token's user and rater in one joined query,
+    and attaches the rater to the request as `request.rater`. Users without a rater, such
+    as those made with `createsuperuser`, are authenticated with `request.rater` set to None.
+
+    Resolved tokens are kept in the token cache, so a cached token is authenticated without
+    any query. The user and rater are then only loaded with their ids, and any other field
+    is queried the first time it is read. Signed tokens never need a query."""
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            user, token = result
+            request.rater = user.rater
+        return result
+
+    def authenticate_credentials(self, key):
+        if is_signed_token(key):
+            if settings.RMM_AUTH_TOKEN_FORMAT != 'signed':
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+            payload = verify_signed_token(key)
+            return (_get_user(payload['u'], payload['r']), key)
+
+        cached_token = token_cache.get(key)
+
+        if cached_token is None:
+            # tokens are looked up on the primary, as a replica may not have a new one yet
+            try:
+                cached_token = CachedToken(*Token.objects.using(DEFAULT_DB_ALIAS).filter(
+                    key=key
+                ).values_list(
+                    'user_id', 'user__rater__id', 'user__is_active'
+                ).get())
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+            token_cache.set(key, cached_token)
+
+        if not cached_token.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (_get_user(cached_token.user_id, cached_token.rater_id), key)
+
+def create_signed_token(user_id, rater_id):
+    """Create a signed token for a user and their rater, valid for RMM_SIGNED_TOKEN_MAX_AGE seconds"""
+    issued_at = int(time.time())
+    payload = {
+        'u': user_id,
+        'r': rater_id,
+        'iat': issued_at,
+        'exp': issued_at + settings.RMM_SIGNED_TOKEN_MAX_AGE,
+        'jti': uuid.uuid4().hex
+    }
+    return signing.dumps(payload, salt=SIGNED_TOKEN_SALT, compress=True)
+
+def is_signed_token(token):
+    """Check whether a token is a signed token rather than a DRF Token key"""
+    return ':' in token
+
+def verify_signed_token(token):
+    """Check the signature, expiry and revocation of a signed token
+    Returns: the payload of the token
+    Raises: AuthenticationFailed if the token is not valid
+    """
+    try:
+        payload = signing.loads(token, salt=SIGNED_TOKEN_SALT)
+    except signing.BadSignature:
+        raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+    if payload['exp'] <= time.time():
+        raise exceptions.AuthenticationFailed(_('Token has expired.'))
+
+    token_key = _get_token_denylist_key(payload['jti'])
+    user_key = _get_user_denylist_key(payload['u'])
+    denied = cache.get_many([ token_key, user_key ])
+
+    # a user's tokens are denied if they were issued before (or as) the user was revoked
+    if token_key in denied or denied.get(user_key, -1) >= payload['iat']:
+        raise exceptions.AuthenticationFailed(_('Token has been revoked.'))
+
+    return payload
+
+def revoke_signed_token(token):
+    """Deny a signed token until it expires"""
+    payload = verify_signed_token(token)
+    cache.set(_get_token_denylist_key(payload['jti']), True, max(payload['exp'] - time.time(), 1))
+
+def revoke_user_signed_tokens(user_id):
+    """Deny every signed token issued to a user so far"""
+    cache.set(_get_user_denylist_key(user_id), int(time.time()), settings.RMM_SIGNED_TOKEN_MAX_AGE)
+
+def _get_user(user_id, rater_id):
+    """Build the user and rater (or None, for a user without one) of a token from their ids,
+    with every other field deferred"""
+    User = get_user_model()
+    user = User.from_db(router.db_for_read(User), [ 'id', 'is_active' ], [ user_id, True ])
+    if rater_id is None:
+        user.rater = None
+        return user
+
+    rater = Rater.from_db(router.db_for_read(Rater), [ 'id', 'user_id' ], [ rater_id, user_id ])
+    rater.user = user
+
+    # keep the rater with the user, for authenticate to attach to the request
+    user.rater = rater
+    return user
+
+def _get_token_denylist_key(jti):
+    return f"auth:denylist:token:{jti}"
+
+def _get_user_denylist_key(user_id):
+    return f"auth:denylist:user:{user_id}"
@@ -0,0 +1,99 @@
+"""In-process pool of idle database connections
+
+Each process keeps up to `max_size` idle connections per database. A request's
+connection is taken from the pool when it first queries the database, and given back
+when Django closes it at the end of the request, so connections are opened once and
+shared by every thread of the process, one request at a time.
+"""
+import threading
+
+class ConnectionPool:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._idle = []
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def get(self, connect, is_usable):
+        """Take an idle connection, or open a new one if none are idle
+        Method arguments:
+            connect -- function opening a new connection
+            is_usable -- function telling whether an idle connection still works
+        Returns: a connection
+        """
+        while True:
+            with self._lock:
+                if not self._idle:
+                    self.created += 1
+                    break
+                connection = self._idle.pop()
+
+            if is_usable(connection):
+                with self._lock:
+                    self.reused += 1
+                return connection
+
+            self._discard(connection)
+
+        return connect()
+
+    def put(self, connection, reset):
+        """Give a connection back to the pool, or close it if the pool is full
+        Method arguments:
+            connection -- a connection taken with get
+            reset -- function returning the connection to a clean state, which returns
+                False if that was not possible
+        """
+        if not reset(connection):
+            self._discard(connection)
+            return
+
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append(connection)
+                return
+
+        connection.close()
+
+    def clear(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+
+        for connection in idle:
+            connection.close()
+
+    def get_stats(self):
+        """Get the number of idle connections and the created, reused and discarded counters"""
+        return {
+            'idle': len(self._idle),
+            'max_size': self.max_size,
+            'created': self.created,
+            'reused': self.reused,
+            'discarded': self.discarded
+        }
+
+    def _discard(self, connection):
+        with self._lock:
+            self.discarded += 1
+
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(key, max_size):
+    """Get the pool of connections for a key identifying a database, creating it on first use"""
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(max_size)
+        return _pools[key]
+
+def get_pools():
+    """Get every pool created by this process, by key"""
+    return dict(_pools)
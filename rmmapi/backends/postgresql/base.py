@@ -0,0 +1,102 @@
+"""PostgreSQL backend with connection health checks and an optional connection pool
+
+Extends Django's PostgreSQL backend with two entries of the database settings (see
+server/database.py, which sets both from the environment):
+    CONN_HEALTH_CHECKS -- check that a connection kept from an earlier request still works
+        (with a `SELECT 1`) before its first use in a request, and reconnect if it does not
+    POOL_SIZE -- keep up to this many idle connections in a pool shared by the threads of
+        the process (see rmmapi.backends.pool), instead of closing them after each request
+"""
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+from rmmapi.backends.pool import get_pool
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    health_check_done = False
+
+    def connect(self):
+        super().connect()
+        # the connection was either just opened or checked when taken from the pool
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # called at the start and end of every request; check a kept connection again
+        # before the next request uses it
+        self.health_check_done = False
+
+    def get_new_connection(self, conn_params):
+        pool = self._get_pool()
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        connection = pool.get(
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+            self._is_idle_connection_usable
+        )
+        self.isolation_level = self.settings_dict['OPTIONS'].get('isolation_level', connection.isolation_level)
+        return connection
+
+    def _cursor(self, name=None):
+        self._close_if_health_check_failed()
+        return super()._cursor(name)
+
+    def _close(self):
+        pool = self._get_pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+
+        with self.wrap_database_errors:
+            pool.put(self.connection, _reset_connection)
+
+    def _close_if_health_check_failed(self):
+        if self.connection is None or self.health_check_done or not self.settings_dict.get('CONN_HEALTH_CHECKS'):
+            return
+
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _get_pool(self):
+        pool_size = self.settings_dict.get('POOL_SIZE', 0)
+        if not pool_size:
+            return None
+
+        # keyed by the database too, since the test runner renames the database of an alias
+        settings = self.settings_dict
+        return get_pool((self.alias, settings['NAME'], settings['HOST'], settings['PORT'], settings['USER']), pool_size)
+
+    def _is_idle_connection_usable(self, connection):
+        if connection.closed:
+            return False
+
+        if not self.settings_dict.get('CONN_HEALTH_CHECKS'):
+            return True
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
+
+def _reset_connection(connection):
+    """Roll back any transaction left open on a connection going back to the pool, and turn
+    autocommit back on, as connect() only sets up the connection state outside a transaction
+    Returns: False if the connection is closed or broken, and can not be reused
+    """
+    if connection.closed:
+        return False
+
+    status = connection.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+
+    try:
+        if status != extensions.TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+        connection.autocommit = True
+    except base.Database.Error:
+        return False
+
+    return True
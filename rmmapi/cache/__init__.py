@@ -0,0 +1,7 @@
+"""In-process and shared caches used by the API"""
+from .counts import get_count, get_generations, has_shared_generations, invalidate_counts, is_shared_cache
+from .channel import get_channel
+from .genre_bitmap import genre_bitmap_index
+from .fragments import fragment_cache, CachedFragmentMixin, serialize_fragments, CACHE_FRAGMENTS_CONTEXT
+from .tokens import token_cache, CachedToken
+from .compressed import compressed_cache
@@ -0,0 +1,145 @@
+"""Cross-process invalidation channel for the in-process caches
+
+Each worker process keeps its own in-process caches, so a write handled by one worker
+must tell the others which of their cached entries went stale. Messages are appended
+as JSON lines to a shared file, which every worker polls (a single `stat` when nothing
+changed) before reading from its caches. The file is replaced once it grows past a
+size limit; a worker that notices the replacement flushes its caches entirely, since
+it may have missed messages.
+
+The channel is disabled unless RMM_INVALIDATION_CHANNEL names the file to use.
+"""
+import json
+import os
+import threading
+import uuid
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+MAX_CHANNEL_SIZE = 1024 * 1024
+
+class InvalidationChannel:
+    # writes made by this process reach the caches of the others
+    enabled = True
+
+    def __init__(self, path, max_size=MAX_CHANNEL_SIZE):
+        self.path = path
+        self.max_size = max_size
+        # messages published by this channel are skipped when polled, since the caches
+        # of this process were already updated when they were published
+        self.id = uuid.uuid4().hex
+        self._handlers = {}
+        self._inode = None
+        self._offset = 0
+        # whether messages already in the file when it is first seen predate this process
+        self._skip_existing = True
+        self._lock = threading.Lock()
+
+    def subscribe(self, namespace, handler):
+        """Call handler(key) for every message published to namespace by another process.
+        The key is None when every entry of the namespace must be flushed."""
+        self._handlers[namespace] = handler
+
+    def publish(self, namespace, key=None):
+        """Tell other processes that the entry `key` (or everything, if None) of namespace is stale"""
+        message = json.dumps([ self.id, namespace, key ]) + '\n'
+
+        # a single write to a file opened for appending is not interleaved with others
+        with open(self.path, 'a') as channel_file:
+            channel_file.write(message)
+            size = channel_file.tell()
+
+        if size > self.max_size:
+            self._rotate()
+
+    def poll(self):
+        """Dispatch every message published by other processes since the last poll"""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                # every message of a file created from now on is published after this poll
+                self._skip_existing = False
+                return
+
+            if self._inode is None:
+                # nothing published before this process started can be stale for it
+                self._inode = stat.st_ino
+                if self._skip_existing:
+                    self._offset = stat.st_size
+                    return
+
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                self._inode, self._offset = stat.st_ino, 0
+                self._flush_all()
+
+            if stat.st_size == self._offset:
+                return
+
+            with open(self.path, 'rb') as channel_file:
+                channel_file.seek(self._offset)
+                lines = channel_file.readlines()
+
+            for line in lines:
+                if not line.endswith(b'\n'):
+                    # a message still being written, read it on the next poll
+                    break
+
+                self._offset += len(line)
+                self._dispatch(line)
+
+    def _dispatch(self, line):
+        try:
+            channel_id, namespace, key = json.loads(line.decode())
+        except ValueError:
+            return
+
+        if channel_id != self.id and namespace in self._handlers:
+            self._handlers[namespace](key)
+
+    def _flush_all(self):
+        for handler in self._handlers.values():
+            handler(None)
+
+    def _rotate(self):
+        """Replace the channel file with an empty one"""
+        replacement_path = f"{self.path}.{self.id}"
+        open(replacement_path, 'w').close()
+        os.replace(replacement_path, self.path)
+
+class DisabledChannel:
+    """Channel used when RMM_INVALIDATION_CHANNEL is not set, for single-process deployments"""
+    enabled = False
+
+    def __init__(self):
+        self._handlers = {}
+
+    def subscribe(self, namespace, handler):
+        self._handlers[namespace] = handler
+
+    def publish(self, namespace, key=None):
+        pass
+
+    def poll(self):
+        pass
+
+_channel = None
+
+def get_channel():
+    """Get the invalidation channel of this process"""
+    global _channel
+    if _channel is None:
+        path = settings.RMM_INVALIDATION_CHANNEL
+        _channel = InvalidationChannel(path) if path else DisabledChannel()
+    return _channel
+
+@receiver(setting_changed)
+def reset_channel(setting, **kwargs):
+    """Switch to the channel of a changed RMM_INVALIDATION_CHANNEL (e.g. in tests), keeping
+    the subscriptions made to the previous one"""
+    global _channel
+    if setting == 'RMM_INVALIDATION_CHANNEL' and _channel is not None:
+        handlers = _channel._handlers
+        _channel = None
+        get_channel()._handlers.update(handlers)
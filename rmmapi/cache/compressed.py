@@ -0,0 +1,63 @@
+"""In-process LRU cache of compressed response bodies
+
+The compressed body of a response is cached under a digest of its uncompressed body and
+its content coding, and responses with the same body are sent that compressed body
+instead of being compressed again. ETags are not used as keys, as one ETag can cover
+several renderings of the same data (e.g. indented JSON). The least recently used
+entries are evicted to keep the cache within RMM_COMPRESSED_CACHE_SIZE entries.
+"""
+import threading
+from collections import OrderedDict
+from django.conf import settings
+
+class CompressedBodyCache:
+    def __init__(self):
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, digest, encoding):
+        """Get the body with the given digest compressed with `encoding`, or None if it is not cached"""
+        with self._lock:
+            body = self._bodies.get((digest, encoding))
+            if body is None:
+                self.misses += 1
+                return None
+
+            self._bodies.move_to_end((digest, encoding))
+            self.hits += 1
+            return body
+
+    def set(self, digest, encoding, body):
+        """Cache the body with the given digest compressed with `encoding`"""
+        max_size = settings.RMM_COMPRESSED_CACHE_SIZE
+
+        with self._lock:
+            self._bodies[(digest, encoding)] = body
+            self._bodies.move_to_end((digest, encoding))
+
+            while len(self._bodies) > max_size:
+                self._bodies.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every body"""
+        with self._lock:
+            self._bodies.clear()
+
+    def get_stats(self):
+        """Get the size of the cache, its hit and miss counters and its number of evictions"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._bodies),
+            'max_size': settings.RMM_COMPRESSED_CACHE_SIZE,
+            'bytes': sum(len(body) for body in list(self._bodies.values())),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else None,
+            'evictions': self.evictions
+        }
+
+compressed_cache = CompressedBodyCache()
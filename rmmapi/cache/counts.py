@@ -0,0 +1,106 @@
+"""Cached total counts for the filtered list endpoints
+
+Counts are computed with COUNT(*) in SQL and cached for a short time, keyed by the
+normalized filters of the request and by a generation token for each model the count
+depends on. Writing to any of those models replaces its generation token, so cached
+counts for it are never read again. Generation tokens expire after
+RMM_GENERATION_TIMEOUT seconds, which bounds how long a process that did not see a write
+(e.g. another worker, with a process-local cache) keeps using the old generation.
+"""
+import hashlib
+import uuid
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Count
+
+# query string parameters that do not change which rows are counted
+NON_FILTER_PARAMS = ('page', 'pageSize', 'cursor', 'orderBy', 'direction', 'estimateCount')
+
+def get_count(queryset, request, depends_on):
+    """Count the rows in a filtered QuerySet, using the cache if possible
+    Method arguments:
+        queryset -- the filtered (unpaginated) QuerySet to count
+        request -- the request whose query string parameters filtered the QuerySet
+        depends_on -- models whose writes can change the count
+    Returns: tuple of (count, whether the count is only an estimate)
+    """
+    estimate = request.query_params.get('estimateCount', None) == 'true'
+    threshold = settings.RMM_COUNT_ESTIMATE_THRESHOLD
+
+    key = _get_cache_key(queryset.model, request.query_params, depends_on, estimate)
+    cached = cache.get(key)
+    if cached is not None:
+        return tuple(cached)
+
+    if estimate:
+        # stop counting once the threshold is passed, and report the threshold instead
+        count = _count(queryset, limit=threshold + 1)
+        result = (threshold, True) if count > threshold else (count, False)
+    else:
+        result = (_count(queryset), False)
+
+    cache.set(key, result, settings.RMM_COUNT_CACHE_TIMEOUT)
+    return result
+
+def invalidate_counts(model):
+    """Stop using any cached count that depends on the given model"""
+    cache.set(_get_generation_key(model), uuid.uuid4().hex, settings.RMM_GENERATION_TIMEOUT)
+
+def _count(queryset, limit=None):
+    """COUNT(*) the rows of a QuerySet. QuerySets made distinct because of a join
+    across a multi-valued relation count distinct ids instead of joined rows."""
+    queryset = queryset.order_by()
+
+    if limit is not None:
+        return queryset[:limit].count()
+
+    if queryset.query.distinct:
+        queryset.query.distinct = False
+        return queryset.aggregate(count=Count('pk', distinct=True))['count']
+
+    return queryset.count()
+
+def get_generations(models):
+    """Get the current generation token of each model, which is replaced on every write to it
+    Returns: list of tokens, in the order of models
+    """
+    generation_keys = [ _get_generation_key(model) for model in models ]
+    generations = cache.get_many(generation_keys)
+
+    for generation_key in generation_keys:
+        if generation_key not in generations:
+            # first use since the cache was cleared, so start a new generation
+            cache.add(generation_key, uuid.uuid4().hex, settings.RMM_GENERATION_TIMEOUT)
+            generations[generation_key] = cache.get(generation_key)
+
+    return [ generations[generation_key] for generation_key in generation_keys ]
+
+def has_shared_generations():
+    """Check whether generation tokens are shared by every worker, i.e. whether a write
+    handled by any of them replaces the tokens all of them read"""
+    return is_shared_cache()
+
+def is_shared_cache():
+    """Check whether the default cache is shared by every worker, rather than kept in
+    (or, for DummyCache, dropped by) each process"""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+def _get_cache_key(model, query_params, depends_on, estimate):
+    filters = sorted(
+        (param, ','.join(sorted(query_params.getlist(param))))
+        for param in query_params
+        if param not in NON_FILTER_PARAMS
+    )
+
+    key_source = repr((
+        model._meta.label_lower,
+        filters,
+        get_generations(depends_on),
+        estimate
+    ))
+    return 'counts:' + hashlib.md5(key_source.encode()).hexdigest()
+
+def _get_generation_key(model):
+    return f"counts:generation:{model._meta.label_lower}"
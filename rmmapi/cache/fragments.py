@@ -0,0 +1,207 @@
+"""In-process LRU cache of serialized song, artist and rater fragments
+
+Songs, artists and raters are nested in most responses, so the dict each serializer
+renders for them is cached, keyed by the serializer's fragment name and the primary key.
+Each fragment records the objects it was rendered from (e.g. a song fragment depends on
+its artist, genres and creator), as (model label, pk) pairs. A post_save or post_delete of
+any of those objects drops the fragment, and is published to the invalidation channel so
+other worker processes drop their copy too. Fragments also expire after
+RMM_FRAGMENT_CACHE_TTL seconds, which bounds how stale one can get when the invalidation
+channel is disabled, or when rows are written without sending signals (e.g. by
+QuerySet.update).
+
+Fragments are never read or written inside a transaction, so they never hold data that
+might still be rolled back.
+"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.db import connection, connections
+from rmmapi.instrumentation import times_serialization
+from rmmapi.routers import is_reading_from_replica, reading_from_primary
+from .channel import get_channel
+
+CHANNEL_NAMESPACE = 'fragments'
+
+# serializer context under which rendered fragments are stored in the cache; only
+# set by read paths, whose instances were loaded fresh from the database
+CACHE_FRAGMENTS_CONTEXT = { 'cache_fragments': True }
+
+class FragmentCache:
+    def __init__(self):
+        self._fragments = OrderedDict()
+        self._dependencies = {}
+        self._dependents = {}
+        self._lock = threading.Lock()
+        self._subscribed = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Get a cached fragment, or None if it is not cached"""
+        if connection.in_atomic_block:
+            return None
+
+        self._poll()
+
+        with self._lock:
+            entry = self._fragments.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                self._discard(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._fragments.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, data, dependencies):
+        """Cache a fragment
+        Method arguments:
+            key -- tuple of (fragment name, pk)
+            data -- the rendered fragment
+            dependencies -- (model label, pk) pairs of every object the fragment was rendered from
+        """
+        if connection.in_atomic_block:
+            return
+
+        expires_at = time.monotonic() + settings.RMM_FRAGMENT_CACHE_TTL
+        max_size = settings.RMM_FRAGMENT_CACHE_SIZE
+
+        with self._lock:
+            self._discard(key)
+            self._fragments[key] = (data, expires_at)
+            self._dependencies[key] = dependencies
+            for dependency in dependencies:
+                self._dependents.setdefault(dependency, set()).add(key)
+
+            while len(self._fragments) > max_size:
+                self._discard(next(iter(self._fragments)))
+                self.evictions += 1
+
+    def invalidate(self, label, pk, publish=True):
+        """Drop every fragment rendered from the object with model label `label` and pk"""
+        with self._lock:
+            for key in list(self._dependents.get((label, pk), ())):
+                self._discard(key)
+
+        if publish:
+            get_channel().publish(CHANNEL_NAMESPACE, [ label, pk ])
+
+    def clear(self):
+        """Drop every fragment"""
+        with self._lock:
+            self._fragments.clear()
+            self._dependencies.clear()
+            self._dependents.clear()
+
+    def get_stats(self):
+        """Get the size of the cache, its hit and miss counters and its number of evictions"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._fragments),
+            'max_size': settings.RMM_FRAGMENT_CACHE_SIZE,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else None,
+            'evictions': self.evictions
+        }
+
+    def _discard(self, key):
+        if self._fragments.pop(key, None) is None:
+            return
+
+        for dependency in self._dependencies.pop(key):
+            dependents = self._dependents[dependency]
+            dependents.discard(key)
+            if not dependents:
+                del self._dependents[dependency]
+
+    def _poll(self):
+        channel = get_channel()
+        if not self._subscribed:
+            channel.subscribe(CHANNEL_NAMESPACE, self._handle_message)
+            self._subscribed = True
+
+        channel.poll()
+
+    def _handle_message(self, message):
+        if message is None:
+            self.clear()
+        else:
+            self.invalidate(*message, publish=False)
+
+fragment_cache = FragmentCache()
+
+class CachedFragmentMixin:
+    """Mixin for a ModelSerializer whose rendered instances are cached as fragments.
+    Serializers using it set `fragment_name` and implement `get_fragment_dependencies(data)`,
+    and may override `render_fragments` to render many objects without building instances."""
+    fragment_name = None
+
+    def to_representation(self, instance):
+        data = fragment_cache.get((self.fragment_name, instance.pk))
+        if data is None:
+            data = self.render_fragment(instance)
+        return data
+
+    def render_fragment(self, instance):
+        """Render an instance, caching it if the serializer context allows"""
+        data = super().to_representation(instance)
+        self.cache_fragment(instance.pk, data)
+        return data
+
+    def render_fragments(self, queryset, ids):
+        """Render (and cache) the objects with the given ids
+        Method arguments:
+            queryset -- QuerySet to load the objects from
+            ids -- primary keys of the objects
+        Returns: dictionary of rendered fragments by pk, without the ids that have no object
+        """
+        return { instance.pk: self.render_fragment(instance) for instance in queryset.filter(pk__in=ids) }
+
+    def cache_fragment(self, pk, data):
+        """Cache the fragment rendered for the object with pk, if the serializer context allows
+        and it was not read from a replica, which may not have caught up with the primary"""
+        if self.context.get('cache_fragments', False) and not is_reading_from_replica():
+            dependencies = [ (self.Meta.model._meta.label_lower, pk) ]
+            dependencies.extend(self.get_fragment_dependencies(data))
+            fragment_cache.set((self.fragment_name, pk), data, dependencies)
+
+    def get_fragment_dependencies(self, data):
+        """Get (model label, pk) pairs of the related objects rendered in data"""
+        return []
+
+@times_serialization
+def serialize_fragments(serializer_class, queryset, ids):
+    """Serialize the objects with the given ids, in order, from cached fragments, only
+    querying for (and caching) those not in the cache yet. Ids with no object are skipped.
+    Method arguments:
+        serializer_class -- a serializer using CachedFragmentMixin
+        queryset -- QuerySet to load uncached objects from
+        ids -- primary keys of the objects
+    Returns: list of rendered fragments
+    """
+    fragments = {}
+    missing_ids = []
+    for id in ids:
+        data = fragment_cache.get((serializer_class.fragment_name, id))
+        if data is None:
+            missing_ids.append(id)
+        else:
+            fragments[id] = data
+
+    if missing_ids:
+        serializer = serializer_class(context=CACHE_FRAGMENTS_CONTEXT)
+        with reading_from_primary():
+            # render no more objects at once than the database takes ids as query parameters
+            batch_size = connections[queryset.db].features.max_query_params or len(missing_ids)
+            for start in range(0, len(missing_ids), batch_size):
+                fragments.update(serializer.render_fragments(queryset, missing_ids[start:start + batch_size]))
+
+    return [ fragments[id] for id in ids if id in fragments ]
@@ -0,0 +1,164 @@
+"""In-process bitmap index of the songs in each genre
+
+Genres are a small set that rarely changes, so rather than joining SongGenre to filter
+songs by genre, each process keeps a bitmap per genre (a Python int, with bit n set if
+the song with id n has the genre). Intersecting or uniting the bitmaps of the requested
+genres gives the candidate song ids before any SQL runs.
+
+The index is built from SongGenre on first use and kept up to date by SongGenre
+post_save and post_delete handlers, as their writes commit. Other worker processes apply
+the same changes when they receive them through the invalidation channel, so with the
+channel disabled the bitmaps only know of the writes of their own process, and are not
+used to filter songs (see SongViewSet._filter_by_genres). The index is also rebuilt every
+RMM_GENRE_BITMAP_TTL seconds, so one that missed changes does not stay wrong for longer.
+"""
+import threading
+import time
+from functools import reduce
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rmmapi.models import SongGenre
+from .channel import get_channel
+
+CHANNEL_NAMESPACE = 'genre_bitmap'
+
+# times a rebuild is retried when the bitmaps change while it reads SongGenre
+MAX_BUILD_ATTEMPTS = 3
+
+# the positions of the set bits of every byte value
+BYTE_BITS = [ tuple(bit for bit in range(8) if byte & (1 << bit)) for byte in range(256) ]
+
+class GenreBitmapIndex:
+    def __init__(self):
+        self._bitmaps = None
+        self._expires_at = 0
+        # incremented by every change, so a rebuild can tell whether one happened while it
+        # read SongGenre (which it may then have read from before the change committed)
+        self._version = 0
+        self._lock = threading.Lock()
+        self._subscribed = False
+
+    def get_song_ids(self, genre_ids, genre_mode, limit):
+        """Get the ids of songs with all (or, if genre_mode is `any`, any) of the genre ids
+        Returns: sorted list of song ids, or None if there are more than limit of them or
+            the bitmaps could not be built
+        """
+        bitmaps = self._get_bitmaps()
+        if bitmaps is None:
+            return None
+
+        genre_bitmaps = [ bitmaps.get(genre_id, 0) for genre_id in genre_ids ]
+
+        if not genre_bitmaps:
+            return []
+
+        if genre_mode == 'any':
+            songs_bitmap = reduce(lambda a, b: a | b, genre_bitmaps)
+        else:
+            songs_bitmap = reduce(lambda a, b: a & b, genre_bitmaps)
+
+        if bin(songs_bitmap).count('1') > limit:
+            return None
+
+        return _get_set_bits(songs_bitmap)
+
+    def add(self, genre_id, song_id, publish=True):
+        """Record that a song has a genre"""
+        with self._lock:
+            self._version += 1
+            if self._bitmaps is not None:
+                self._bitmaps[genre_id] = self._bitmaps.get(genre_id, 0) | (1 << song_id)
+
+        if publish:
+            get_channel().publish(CHANNEL_NAMESPACE, [ 'add', genre_id, song_id ])
+
+    def remove(self, genre_id, song_id, publish=True):
+        """Record that a song no longer has a genre"""
+        with self._lock:
+            self._version += 1
+            if self._bitmaps is not None:
+                self._bitmaps[genre_id] = self._bitmaps.get(genre_id, 0) & ~(1 << song_id)
+
+        if publish:
+            get_channel().publish(CHANNEL_NAMESPACE, [ 'remove', genre_id, song_id ])
+
+    def clear(self):
+        """Drop the index, so it is rebuilt on next use"""
+        with self._lock:
+            self._version += 1
+            self._bitmaps = None
+
+    def _get_bitmaps(self):
+        channel = get_channel()
+        if not self._subscribed:
+            channel.subscribe(CHANNEL_NAMESPACE, self._handle_message)
+            self._subscribed = True
+
+        channel.poll()
+
+        bitmaps = self._bitmaps
+        if bitmaps is None or self._expires_at <= time.monotonic():
+            bitmaps = self._rebuild()
+
+        return bitmaps
+
+    def _rebuild(self):
+        """Replace the bitmaps with ones built from SongGenre, unless they changed while it
+        was read, as the new ones would then be missing the change
+        Returns: the new bitmaps, or None if they kept changing
+        """
+        for _ in range(MAX_BUILD_ATTEMPTS):
+            with self._lock:
+                version = self._version
+
+            expires_at = time.monotonic() + settings.RMM_GENRE_BITMAP_TTL
+            bitmaps = self._build()
+
+            with self._lock:
+                if self._version == version:
+                    self._bitmaps = bitmaps
+                    self._expires_at = expires_at
+                    return bitmaps
+
+        return None
+
+    def _build(self):
+        """Build the bitmaps of every genre from SongGenre, read from the primary since
+        they are only updated as writes are made to it"""
+        song_ids_by_genre = {}
+        song_genres = SongGenre.objects.using(DEFAULT_DB_ALIAS).values_list('genre_id', 'song_id')
+        for genre_id, song_id in song_genres.iterator():
+            song_ids_by_genre.setdefault(genre_id, []).append(song_id)
+
+        return {
+            genre_id: _get_bitmap(song_ids)
+            for genre_id, song_ids in song_ids_by_genre.items()
+        }
+
+    def _handle_message(self, message):
+        if message is None:
+            self.clear()
+            return
+
+        operation, genre_id, song_id = message
+        if operation == 'add':
+            self.add(genre_id, song_id, publish=False)
+        else:
+            self.remove(genre_id, song_id, publish=False)
+
+def _get_bitmap(ids):
+    """Build a bitmap from ids in one pass, rather than setting one bit of an int at a time"""
+    data = bytearray(max(ids) // 8 + 1)
+    for id in ids:
+        data[id // 8] |= 1 << (id % 8)
+    return int.from_bytes(data, 'little')
+
+def _get_set_bits(bitmap):
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    ids = []
+    for byte_index, byte in enumerate(data):
+        if byte:
+            ids.extend(byte_index * 8 + bit for bit in BYTE_BITS[byte])
+    return ids
+
+genre_bitmap_index = GenreBitmapIndex()
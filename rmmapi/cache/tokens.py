@@ -0,0 +1,123 @@
+"""In-process LRU cache of authentication tokens
+
+Maps each token key seen by this process to a (user id, rater id, is active) tuple, so
+authenticating a request does not query the database once its token is cached. Entries
+expire after RMM_TOKEN_CACHE_TTL seconds, and are dropped as soon as their Token, User or
+Rater is changed or deleted, in this process and (through the invalidation channel) in
+every other worker.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from django.conf import settings
+from .channel import get_channel
+
+CHANNEL_NAMESPACE = 'tokens'
+
+CachedToken = namedtuple('CachedToken', [ 'user_id', 'rater_id', 'is_active' ])
+
+class TokenCache:
+    def __init__(self):
+        self._tokens = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+        self._subscribed = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Get the CachedToken for a token key, or None if it is not cached"""
+        self._poll()
+
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                self._discard(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._tokens.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, cached_token):
+        """Cache the CachedToken of a token key"""
+        expires_at = time.monotonic() + settings.RMM_TOKEN_CACHE_TTL
+        max_size = settings.RMM_TOKEN_CACHE_SIZE
+
+        with self._lock:
+            self._discard(key)
+            self._tokens[key] = (cached_token, expires_at)
+            self._keys_by_user.setdefault(cached_token.user_id, set()).add(key)
+
+            while len(self._tokens) > max_size:
+                self._discard(next(iter(self._tokens)))
+                self.evictions += 1
+
+    def invalidate_key(self, key, publish=True):
+        """Drop a token key"""
+        with self._lock:
+            self._discard(key)
+
+        if publish:
+            get_channel().publish(CHANNEL_NAMESPACE, [ 'key', key ])
+
+    def invalidate_user(self, user_id, publish=True):
+        """Drop every token key of a user"""
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._discard(key)
+
+        if publish:
+            get_channel().publish(CHANNEL_NAMESPACE, [ 'user', user_id ])
+
+    def clear(self):
+        """Drop every token key"""
+        with self._lock:
+            self._tokens.clear()
+            self._keys_by_user.clear()
+
+    def get_stats(self):
+        """Get the size of the cache, its hit and miss counters and its number of evictions"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._tokens),
+            'max_size': settings.RMM_TOKEN_CACHE_SIZE,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else None,
+            'evictions': self.evictions
+        }
+
+    def _discard(self, key):
+        entry = self._tokens.pop(key, None)
+        if entry is None:
+            return
+
+        user_id = entry[0].user_id
+        keys = self._keys_by_user[user_id]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_user[user_id]
+
+    def _poll(self):
+        channel = get_channel()
+        if not self._subscribed:
+            channel.subscribe(CHANNEL_NAMESPACE, self._handle_message)
+            self._subscribed = True
+
+        channel.poll()
+
+    def _handle_message(self, message):
+        if message is None:
+            self.clear()
+        elif message[0] == 'key':
+            self.invalidate_key(message[1], publish=False)
+        else:
+            self.invalidate_user(message[1], publish=False)
+
+token_cache = TokenCache()
@@ -0,0 +1,41 @@
+"""System checks of the API's settings"""
+from django.conf import settings
+from django.core import checks
+from rmmapi.cache import is_shared_cache
+
+@checks.register(checks.Tags.security, checks.Tags.caches)
+def check_signed_token_denylist(app_configs, **kwargs):
+    """Signed tokens are revoked by denylisting them in the default cache, which every
+    worker must see, so a process-local cache would let revoked tokens through"""
+    if settings.RMM_AUTH_TOKEN_FORMAT != 'signed' or is_shared_cache():
+        return []
+
+    return [
+        checks.Error(
+            "RMM_AUTH_TOKEN_FORMAT = 'signed' requires a default cache shared by every worker.",
+            hint="Revoked signed tokens are denylisted in the default cache; with a process-local "
+                 "cache (LocMemCache or DummyCache), other workers keep accepting them until they "
+                 "expire. Use a shared backend such as Redis or Memcached in CACHES.",
+            id='rmmapi.E001'
+        )
+    ]
+
+@checks.register(checks.Tags.database, checks.Tags.caches)
+def check_replica_sticky_cache(app_configs, **kwargs):
+    """Requests made with a token that just wrote are kept on the primary by a marker in the
+    default cache, which every worker must see, so a process-local cache would send them to
+    a replica that may not have their writes yet"""
+    if settings.RMM_REPLICA_DATABASE is None or is_shared_cache():
+        return []
+
+    return [
+        checks.Error(
+            "RMM_REPLICA_DATABASE requires a default cache shared by every worker.",
+            hint="Clients that write keep reading from the primary for RMM_REPLICA_STICKY_SECONDS, "
+                 "which is recorded in the default cache; with a process-local cache (LocMemCache "
+                 "or DummyCache), their next request to another worker reads from the replica "
+                 "and may miss their own writes. Use a shared backend such as Redis or Memcached "
+                 "in CACHES.",
+            id='rmmapi.E002'
+        )
+    ]
@@ -0,0 +1,80 @@
+"""gzip and brotli compression of response bodies
+
+Brotli is used when the `brotli` package is installed and the client accepts it, as it
+compresses JSON better than gzip at the same speed; otherwise gzip is used.
+"""
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# content types worth compressing; others (e.g. images) are already compressed
+COMPRESSIBLE_TYPES = { 'application/json', 'application/javascript', 'application/xml' }
+
+def get_encodings():
+    """Get the content codings this process can compress with, most preferred first"""
+    return [ 'br', 'gzip' ] if brotli is not None else [ 'gzip' ]
+
+def negotiate_encoding(accept_encoding):
+    """Pick the content coding to compress a response with
+    Method arguments:
+        accept_encoding -- the Accept-Encoding header of the request
+    Returns: 'br', 'gzip', or None if the client accepts neither
+    """
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, *params = [ part.strip() for part in item.split(';') ]
+        if not coding:
+            continue
+
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        qualities[coding.lower()] = quality
+
+    for encoding in get_encodings():
+        if qualities.get(encoding, qualities.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+def is_compressible(content_type):
+    """Check whether a response with the given Content-Type is worth compressing"""
+    media_type = content_type.split(';')[0].strip().lower()
+    return media_type.startswith('text/') or media_type.endswith('+json') or media_type in COMPRESSIBLE_TYPES
+
+def compress(content, encoding):
+    """Compress a response body with the content coding `encoding`"""
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+def compress_stream(chunks, encoding):
+    """Compress the chunks of a streaming response body as they are produced, flushing
+    after each one so the client receives them without waiting for the end of the stream"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
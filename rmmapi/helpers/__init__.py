@@ -1,2 +1,6 @@
 from .get_missing_keys import get_missing_keys
 from .paginate import paginate
+from .cursor_paginate import cursor_paginate
+from .etags import get_etag, get_generation_etag, is_not_modified, not_modified_response, conditional_response
+from .fan_out import fan_out
+from .rows import RowRenderer, Arg
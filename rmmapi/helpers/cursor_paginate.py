@@ -0,0 +1,103 @@
+import base64
+import binascii
+import datetime
+import json
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from django.db.models.expressions import OrderBy
+from .paginate import get_page_size
+
+def cursor_paginate(queryset, cursor, page_size):
+    """Return one page of a QuerySet using keyset pagination, so that every page
+    costs the same as the first one no matter how deep it is.
+
+    The QuerySet is paged by its active ordering (its first `order_by` field, or id
+    if it is unordered) with id as a tie-breaker. An empty or invalid cursor, including
+    one whose key does not fit the sort field (say, one taken under another orderBy),
+    returns the first page.
+    Returns: tuple of (list of objects in the page, cursor for the next page or None)
+    """
+    page_size = get_page_size(page_size)
+    sort_key, descending = _get_sort_key(queryset)
+
+    queryset = queryset.annotate(cursor_key=sort_key)
+    if descending:
+        queryset = queryset.order_by(F('cursor_key').desc(nulls_last=True), F('id').desc())
+    else:
+        queryset = queryset.order_by(F('cursor_key').asc(nulls_first=True), F('id').asc())
+
+    position = _decode_cursor(cursor, queryset.query.annotations['cursor_key'].output_field)
+    if position is not None:
+        queryset = queryset.filter(_after_position(*position, descending))
+
+    # fetch one extra row to find out whether there is another page
+    page = list(queryset[:page_size + 1])
+    if len(page) <= page_size:
+        return page, None
+
+    page = page[:page_size]
+    last = page[-1]
+    return page, _encode_cursor(last.cursor_key, last.id)
+
+def _get_sort_key(queryset):
+    """Get the expression a QuerySet is primarily ordered by, and whether it is descending"""
+    if not queryset.query.order_by:
+        return F('id'), False
+
+    order_field = queryset.query.order_by[0]
+
+    if isinstance(order_field, OrderBy):
+        return order_field.expression, order_field.descending
+
+    if order_field.startswith('-'):
+        return F(order_field[1:]), True
+
+    return F(order_field), False
+
+def _after_position(key, id, descending):
+    """Build a filter matching every row that sorts after the row with the given key and id.
+    NULL keys sort first in ascending order and last in descending order."""
+    if descending:
+        if key is None:
+            return Q(cursor_key__isnull=True, id__lt=id)
+        return Q(cursor_key__lt=key) | Q(cursor_key=key, id__lt=id) | Q(cursor_key__isnull=True)
+
+    if key is None:
+        return Q(cursor_key__isnull=True, id__gt=id) | Q(cursor_key__isnull=False)
+    return Q(cursor_key__gt=key) | Q(cursor_key=key, id__gt=id)
+
+class CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder that keeps the microseconds of datetimes and times, which it
+    would truncate to milliseconds, so that a cursor key equals the key it was taken from"""
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+def _encode_cursor(key, id):
+    data = json.dumps([ key, id ], cls=CursorEncoder)
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor, output_field):
+    """Decode a cursor into a (key, id) tuple, with the key converted to the Python type
+    of the sort field, or None if it is empty or invalid"""
+    if not cursor:
+        return None
+
+    try:
+        padded_cursor = cursor + '=' * (-len(cursor) % 4)
+        key, id = json.loads(base64.urlsafe_b64decode(padded_cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+
+    if not isinstance(id, int) or not isinstance(key, (str, int, float, type(None))):
+        return None
+
+    if key is not None:
+        try:
+            key = output_field.to_python(key)
+        except (ValidationError, ValueError, TypeError):
+            return None
+
+    return key, id
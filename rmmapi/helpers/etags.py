@@ -0,0 +1,66 @@
+"""Strong ETags and conditional GET responses for the read endpoints
+
+An ETag is either a hash of the response data, or, where the data is expensive to build
+and a cache shared by every worker is configured, a hash of the generation tokens of
+every model it is built from (see rmmapi.cache.counts), which lets the view answer
+`304 Not Modified` before running any query. Process-local generation tokens do not
+change on writes handled by other workers, so they are never used for ETags. Nor are
+generation tokens used without the invalidation channel (see rmmapi.cache.channel), as
+the data is built from in-process fragments, which another worker's write would leave
+stale in this one while the tokens it hashes move on.
+"""
+import hashlib
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from rmmapi.cache import get_channel, get_generations, has_shared_generations
+from rmmapi.instrumentation import times_serialization
+from rmmapi.renderers import dumps
+
+@times_serialization
+def get_etag(data):
+    """Build a strong ETag from the content of response data"""
+    return quote_etag(hashlib.sha1(dumps(data, sort_keys=True)).hexdigest())
+
+def get_generation_etag(depends_on, *parts):
+    """Build a strong ETag that changes whenever any of the depends_on models is written to
+    Method arguments:
+        depends_on -- models the response data is built from
+        parts -- anything else the response data varies with, e.g. the requesting rater
+    Returns: the ETag, or None if the cache is not shared by every worker or in-process
+        fragments are not invalidated across workers
+    """
+    if not has_shared_generations() or not get_channel().enabled:
+        return None
+
+    key_source = repr((get_generations(depends_on), parts))
+    return quote_etag(hashlib.sha1(key_source.encode()).hexdigest())
+
+def is_not_modified(request, etag):
+    """Check whether the If-None-Match header of a request matches etag"""
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', None)
+    if not if_none_match:
+        return False
+
+    # If-None-Match uses the weak comparison, so ignore W/ prefixes
+    etags = [ tag[2:] if tag.startswith('W/') else tag for tag in parse_etags(if_none_match) ]
+    return '*' in etags or etag in etags
+
+def not_modified_response(etag):
+    """Build a `304 Not Modified` response for etag"""
+    return Response(status=status.HTTP_304_NOT_MODIFIED, headers={ 'ETag': etag })
+
+def conditional_response(request, data, etag=None):
+    """Respond with data and its ETag, or with `304 Not Modified` if the client's copy is current
+    Method arguments:
+        request -- the GET request
+        data -- the response data
+        etag -- ETag of data, if already known; otherwise it is hashed from data
+    """
+    if etag is None:
+        etag = get_etag(data)
+
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    return Response(data, headers={ 'ETag': etag })
@@ -0,0 +1,103 @@
+"""Running the independent parts of a request concurrently
+
+Each branch runs in a thread of a pool shared by the process, with the thread's own
+database connection, and in a copy of the request's context, so rmmapi.routers still
+routes its queries like the request's. Connections are opened and closed around each
+branch the way they are around a request, so CONN_MAX_AGE applies to them too.
+
+The threads cannot see the rows of a transaction that is still open in the request's
+thread, so branches started inside one run in the request's thread, one after another.
+"""
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# number of threads the executor started so far
+_thread_count = 0
+
+def fan_out(branches, timeout):
+    """Run functions concurrently, and wait up to `timeout` seconds for them to finish
+    Method arguments:
+        branches -- dictionary of functions taking no arguments, by name
+        timeout -- seconds to wait for the branches, after which the ones still running
+            are left to finish in the background and their results are dropped
+    Returns: dictionary of the results of the branches that finished, by name, and the
+        list of the names of those that timed out
+    Raises: the exception of the first branch that failed
+    """
+    if not _can_fan_out():
+        return { name: branch() for name, branch in branches.items() }, []
+
+    executor = _get_executor()
+    futures = {
+        name: executor.submit(contextvars.copy_context().run, _run_branch, branch)
+        for name, branch in branches.items()
+    }
+    wait(futures.values(), timeout=timeout)
+
+    results = {}
+    timed_out = []
+    for name, future in futures.items():
+        if future.done():
+            results[name] = future.result()
+        else:
+            future.cancel()
+            timed_out.append(name)
+
+    return results, timed_out
+
+def _run_branch(branch):
+    close_old_connections()
+    try:
+        return branch()
+    finally:
+        close_old_connections()
+
+def _can_fan_out():
+    if settings.RMM_FAN_OUT_WORKERS < 1:
+        return False
+    return not any(connection.in_atomic_block for connection in connections.all())
+
+def shutdown():
+    """Close the database connections kept by the threads of the pool, and stop them.
+    The pool is started again by the next fan_out."""
+    global _executor, _thread_count
+    with _executor_lock:
+        executor, _executor = _executor, None
+        thread_count, _thread_count = _thread_count, 0
+
+    if executor is None:
+        return
+
+    # connections belong to the thread that opened them, so have every thread close its
+    # own, waiting for the others so that no thread runs two of these
+    if thread_count:
+        barrier = threading.Barrier(thread_count)
+        def close_connections():
+            connections.close_all()
+            barrier.wait()
+
+        for _ in range(thread_count):
+            executor.submit(close_connections)
+
+    executor.shutdown(wait=True)
+
+def _count_thread():
+    global _thread_count
+    with _executor_lock:
+        _thread_count += 1
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RMM_FAN_OUT_WORKERS, thread_name_prefix='rmm-fan-out',
+                initializer=_count_thread
+            )
+        return _executor
@@ -1,15 +1,28 @@
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+def get_page_size(page_size):
+    """Parse a requested page size, falling back to the default if it is invalid
+    and capping it at MAX_PAGE_SIZE"""
+    try:
+        page_size = int(page_size)
+    except ValueError:
+        page_size = DEFAULT_PAGE_SIZE
+
+    if page_size < 1:
+        page_size = DEFAULT_PAGE_SIZE
+
+    return min(page_size, MAX_PAGE_SIZE)
+
 def paginate(collection, page, page_size):
     try:
         page = int(page)
     except ValueError:
         page = 1
 
-    try:
-        page_size = int(page_size)
-    except ValueError:
-        page_size = 10
+    page_size = get_page_size(page_size)
 
-    page = page - 1
+    page = max(page - 1, 0)
     start_index = (page * page_size)
     end_index = ((page + 1) * page_size)
     return collection[start_index:end_index]
@@ -0,0 +1,190 @@
+"""Per-request instrumentation of queries, database time, serialization time and size
+
+InstrumentationMiddleware keeps the RequestMetrics of each request in a context
+variable, which rmmapi.helpers.fan_out copies into its threads along with the rest of
+the request's context. Every database connection runs its queries through `time_query`
+(installed as each connection is created, see rmmapi.signals.instrumentation), which
+counts them and their time against the metrics of the request running them, whichever
+database or thread they run on. Serialization is timed by the functions decorated with
+`times_serialization`, less the time of the queries they run.
+
+The metrics of finished requests are aggregated per endpoint, named after the viewset
+and action that handled it (e.g. `song-list` or `list-retrieve`), in `endpoint_metrics`,
+whose statistics /metrics reports.
+"""
+import functools
+import threading
+import time
+from contextvars import ContextVar
+
+# RequestMetrics of the request being handled, or None outside of a request
+_request_metrics = ContextVar('request_metrics', default=None)
+
+# one-item list accumulating the time of the queries run by the serialization being
+# timed, or None outside of one
+_serialization_db_time = ContextVar('serialization_db_time', default=None)
+
+class RequestMetrics:
+    """Metrics of a single request. Times are in seconds, summed over the threads of the request."""
+    def __init__(self):
+        self.endpoint = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self._lock = threading.Lock()
+
+    def add_query(self, duration):
+        with self._lock:
+            self.queries += 1
+            self.db_time += duration
+
+    def add_serialization(self, duration):
+        with self._lock:
+            self.serialization_time += duration
+
+def start_request():
+    """Start collecting the metrics of a request in the current context
+    Returns: the RequestMetrics, and a token to pass to stop_request
+    """
+    metrics = RequestMetrics()
+    return metrics, _request_metrics.set(metrics)
+
+def stop_request(token):
+    """Stop collecting the metrics of the request started with `token`"""
+    _request_metrics.reset(token)
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper counting each query and its time against the current request"""
+    metrics = _request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        metrics.add_query(duration)
+
+        serialization_db_time = _serialization_db_time.get()
+        if serialization_db_time is not None:
+            serialization_db_time[0] += duration
+
+def install_query_timer(connection):
+    """Run every query of a database connection through time_query"""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+def times_serialization(function):
+    """Decorator counting the time a function takes, less that of its queries, as
+    serialization time of the current request. Calls nested in one already being timed
+    are not counted again."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        metrics = _request_metrics.get()
+        if metrics is None or _serialization_db_time.get() is not None:
+            return function(*args, **kwargs)
+
+        db_time = [ 0.0 ]
+        token = _serialization_db_time.set(db_time)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            _serialization_db_time.reset(token)
+            metrics.add_serialization(max(duration - db_time[0], 0.0))
+
+    return wrapper
+
+def get_server_timing(metrics, duration):
+    """Get the Server-Timing header value of a request's metrics
+    Method arguments:
+        metrics -- the RequestMetrics of the request
+        duration -- seconds the request took in total
+    Returns: string
+    """
+    return ', '.join([
+        f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.queries} queries"',
+        f'serialization;dur={metrics.serialization_time * 1000:.2f}',
+        f'total;dur={duration * 1000:.2f}'
+    ])
+
+# statistics aggregated for each endpoint, of which both the total and maximum are kept
+ENDPOINT_FIELDS = [ 'queries', 'db_ms', 'serialization_ms', 'duration_ms', 'size' ]
+
+class EndpointMetrics:
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, metrics, duration, size):
+        """Add the metrics of a finished request to those of its endpoint
+        Method arguments:
+            metrics -- the RequestMetrics of the request, whose endpoint must be set
+            duration -- seconds the request took in total
+            size -- bytes of the response body
+        """
+        values = {
+            'queries': metrics.queries,
+            'db_ms': metrics.db_time * 1000,
+            'serialization_ms': metrics.serialization_time * 1000,
+            'duration_ms': duration * 1000,
+            'size': size
+        }
+
+        with self._lock:
+            endpoint = self._endpoints.get(metrics.endpoint)
+            if endpoint is None:
+                endpoint = self._endpoints[metrics.endpoint] = {
+                    'requests': 0,
+                    'totals': dict.fromkeys(ENDPOINT_FIELDS, 0),
+                    'maxima': dict.fromkeys(ENDPOINT_FIELDS, 0)
+                }
+
+            endpoint['requests'] += 1
+            for field, value in values.items():
+                endpoint['totals'][field] += value
+                endpoint['maxima'][field] = max(endpoint['maxima'][field], value)
+
+    def clear(self):
+        """Drop the metrics of every endpoint"""
+        with self._lock:
+            self._endpoints.clear()
+
+    def get_stats(self):
+        """Get the number of requests to each endpoint, and the average and maximum of each statistic of them"""
+        with self._lock:
+            return {
+                name: {
+                    'requests': endpoint['requests'],
+                    **{
+                        field: {
+                            'avg': endpoint['totals'][field] / endpoint['requests'],
+                            'max': endpoint['maxima'][field]
+                        }
+                        for field in ENDPOINT_FIELDS
+                    }
+                }
+                for name, endpoint in sorted(self._endpoints.items())
+            }
+
+endpoint_metrics = EndpointMetrics()
+
+def get_endpoint_name(view_func, method):
+    """Name the endpoint a request is routed to
+    Method arguments:
+        view_func -- the view the request is routed to
+        method -- the HTTP method of the request
+    Returns: `<basename>-<action>` for a viewset (e.g. `song-list`), the name of the view otherwise
+    """
+    basename = getattr(view_func, 'initkwargs', {}).get('basename')
+    actions = getattr(view_func, 'actions', None)
+    if basename is None or not actions:
+        return view_func.__name__
+
+    # viewsets answer HEAD with their GET action
+    method = method.lower()
+    if method == 'head' and 'head' not in actions:
+        method = 'get'
+    return f"{basename}-{actions.get(method, method)}"
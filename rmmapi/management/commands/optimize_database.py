@@ -0,0 +1,54 @@
+"""Management command to run routine maintenance on the SQLite database"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+# values of `PRAGMA auto_vacuum`
+AUTO_VACUUM_INCREMENTAL = 2
+
+class Command(BaseCommand):
+    help = 'Refresh the query planner statistics of the SQLite database and return its free pages to the OS. Run daily.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=0,
+            help='Maximum number of free pages for the incremental vacuum to release (default: all of them)'
+        )
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help='Also rebuild the whole database with VACUUM, which also switches an existing '
+                 'database to the auto_vacuum mode set in RMM_SQLITE_PRAGMAS. Locks the database while it runs.'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f"optimize_database only supports SQLite, not {connection.vendor}.")
+
+        with connection.cursor() as cursor:
+            free_pages = self._get_free_pages(cursor)
+
+            cursor.execute('ANALYZE')
+            cursor.execute('PRAGMA optimize')
+
+            if options['vacuum']:
+                cursor.execute('VACUUM')
+
+            cursor.execute('PRAGMA auto_vacuum')
+            if cursor.fetchone()[0] == AUTO_VACUUM_INCREMENTAL:
+                # every freed page is a row of the result, and only fetching them frees them all
+                cursor.execute(f"PRAGMA incremental_vacuum({options['pages']})")
+                cursor.fetchall()
+            elif not options['vacuum']:
+                self.stdout.write('Incremental vacuum is off for this database; run with --vacuum to turn it on.')
+
+            released_pages = free_pages - self._get_free_pages(cursor)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Analyzed and optimized the database, and released {released_pages} of {free_pages} free page(s)."
+        ))
+
+    def _get_free_pages(self, cursor):
+        cursor.execute('PRAGMA freelist_count')
+        return cursor.fetchone()[0]
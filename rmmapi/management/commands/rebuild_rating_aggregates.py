@@ -0,0 +1,91 @@
+"""Management command to rebuild the denormalized rating aggregates on songs"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Avg, Count, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from rmmapi.models import Rating, Song
+from rmmapi.models.song import rating_aggregates_changed
+
+# stored and actual averages closer than this are equal, as the stored one is computed by
+# dividing the stored sum by the stored count rather than with AVG, which may round differently
+AVG_RATING_TOLERANCE = 1e-9
+
+class Command(BaseCommand):
+    help = 'Rebuild the rating_count, rating_sum, and avg_rating columns of all songs from their ratings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report songs whose aggregates have drifted, and exit with an error if any have'
+        )
+
+    def handle(self, *args, **options):
+        drifted = self._get_drifted_songs()
+        drifted_count = drifted.count()
+
+        if options['check']:
+            for song in drifted:
+                self.stdout.write(
+                    f"Song {song.id}: stored count {song.rating_count} / sum {song.rating_sum} / "
+                    f"average {song.avg_rating}, actual count {song.actual_count} / sum {song.actual_sum} / "
+                    f"average {song.actual_avg}"
+                )
+
+            if drifted_count > 0:
+                raise CommandError(f"{drifted_count} song(s) have drifted rating aggregates.")
+
+            self.stdout.write(self.style.SUCCESS('All song rating aggregates are correct.'))
+            return
+
+        with transaction.atomic():
+            drifted_ids = list(drifted.values_list('id', flat=True))
+            Song.objects.update(
+                rating_count=self._actual_count(),
+                rating_sum=self._actual_sum(),
+                avg_rating=self._actual_avg()
+            )
+
+            # update() sends no signals, so drop the cached fragments of the changed songs
+            # in every process
+            for song_id in drifted_ids:
+                rating_aggregates_changed.send(sender=Song, song_id=song_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rating aggregates for all songs ({drifted_count} had drifted)."
+        ))
+
+    def _get_drifted_songs(self):
+        """Return a songs QuerySet of those whose stored count, sum or average differs from
+        their ratings. The average of a song without ratings is NULL."""
+        return Song.objects.annotate(
+            actual_count=self._actual_count(),
+            actual_sum=self._actual_sum(),
+            actual_avg=self._actual_avg()
+        ).filter(
+            ~Q(rating_count=F('actual_count')) |
+            ~Q(rating_sum=F('actual_sum')) |
+            Q(avg_rating__isnull=True, actual_avg__isnull=False) |
+            Q(avg_rating__isnull=False, actual_avg__isnull=True) |
+            Q(avg_rating__gt=F('actual_avg') + AVG_RATING_TOLERANCE) |
+            Q(avg_rating__lt=F('actual_avg') - AVG_RATING_TOLERANCE)
+        ).order_by('id')
+
+    def _song_ratings(self):
+        """Ratings of the song in the outer query, grouped so they can be aggregated in a subquery"""
+        return Rating.objects.filter(song=OuterRef('pk')).order_by().values('song')
+
+    def _actual_count(self):
+        return Coalesce(
+            Subquery(self._song_ratings().annotate(count=Count('id')).values('count'), output_field=IntegerField()),
+            0
+        )
+
+    def _actual_sum(self):
+        return Coalesce(
+            Subquery(self._song_ratings().annotate(total=Sum('rating')).values('total'), output_field=IntegerField()),
+            0
+        )
+
+    def _actual_avg(self):
+        return Subquery(self._song_ratings().annotate(average=Avg('rating')).values('average'), output_field=FloatField())
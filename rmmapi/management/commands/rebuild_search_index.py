@@ -0,0 +1,22 @@
+"""Management command to rebuild the full-text search index"""
+from django.core.management.base import BaseCommand
+from rmmapi.search import rebuild_search_index, rebuild_trigram_index
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text and trigram search indexes of artists, songs, and lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Database to rebuild the search index of (default: "default")'
+        )
+
+    def handle(self, *args, **options):
+        if rebuild_search_index(options['database']):
+            self.stdout.write(self.style.SUCCESS('Rebuilt the full-text search index.'))
+        else:
+            self.stdout.write('The database does not support the full-text search index; searches will use icontains.')
+
+        rebuild_trigram_index()
+        self.stdout.write(self.style.SUCCESS('Rebuilt the trigram search index.'))
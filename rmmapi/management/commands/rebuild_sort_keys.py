@@ -0,0 +1,27 @@
+"""Management command to rebuild the normalized sort keys of artists and songs"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rmmapi.models import Artist, Song
+from rmmapi.models.sort_key import get_sort_key
+
+BATCH_SIZE = 500
+
+class Command(BaseCommand):
+    help = 'Rebuild the sort_name columns of all artists and songs, e.g. after loading fixtures'
+
+    def handle(self, *args, **options):
+        for model in [ Artist, Song ]:
+            changed = []
+            for id, name, sort_name in model.objects.values_list('id', 'name', 'sort_name').iterator():
+                sort_key = get_sort_key(name)
+                if sort_key != sort_name:
+                    changed.append(model(id=id, sort_name=sort_key))
+
+            # bulk_update skips save(), so neither the pre_save validation of every field
+            # nor the post_save invalidation runs; sort keys are never rendered
+            with transaction.atomic():
+                model.objects.bulk_update(changed, [ 'sort_name' ], batch_size=BATCH_SIZE)
+
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt sort keys for {model._meta.verbose_name_plural} ({len(changed)} changed)."
+            ))
@@ -0,0 +1,41 @@
+"""Management command to reconcile the site-wide counts and record a daily snapshot of them"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rmmapi.models import SiteStats, SiteStatsSnapshot
+from rmmapi.models.site_stats import COUNTED_MODELS
+
+class Command(BaseCommand):
+    help = "Recount the site-wide counts shown by /stats, and record them as today's snapshot. Run daily."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report counts that have drifted, and exit with an error if any have'
+        )
+
+    def handle(self, *args, **options):
+        stats = SiteStats.get()
+        actual_counts = { field: model.objects.count() for field, model in COUNTED_MODELS.items() }
+        drifted = {
+            field: (getattr(stats, field), actual)
+            for field, actual in actual_counts.items()
+            if getattr(stats, field) != actual
+        }
+
+        for field, (stored, actual) in drifted.items():
+            self.stdout.write(f"{field}: stored {stored}, actual {actual}")
+
+        if options['check']:
+            if drifted:
+                raise CommandError(f"{len(drifted)} count(s) have drifted.")
+
+            self.stdout.write(self.style.SUCCESS('All site-wide counts are correct.'))
+            return
+
+        stats = SiteStats.reconcile()
+        snapshot = SiteStatsSnapshot.record(stats, timezone.localdate())
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled site-wide counts ({len(drifted)} had drifted) and recorded the snapshot for {snapshot.date}."
+        ))
@@ -0,0 +1,143 @@
+"""Middleware of the API"""
+import hashlib
+import time
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from rest_framework.authentication import get_authorization_header
+from rmmapi.cache import compressed_cache
+from rmmapi.compression import compress, compress_stream, is_compressible, negotiate_encoding
+from rmmapi.instrumentation import start_request, stop_request, endpoint_metrics
+from rmmapi.instrumentation import get_endpoint_name, get_server_timing
+from rmmapi.routers import start_routing, stop_routing, read_from_replica
+from rmmapi.routers import is_primary_sticky, mark_primary_sticky
+
+# ViewSet actions that only read, and whose reads can go to the replica
+READ_ACTIONS = { 'list', 'retrieve' }
+
+class ReplicaRoutingMiddleware:
+    """Send the reads of GET requests handled by a read action to the replica (see
+    rmmapi.routers), unless the request's token wrote recently"""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routing_token = start_routing()
+        try:
+            return self.get_response(request)
+        finally:
+            wrote = stop_routing(routing_token)
+
+            auth_token = get_auth_token(request)
+            if wrote and auth_token is not None:
+                mark_primary_sticky(auth_token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if settings.RMM_REPLICA_DATABASE is None or request.method not in ('GET', 'HEAD'):
+            return None
+
+        # ViewSets are routed with a map of HTTP methods to their actions, and answer HEAD with GET
+        actions = getattr(view_func, 'actions', None) or {}
+        if actions.get('get') not in READ_ACTIONS:
+            return None
+
+        auth_token = get_auth_token(request)
+        if auth_token is None or not is_primary_sticky(auth_token):
+            read_from_replica()
+        return None
+
+def get_auth_token(request):
+    """Get the token sent in the `Authorization: Token <token>` header of a request, or None"""
+    auth = get_authorization_header(request).split()
+    if len(auth) != 2 or auth[0].lower() != b'token':
+        return None
+
+    try:
+        return auth[1].decode()
+    except UnicodeError:
+        return None
+
+class CompressionMiddleware:
+    """Compress responses with brotli or gzip, as negotiated by the Accept-Encoding header.
+    Bodies under RMM_COMPRESSION_MIN_SIZE bytes are sent as they are, streaming responses
+    are compressed chunk by chunk, and the compressed bodies of JSON responses with an
+    ETag are cached (see rmmapi.cache.compressed)."""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.has_header('Content-Encoding') or not is_compressible(response.get('Content-Type', '')):
+            return response
+
+        if not response.streaming and len(response.content) < settings.RMM_COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            content = self._compress(response, encoding)
+            if len(content) >= len(response.content):
+                return response
+
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        # the compressed body is not byte-for-byte the one the ETag was computed for
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+
+        response['Content-Encoding'] = encoding
+        return response
+
+    def _compress(self, response, encoding):
+        """Compress the body of a response, or take it from the cache"""
+        etag = response.get('ETag')
+        if not etag or not response.get('Content-Type', '').startswith('application/json'):
+            return compress(response.content, encoding)
+
+        # keyed by the body itself, as responses with one ETag can be rendered differently
+        digest = hashlib.sha1(response.content).digest()
+        content = compressed_cache.get(digest, encoding)
+        if content is None:
+            content = compress(response.content, encoding)
+            compressed_cache.set(digest, encoding, content)
+        return content
+
+class InstrumentationMiddleware:
+    """Collect the query count, database time, serialization time and size of each request
+    (see rmmapi.instrumentation), aggregate them by endpoint, and report them in a
+    Server-Timing header when debugging"""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        metrics, token = start_request()
+        request.metrics = metrics
+        try:
+            response = self.get_response(request)
+        finally:
+            stop_request(token)
+        duration = time.perf_counter() - start
+
+        # the size of a streaming body is not known until it has been sent
+        size = 0 if response.streaming else len(response.content)
+        if metrics.endpoint is not None:
+            endpoint_metrics.record(metrics, duration, size)
+
+        if settings.DEBUG:
+            response['Server-Timing'] = get_server_timing(metrics, duration)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics.endpoint = get_endpoint_name(view_func, request.method)
+        return None
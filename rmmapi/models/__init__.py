@@ -8,3 +8,5 @@ from .list_song import ListSong
 from .list_favorite import ListFavorite
 from .genre import Genre
 from .song_genre import SongGenre
+from .search_trigram import SearchTrigram
+from .site_stats import SiteStats, SiteStatsSnapshot
@@ -1,8 +1,21 @@
 from django.db import models
 from .rater import get_deleted_rater_instance
+from .sort_key import SORT_KEY_MAX_LENGTH, get_sort_key
 
 class Artist(models.Model):
     name = models.CharField(max_length=150)
     description = models.CharField(max_length=1000)
     founded_year = models.IntegerField()
     creator = models.ForeignKey("rmmapi.Rater", on_delete=models.SET(get_deleted_rater_instance))
+
+    # normalized name to order by, maintained by save
+    sort_name = models.CharField(max_length=SORT_KEY_MAX_LENGTH, blank=True, editable=False, db_index=True)
+
+    def save(self, *args, **kwargs):
+        self.sort_name = get_sort_key(self.name)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = [ *update_fields, 'sort_name' ]
+
+        super().save(*args, **kwargs)
@@ -4,3 +4,10 @@ from .rater import get_deleted_rater_instance
 class ListFavorite(models.Model):
     list = models.ForeignKey("rmmapi.List", on_delete=models.CASCADE, related_name="favorites")
     rater = models.ForeignKey("rmmapi.Rater", on_delete=models.SET(get_deleted_rater_instance))
+
+    class Meta:
+        # not unique, for the same reason as Rating: favorites of deleted users all
+        # belong to the deleted rater
+        indexes = [
+            models.Index(fields=[ 'list', 'rater' ]),
+        ]
@@ -4,3 +4,8 @@ class ListSong(models.Model):
     list = models.ForeignKey("rmmapi.List", on_delete=models.CASCADE, related_name="songs")
     song = models.ForeignKey("rmmapi.Song", on_delete=models.CASCADE, related_name="lists")
     description = models.CharField(max_length=1000)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=[ 'list', 'song' ], name='unique_list_song'),
+        ]
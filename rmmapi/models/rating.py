@@ -8,3 +8,14 @@ class Rating(models.Model):
     song = models.ForeignKey("rmmapi.Song", on_delete=models.CASCADE, related_name="ratings")
     rater = models.ForeignKey("rmmapi.Rater", on_delete=models.SET(get_deleted_rater_instance))
     created_at = models.DateTimeField(auto_now=False, auto_now_add=False)
+
+    class Meta:
+        # not unique: deleting a user hands their ratings to the one deleted rater, who may
+        # then hold several ratings of a song; RatingViewSet rejects duplicates instead
+        indexes = [
+            # the "has this rater already rated this song" check of RatingViewSet.create
+            models.Index(fields=[ 'song', 'rater' ]),
+            # GET /ratings?userId=... and ?songId=..., sorted by date
+            models.Index(fields=[ 'rater', 'created_at' ]),
+            models.Index(fields=[ 'song', 'created_at' ]),
+        ]
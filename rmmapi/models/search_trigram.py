@@ -0,0 +1,15 @@
+from django.db import models
+
+class SearchTrigram(models.Model):
+    """A trigram of the name of an artist, song, or list, used for typo-tolerant search"""
+    kind = models.CharField(max_length=20)
+    object_id = models.IntegerField()
+    trigram = models.CharField(max_length=3)
+    # number of distinct trigrams in the object's name, to score similarity without another lookup
+    trigram_count = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=[ 'kind', 'trigram', 'object_id' ]),
+            models.Index(fields=[ 'kind', 'object_id' ]),
+        ]
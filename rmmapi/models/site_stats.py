@@ -0,0 +1,67 @@
+from django.db import models
+from django.db.models import F
+from .rater import Rater
+from .artist import Artist
+from .song import Song
+from .list import List
+
+SITE_STATS_ID = 1
+
+# the model counted by each column of SiteStats
+COUNTED_MODELS = {
+    'users': Rater,
+    'artists': Artist,
+    'songs': Song,
+    'lists': List
+}
+
+class SiteStats(models.Model):
+    """Site-wide counts shown by /stats, kept in a single row that is incremented and
+    decremented as rows are created and deleted, and periodically reconciled"""
+    users = models.IntegerField(default=0)
+    artists = models.IntegerField(default=0)
+    songs = models.IntegerField(default=0)
+    lists = models.IntegerField(default=0)
+
+    @classmethod
+    def get(cls):
+        """Get the counts row, counting every model to create it if it does not exist yet"""
+        try:
+            return cls.objects.get(pk=SITE_STATS_ID)
+        except cls.DoesNotExist:
+            return cls.reconcile()
+
+    @classmethod
+    def apply_change(cls, field, delta):
+        """Add delta to one of the counts in a single UPDATE statement"""
+        updated = cls.objects.filter(pk=SITE_STATS_ID).update(**{ field: F(field) + delta })
+
+        # first write since the row was removed, so count everything, including this change
+        if not updated:
+            cls.reconcile()
+
+    @classmethod
+    def reconcile(cls):
+        """Replace the counts with real COUNT(*)s of every model
+        Returns: the reconciled counts row
+        """
+        counts = { field: model.objects.count() for field, model in COUNTED_MODELS.items() }
+        stats, created = cls.objects.update_or_create(pk=SITE_STATS_ID, defaults=counts)
+        return stats
+
+class SiteStatsSnapshot(models.Model):
+    """The site-wide counts at the end of a day, for charting growth over time"""
+    date = models.DateField(unique=True)
+    users = models.IntegerField()
+    artists = models.IntegerField()
+    songs = models.IntegerField()
+    lists = models.IntegerField()
+
+    @classmethod
+    def record(cls, stats, date):
+        """Save the counts of a SiteStats row as the snapshot of date"""
+        snapshot, created = cls.objects.update_or_create(
+            date=date,
+            defaults={ field: getattr(stats, field) for field in COUNTED_MODELS }
+        )
+        return snapshot
@@ -1,6 +1,15 @@
 from django.db import models
-from statistics import StatisticsError, mean
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast
+from django.dispatch import Signal
 from .rater import get_deleted_rater_instance
+from .sort_key import SORT_KEY_MAX_LENGTH, get_sort_key
+
+RATING_AGGREGATE_FIELDS = ('rating_count', 'rating_sum', 'avg_rating')
+
+# sent with the song_id of a song after apply_rating_change updates it, since an
+# UPDATE statement does not send post_save
+rating_aggregates_changed = Signal()
 
 class Song(models.Model):
     creator = models.ForeignKey("rmmapi.Rater", on_delete=models.SET(get_deleted_rater_instance))
@@ -9,11 +18,56 @@ class Song(models.Model):
     year = models.IntegerField()
     created_at = models.DateTimeField(auto_now=False, auto_now_add=False)
 
-    @property
-    def avg_rating(self):
-        ratings = self.ratings.all()
+    # denormalized rating aggregates, maintained by apply_rating_change
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    avg_rating = models.FloatField(null=True, blank=True, db_index=True)
+
+    # normalized name to order by, maintained by save
+    sort_name = models.CharField(max_length=SORT_KEY_MAX_LENGTH, blank=True, editable=False, db_index=True)
+
+    class Meta:
+        indexes = [
+            # the startYear/endYear filters and orderBy=year of SongViewSet.list, alone
+            # and combined with the artist filter
+            models.Index(fields=[ 'year' ]),
+            models.Index(fields=[ 'artist', 'year' ]),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.sort_name = get_sort_key(self.name)
+
+        # the rating aggregates are only ever written by UPDATEs in apply_rating_change,
+        # so never write back the (possibly stale) copies held by this instance
+        if self.pk is not None and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in RATING_AGGREGATE_FIELDS
+            ]
+        elif kwargs.get('update_fields') is not None and 'name' in kwargs['update_fields']:
+            kwargs['update_fields'] = [ *kwargs['update_fields'], 'sort_name' ]
+
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def apply_rating_change(cls, song_id, count_delta, sum_delta):
+        """Incrementally update the rating aggregates of a song in a single UPDATE statement
+        Method arguments:
+            song_id -- id of the song whose ratings changed
+            count_delta -- change in the number of ratings (1 on create, -1 on delete)
+            sum_delta -- change in the sum of rating values
+        """
+        new_count = F('rating_count') + count_delta
+        new_sum = F('rating_sum') + sum_delta
+
+        cls.objects.filter(pk=song_id).update(
+            rating_count=new_count,
+            rating_sum=new_sum,
+            avg_rating=Case(
+                When(rating_count=-count_delta, then=Value(None)),
+                default=Cast(new_sum, FloatField()) / new_count,
+                output_field=FloatField()
+            )
+        )
 
-        try:
-            return mean([ rating.rating for rating in ratings ])
-        except StatisticsError:
-            return None
+        rating_aggregates_changed.send(sender=cls, song_id=song_id)
@@ -3,3 +3,12 @@ from django.db import models
 class SongGenre(models.Model):
     song = models.ForeignKey("rmmapi.Song", on_delete=models.CASCADE, related_name="genres")
     genre = models.ForeignKey("rmmapi.Genre", on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=[ 'song', 'genre' ], name='unique_song_genre'),
+        ]
+        indexes = [
+            # covers the genre filter of SongViewSet.list, which groups song ids by genre
+            models.Index(fields=[ 'genre', 'song' ]),
+        ]
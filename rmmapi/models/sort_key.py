@@ -0,0 +1,20 @@
+import re
+import unicodedata
+
+SORT_KEY_MAX_LENGTH = 150
+
+LEADING_ARTICLE = re.compile(r'^the\s+')
+
+def get_sort_key(name):
+    """Normalize a name for sorting - diacritics are stripped, case is folded, whitespace is
+    collapsed, and a leading "The " is dropped, so "The Élan" sorts as "elan"
+    Returns: the sort key, stored alongside the name so ordering by it can use an index
+    """
+    decomposed = unicodedata.normalize('NFKD', name)
+    key = ''.join(character for character in decomposed if not unicodedata.combining(character))
+    key = ' '.join(key.casefold().split())
+
+    # keep names that are nothing but the article itself
+    key = LEADING_ARTICLE.sub('', key) or key
+
+    return key[:SORT_KEY_MAX_LENGTH]
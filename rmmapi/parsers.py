@@ -0,0 +1,34 @@
+"""JSON parser of the API, using orjson when it is installed"""
+import json
+from django.conf import settings
+from rest_framework.utils.json import strict_constant
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def loads(content):
+    """Parse UTF-8 JSON, rejecting NaN and Infinity as JSONParser does
+    Raises: ValueError if content is not valid JSON
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+
+    if isinstance(content, bytes):
+        content = content.decode()
+    return json.loads(content, parse_constant=strict_constant)
+
+class FastJSONParser(JSONParser):
+    """JSONParser that parses with orjson when it is installed"""
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8' or not self.strict:
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return loads(stream.read())
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
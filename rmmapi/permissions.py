@@ -1,5 +1,4 @@
 from rest_framework import permissions
-from rmmapi.models import Rater
 
 class MustBeCreatorToModify(permissions.IsAuthenticated):
     """Object level permission that only allows creators of an object to modify them."""
@@ -8,6 +7,6 @@ class MustBeCreatorToModify(permissions.IsAuthenticated):
 
     def has_object_permission(self, request, view, creator):
         if request.method == 'DELETE' or request.method == 'PUT':
-            rater = Rater.objects.get(user=request.auth.user)
+            rater = request.rater
             return creator == rater
         return True
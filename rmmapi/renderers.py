@@ -0,0 +1,63 @@
+"""JSON renderer of the API, using orjson when it is installed
+
+orjson serializes the data the serializers return several times faster than the json
+module. Anything it does not support natively (e.g. datetimes, which it would format
+differently, Decimals and lazy strings) is handed to DRF's JSONEncoder, so the output
+is byte-for-byte the same as JSONRenderer's. Without orjson, or for the indented output
+of the browsable API, JSONRenderer renders instead.
+"""
+import json
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from rmmapi.instrumentation import times_serialization
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+_encoder = JSONEncoder()
+
+def dumps(data, sort_keys=False):
+    """Serialize data to compact UTF-8 JSON, the way JSONRenderer does
+    Method arguments:
+        data -- the data to serialize
+        sort_keys -- whether to sort the keys of objects
+    Returns: bytes
+    """
+    if orjson is not None:
+        options = (ORJSON_OPTIONS | orjson.OPT_SORT_KEYS) if sort_keys else ORJSON_OPTIONS
+        try:
+            content = orjson.dumps(data, default=_encoder.default, option=options)
+        except orjson.JSONEncodeError:
+            # e.g. integers larger than 64 bits, which the json module can serialize
+            pass
+        else:
+            # escaped by JSONRenderer, so that the output is a strict subset of JavaScript
+            return content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+    content = json.dumps(
+        data, cls=JSONEncoder, ensure_ascii=False, allow_nan=False,
+        separators=(',', ':'), sort_keys=sort_keys
+    )
+    return content.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that renders with orjson when it is installed"""
+    @times_serialization
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or indent is not None or not self._is_default_format():
+            return super().render(data, accepted_media_type, renderer_context)
+
+        return dumps(data)
+
+    def _is_default_format(self):
+        """Check that the output of dumps is the one JSONRenderer is configured for"""
+        return self.compact and not self.ensure_ascii and self.strict
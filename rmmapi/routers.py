@@ -0,0 +1,107 @@
+"""Database router sending the reads of read-only requests to a replica
+
+Every query goes to the primary (`default`) database, except the reads of requests that
+ReplicaRoutingMiddleware marks as read-only (GET requests handled by a `list` or
+`retrieve` action, which covers /search and /stats too), which go to the database alias
+set in RMM_REPLICA_DATABASE. Once a request writes, its later reads go to the primary,
+so it reads its own writes.
+
+A replica can lag behind the primary, so after a request writes, the requests made with
+the same token keep reading from the primary for RMM_REPLICA_STICKY_SECONDS. That is
+recorded in the default cache, which must be shared by every worker (see rmmapi.checks),
+or the token's next request to another worker reads from the replica anyway. The
+in-process caches are only invalidated as writes commit on the primary and their entries
+never expire, so the reads that fill them are sent to the primary too (see
+reading_from_primary), or a row the replica has not caught up on would be cached until
+the object is next written to.
+"""
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+class RoutingState:
+    """Routing of the queries of the current request"""
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+
+_routing_state = ContextVar('rmmapi_routing_state', default=None)
+
+# whether the reads of the current context go to the primary regardless of the request
+_primary_only = ContextVar('rmmapi_primary_only', default=False)
+
+def start_routing():
+    """Start routing the queries of a request, to the primary until read_from_replica is called
+    Returns: token to pass to stop_routing at the end of the request
+    """
+    return _routing_state.set(RoutingState())
+
+def stop_routing(token):
+    """Stop routing the queries of a request
+    Returns: whether the request wrote to the database
+    """
+    state = _routing_state.get()
+    _routing_state.reset(token)
+    return state is not None and state.wrote
+
+def read_from_replica():
+    """Send the reads of the rest of the current request to the replica, until it writes"""
+    state = _routing_state.get()
+    if state is not None:
+        state.use_replica = True
+
+@contextmanager
+def reading_from_primary():
+    """Send the reads of a block to the primary, e.g. those filling in-process caches"""
+    token = _primary_only.set(True)
+    try:
+        yield
+    finally:
+        _primary_only.reset(token)
+
+def is_reading_from_replica():
+    """Check whether the reads of the current context go to the replica"""
+    state = _routing_state.get()
+    if settings.RMM_REPLICA_DATABASE is None or state is None or _primary_only.get():
+        return False
+    return state.use_replica and not state.wrote
+
+def mark_primary_sticky(auth_token):
+    """Send the reads of requests with an auth token to the primary for RMM_REPLICA_STICKY_SECONDS"""
+    cache.set(_get_sticky_key(auth_token), True, settings.RMM_REPLICA_STICKY_SECONDS)
+
+def is_primary_sticky(auth_token):
+    """Check whether requests with an auth token wrote recently enough to read from the primary"""
+    return cache.get(_get_sticky_key(auth_token), False)
+
+def _get_sticky_key(auth_token):
+    # tokens are credentials, so only a hash of them is kept in the cache
+    return f"router:sticky:{hashlib.sha256(auth_token.encode()).hexdigest()}"
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if is_reading_from_replica():
+            return settings.RMM_REPLICA_DATABASE
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _routing_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same data as the primary
+        databases = { DEFAULT_DB_ALIAS, settings.RMM_REPLICA_DATABASE }
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica gets its tables from the primary
+        if db == settings.RMM_REPLICA_DATABASE:
+            return False
+        return None
@@ -0,0 +1,5 @@
+"""Full-text search over artists, songs, and lists"""
+from .fts import create_search_index, rebuild_search_index, index_objects, remove_objects
+from .fts import filter_by_search_term, search
+from .trigram import index_trigrams, remove_trigrams, rebuild_trigram_index
+from .trigram import fuzzy_search, get_search_deadline
@@ -0,0 +1,159 @@
+"""SQLite FTS5 search index for artists, songs, and lists
+
+Each searchable model has an FTS5 table (using the trigram tokenizer) whose rowid is
+the id of the object, holding the text of the fields it can be searched by. Matching
+the table finds every object with the search term anywhere in one of those fields -
+the same results as `icontains`, but from the index rather than a scan of the table -
+and the matches can be ranked by bm25.
+
+On other database backends, or an SQLite build without FTS5 trigram support, and for
+terms too short to be looked up by trigram, searches fall back to `icontains`. On
+PostgreSQL, pg_trgm indexes serve those instead (see rmmapi.search.postgres).
+"""
+import sqlite3
+from collections import namedtuple
+from functools import lru_cache
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rmmapi.models import Artist, Song, List
+from .postgres import create_trigram_indexes
+
+SearchIndex = namedtuple('SearchIndex', [ 'table', 'fields' ])
+
+SEARCH_INDEXES = {
+    Artist: SearchIndex('rmmapi_artist_search', ('name',)),
+    Song: SearchIndex('rmmapi_song_search', ('name', 'artist__name')),
+    List: SearchIndex('rmmapi_list_search', ('name', 'description')),
+}
+
+# the trigram tokenizer cannot match terms shorter than one trigram
+MIN_TERM_LENGTH = 3
+
+def create_search_index(using='default'):
+    """Create the FTS5 tables of the search index if they do not exist yet, or on
+    PostgreSQL, the trigram indexes of the icontains fallback"""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        create_trigram_indexes(connection)
+
+    if not _is_supported(connection):
+        return
+
+    with connection.cursor() as cursor:
+        for search_index in SEARCH_INDEXES.values():
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {search_index.table} "
+                f"USING fts5({', '.join(_get_columns(search_index))}, tokenize='trigram')"
+            )
+
+def rebuild_search_index(using='default'):
+    """Drop and recreate the search index, then index every artist, song, and list"""
+    connection = connections[using]
+    if not _is_supported(connection):
+        return False
+
+    with connection.cursor() as cursor:
+        for search_index in SEARCH_INDEXES.values():
+            cursor.execute(f"DROP TABLE IF EXISTS {search_index.table}")
+
+    create_search_index(using)
+
+    for model, search_index in SEARCH_INDEXES.items():
+        index_objects(model.objects.using(using).all())
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {search_index.table}({search_index.table}) VALUES ('optimize')")
+
+    return True
+
+def index_objects(queryset):
+    """Add (or replace) the search index entries of every object in a QuerySet"""
+    model = queryset.model
+    connection = connections[router.db_for_write(model)]
+    if not _is_supported(connection):
+        return
+
+    search_index = SEARCH_INDEXES[model]
+    documents = queryset.order_by().values_list('id', *search_index.fields)
+    select_sql, params = documents.query.get_compiler(connection=connection).as_sql()
+    ids_sql, ids_params = queryset.order_by().values('id').query.get_compiler(connection=connection).as_sql()
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {search_index.table} WHERE rowid IN ({ids_sql})", ids_params)
+        cursor.execute(
+            f"INSERT INTO {search_index.table}(rowid, {', '.join(_get_columns(search_index))}) {select_sql}",
+            params
+        )
+
+def remove_objects(model, ids):
+    """Remove the search index entries of the objects of a model with the given ids"""
+    connection = connections[router.db_for_write(model)]
+    if not _is_supported(connection) or not ids:
+        return
+
+    search_index = SEARCH_INDEXES[model]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {search_index.table} WHERE rowid IN ({', '.join(['%s'] * len(ids))})",
+            list(ids)
+        )
+
+def filter_by_search_term(queryset, q):
+    """Given a QuerySet of a searchable model, filter it to the objects with q in any of
+    their searchable fields, case-insensitive"""
+    model = queryset.model
+    search_index = SEARCH_INDEXES[model]
+
+    if not _can_match(connections[queryset.db], q):
+        return queryset.filter(_get_fallback_filter(search_index, q))
+
+    return queryset.filter(pk__in=RawSQL(
+        f"SELECT rowid FROM {search_index.table} WHERE {search_index.table} MATCH %s",
+        [ _get_match_query(q) ]
+    ))
+
+def search(model, q, limit):
+    """Get the ids of up to `limit` objects of a searchable model matching q, best matches first"""
+    search_index = SEARCH_INDEXES[model]
+    connection = connections[router.db_for_read(model)]
+
+    if not _can_match(connection, q):
+        matches = model.objects.filter(_get_fallback_filter(search_index, q)).order_by('id')
+        return list(matches.values_list('id', flat=True)[:limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {search_index.table} WHERE {search_index.table} MATCH %s "
+            f"ORDER BY rank LIMIT %s",
+            [ _get_match_query(q), limit ]
+        )
+        return [ row[0] for row in cursor.fetchall() ]
+
+def _get_columns(search_index):
+    return [ field.replace('__', '_') for field in search_index.fields ]
+
+def _get_match_query(q):
+    """Quote the search term so FTS5 matches it as one literal string"""
+    return '"' + q.replace('"', '""') + '"'
+
+def _get_fallback_filter(search_index, q):
+    fallback_filter = Q()
+    for field in search_index.fields:
+        fallback_filter |= Q(**{ f"{field}__icontains": q })
+    return fallback_filter
+
+def _can_match(connection, q):
+    return len(q) >= MIN_TERM_LENGTH and _is_supported(connection)
+
+def _is_supported(connection):
+    return connection.vendor == 'sqlite' and _sqlite_supports_fts5_trigram()
+
+@lru_cache(maxsize=None)
+def _sqlite_supports_fts5_trigram():
+    """Check whether the SQLite library in use has FTS5 with the trigram tokenizer"""
+    try:
+        sqlite3.connect(':memory:').execute("CREATE VIRTUAL TABLE test USING fts5(body, tokenize='trigram')")
+    except sqlite3.OperationalError:
+        return False
+    return True
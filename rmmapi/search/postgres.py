@@ -0,0 +1,32 @@
+"""pg_trgm indexes for searches on PostgreSQL
+
+PostgreSQL has no FTS5 index, so searches there use the icontains fallback of
+rmmapi.search.fts, which Django compiles to `UPPER("field"::text) LIKE UPPER(%s)`. A GIN
+index of the trigrams of that same expression (from the pg_trgm extension) lets
+PostgreSQL answer the LIKE from the index instead of scanning the table.
+"""
+from rmmapi.models import Artist, Song, List
+
+# fields searched by the icontains fallback (songs are also searched by the name of
+# their artist, which the index on artists covers)
+TRIGRAM_INDEXED_FIELDS = {
+    Artist: ('name',),
+    Song: ('name',),
+    List: ('name', 'description'),
+}
+
+def create_trigram_indexes(connection):
+    """Create the pg_trgm extension and the trigram indexes if they do not exist yet"""
+    quote_name = connection.ops.quote_name
+
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+        for model, fields in TRIGRAM_INDEXED_FIELDS.items():
+            table = model._meta.db_table
+            for field in fields:
+                column = model._meta.get_field(field).column
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {quote_name(f'{table}_{column}_trgm')} ON {quote_name(table)} "
+                    f"USING gin ((UPPER({quote_name(column)}::text)) gin_trgm_ops)"
+                )
@@ -0,0 +1,135 @@
+"""Trigram index for typo-tolerant search of artists, songs, and lists
+
+Every word of an object's name is padded and split into trigrams, which are stored in
+the SearchTrigram side table. A search term is split the same way, and objects are
+scored by the similarity of the two trigram sets (shared trigrams over all distinct
+trigrams), so misspelled terms still find the names they were meant to match. This
+uses plain tables and indexes, so it works on any database backend.
+"""
+import re
+import time
+import unicodedata
+from django.conf import settings
+from django.db import OperationalError, connections, router
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Max
+from django.db.models.functions import Cast
+from rmmapi.models import Artist, Song, List, SearchTrigram
+
+TRIGRAM_FIELDS = {
+    Artist: 'name',
+    Song: 'name',
+    List: 'name',
+}
+
+BATCH_SIZE = 500
+
+def get_trigrams(text):
+    """Split text into the set of trigrams of its words, case and diacritics folded"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(character for character in text if not unicodedata.combining(character))
+
+    trigrams = set()
+    for word in re.findall(r'\w+', text):
+        padded_word = f"  {word} "
+        trigrams.update(padded_word[i:i + 3] for i in range(len(padded_word) - 2))
+    return trigrams
+
+def index_trigrams(queryset):
+    """Add (or replace) the trigrams of every object in a QuerySet"""
+    model = queryset.model
+    connection = connections[router.db_for_write(SearchTrigram)]
+    ids_sql, ids_params = queryset.order_by().values('id').query.get_compiler(connection=connection).as_sql()
+    _delete_trigrams(model, ids_sql, list(ids_params))
+
+    batch = []
+    for id, name in queryset.order_by().values_list('id', TRIGRAM_FIELDS[model]).iterator():
+        trigrams = get_trigrams(name)
+        batch += [
+            SearchTrigram(kind=_get_kind(model), object_id=id, trigram=trigram, trigram_count=len(trigrams))
+            for trigram in trigrams
+        ]
+
+        if len(batch) >= BATCH_SIZE:
+            SearchTrigram.objects.bulk_create(batch)
+            batch = []
+
+    SearchTrigram.objects.bulk_create(batch)
+
+def remove_trigrams(model, ids):
+    """Remove the trigrams of the objects of a model with the given ids"""
+    if ids:
+        _delete_trigrams(model, ', '.join([ '%s' ] * len(ids)), list(ids))
+
+def rebuild_trigram_index():
+    """Remove every trigram, then index every artist, song, and list"""
+    connection = connections[router.db_for_write(SearchTrigram)]
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SearchTrigram._meta.db_table}")
+
+    for model in TRIGRAM_FIELDS:
+        index_trigrams(model.objects.all())
+
+def get_search_deadline():
+    """Get the time by which fuzzy searches started for the current request must finish"""
+    return time.monotonic() + settings.RMM_FUZZY_SEARCH_TIME_BUDGET
+
+def fuzzy_search(model, q, limit, deadline):
+    """Get the ids of up to `limit` objects of a model whose name is similar to q, most
+    similar first. Returns an empty list if the search could not finish before deadline."""
+    trigrams = get_trigrams(q)
+    if not trigrams or time.monotonic() >= deadline:
+        return []
+
+    # similarity = shared trigrams / (trigrams in q + trigrams in name - shared trigrams)
+    matches = SearchTrigram.objects.filter(
+        kind=_get_kind(model),
+        trigram__in=trigrams
+    ).values('object_id').annotate(
+        shared=Count('id'),
+        total=Max('trigram_count')
+    ).annotate(
+        similarity=ExpressionWrapper(
+            Cast(F('shared'), FloatField()) / (len(trigrams) + F('total') - F('shared')),
+            output_field=FloatField()
+        )
+    ).filter(
+        similarity__gte=settings.RMM_FUZZY_SEARCH_MIN_SIMILARITY
+    ).order_by('-similarity', 'object_id')
+
+    connection = connections[matches.db]
+    try:
+        with _interrupt_after(connection, deadline):
+            return [ match['object_id'] for match in matches[:limit] ]
+    except OperationalError:
+        return []
+
+class _interrupt_after:
+    """Context manager that aborts SQLite queries still running after deadline.
+    Other backends only have the deadline checked before each search starts."""
+    def __init__(self, connection, deadline):
+        self.connection = connection
+        self.deadline = deadline
+
+    def __enter__(self):
+        if self.connection.vendor == 'sqlite':
+            self.connection.ensure_connection()
+            self.connection.connection.set_progress_handler(self._is_past_deadline, 1000)
+
+    def __exit__(self, *args):
+        if self.connection.vendor == 'sqlite':
+            self.connection.connection.set_progress_handler(None, 1000)
+
+    def _is_past_deadline(self):
+        return time.monotonic() >= self.deadline
+
+def _delete_trigrams(model, ids_sql, ids_params):
+    """Delete trigrams with a single statement, rather than loading each one to delete it"""
+    connection = connections[router.db_for_write(SearchTrigram)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SearchTrigram._meta.db_table} WHERE kind = %s AND object_id IN ({ids_sql})",
+            [ _get_kind(model) ] + ids_params
+        )
+
+def _get_kind(model):
+    return model._meta.model_name
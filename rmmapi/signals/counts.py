@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.dispatch import receiver
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from rmmapi.cache import invalidate_counts
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_counts_handler(sender, instance, *args, **kwargs):
+    if sender._meta.app_label != 'rmmapi' and sender is not get_user_model():
+        return
+
+    # invalidate right away, and again once the write is visible to other connections,
+    # so a count computed in between is not cached for the new generation
+    invalidate_counts(sender)
+    transaction.on_commit(lambda: invalidate_counts(sender))
@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.dispatch import receiver
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from rmmapi.cache import fragment_cache
+from rmmapi.models import Song, SongGenre, SongSource
+from rmmapi.models.song import rating_aggregates_changed
+
+# models rendered as part of a song fragment, rather than fragments of their own
+SONG_CHILD_MODELS = (SongGenre, SongSource)
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_fragments_handler(sender, instance, *args, **kwargs):
+    if sender in SONG_CHILD_MODELS:
+        _invalidate(Song._meta.label_lower, instance.song_id)
+    elif sender._meta.app_label == 'rmmapi' or sender is get_user_model():
+        _invalidate(sender._meta.label_lower, instance.pk)
+
+@receiver(rating_aggregates_changed)
+def invalidate_song_fragments_handler(sender, song_id, *args, **kwargs):
+    _invalidate(Song._meta.label_lower, song_id)
+
+def _invalidate(label, pk):
+    # invalidate right away, and again once the write is visible to other connections,
+    # so a fragment rendered in between is not left in the cache
+    fragment_cache.invalidate(label, pk)
+    transaction.on_commit(lambda: fragment_cache.invalidate(label, pk))
@@ -0,0 +1,19 @@
+from django.db import transaction
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+from rmmapi.models import SongGenre
+from rmmapi.cache import genre_bitmap_index
+
+# the bitmaps are only changed (and the changes published) once the write commits, so a
+# rolled back write never leaves them disagreeing with the database
+
+@receiver(post_save, sender=SongGenre)
+def add_to_genre_bitmap(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        genre_id, song_id = instance.genre_id, instance.song_id
+        transaction.on_commit(lambda: genre_bitmap_index.add(genre_id, song_id))
+
+@receiver(post_delete, sender=SongGenre)
+def remove_from_genre_bitmap(sender, instance, **kwargs):
+    genre_id, song_id = instance.genre_id, instance.song_id
+    transaction.on_commit(lambda: genre_bitmap_index.remove(genre_id, song_id))
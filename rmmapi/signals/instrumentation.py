@@ -0,0 +1,7 @@
+from django.dispatch import receiver
+from django.db.backends.signals import connection_created
+from rmmapi.instrumentation import install_query_timer
+
+@receiver(connection_created)
+def install_query_timer_handler(sender, connection, *args, **kwargs):
+    install_query_timer(connection)
@@ -0,0 +1,35 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete, post_migrate
+from rmmapi.models import Artist, Song, List
+from rmmapi.search import create_search_index, index_objects, remove_objects
+from rmmapi.search import index_trigrams, remove_trigrams
+
+@receiver(post_migrate)
+def create_search_index_handler(sender, using, *args, **kwargs):
+    if sender.name == 'rmmapi':
+        create_search_index(using)
+
+@receiver(post_save, sender=Artist)
+def index_artist_handler(sender, instance, raw, *args, **kwargs):
+    if raw:
+        return
+
+    index_objects(Artist.objects.filter(pk=instance.pk))
+    index_trigrams(Artist.objects.filter(pk=instance.pk))
+
+    # songs are also searchable by the name of their artist
+    index_objects(Song.objects.filter(artist_id=instance.pk))
+
+@receiver(post_save, sender=Song)
+@receiver(post_save, sender=List)
+def index_handler(sender, instance, raw, *args, **kwargs):
+    if not raw:
+        index_objects(sender.objects.filter(pk=instance.pk))
+        index_trigrams(sender.objects.filter(pk=instance.pk))
+
+@receiver(post_delete, sender=Artist)
+@receiver(post_delete, sender=Song)
+@receiver(post_delete, sender=List)
+def remove_from_index_handler(sender, instance, *args, **kwargs):
+    remove_objects(sender, [ instance.pk ])
+    remove_trigrams(sender, [ instance.pk ])
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.dispatch import receiver
+from django.db.backends.signals import connection_created
+
+def apply_pragmas(cursor, pragmas):
+    """Run `PRAGMA name = value` on a SQLite connection for each item of a dict"""
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+
+@receiver(connection_created)
+def sqlite_pragmas_handler(sender, connection, *args, **kwargs):
+    if connection.vendor == 'sqlite' and settings.RMM_SQLITE_PRAGMAS:
+        with connection.cursor() as cursor:
+            apply_pragmas(cursor, settings.RMM_SQLITE_PRAGMAS)
@@ -0,0 +1,15 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+from rmmapi.models.site_stats import SiteStats, COUNTED_MODELS
+
+FIELDS_BY_MODEL = { model: field for field, model in COUNTED_MODELS.items() }
+
+@receiver(post_save)
+def count_created_handler(sender, instance, created, *args, **kwargs):
+    if created and sender in FIELDS_BY_MODEL:
+        SiteStats.apply_change(FIELDS_BY_MODEL[sender], 1)
+
+@receiver(post_delete)
+def count_deleted_handler(sender, instance, *args, **kwargs):
+    if sender in FIELDS_BY_MODEL:
+        SiteStats.apply_change(FIELDS_BY_MODEL[sender], -1)
@@ -0,0 +1,47 @@
+from django.db import transaction
+from django.dispatch import receiver
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from rest_framework.authtoken.models import Token
+from rmmapi.authentication import revoke_user_signed_tokens
+from rmmapi.cache import token_cache
+from rmmapi.models import Rater
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token_handler(sender, instance, *args, **kwargs):
+    _invalidate_key(instance.key)
+
+@receiver(post_save, sender=Rater)
+def invalidate_rater_tokens_handler(sender, instance, *args, **kwargs):
+    _invalidate_user(instance.user_id)
+
+@receiver(post_delete, sender=Rater)
+def revoke_rater_tokens_handler(sender, instance, *args, **kwargs):
+    _invalidate_user(instance.user_id)
+    revoke_user_signed_tokens(instance.user_id)
+
+@receiver(post_save)
+def invalidate_user_tokens_handler(sender, instance, *args, **kwargs):
+    if sender is get_user_model():
+        _invalidate_user(instance.pk)
+
+        # signed tokens carry no is_active flag, so deny them instead
+        if not instance.is_active:
+            revoke_user_signed_tokens(instance.pk)
+
+@receiver(post_delete)
+def revoke_user_tokens_handler(sender, instance, *args, **kwargs):
+    if sender is get_user_model():
+        _invalidate_user(instance.pk)
+        revoke_user_signed_tokens(instance.pk)
+
+def _invalidate_key(key):
+    # invalidate right away, and again once the write is visible to other connections,
+    # so a token resolved in between is not left in the cache
+    token_cache.invalidate_key(key)
+    transaction.on_commit(lambda: token_cache.invalidate_key(key))
+
+def _invalidate_user(user_id):
+    token_cache.invalidate_user(user_id)
+    transaction.on_commit(lambda: token_cache.invalidate_user(user_id))
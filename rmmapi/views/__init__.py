@@ -1,5 +1,5 @@
 """Views Package"""
-from .auth import login_user, register_user
+from .auth import login_user, register_user, refresh_token
 from .artist import ArtistViewSet
 from .genre import GenreViewSet
 from .song import SongViewSet
@@ -8,3 +8,4 @@ from .rating import RatingViewSet
 from .rater import RaterViewSet
 from .stats import StatsViewSet
 from .search import SearchViewSet
+from .metrics import MetricsViewSet
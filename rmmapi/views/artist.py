@@ -1,21 +1,59 @@
 """Artist ViewSet and Serializers"""
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.core.exceptions import ValidationError
 from rest_framework import status, serializers
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
-from rmmapi.helpers import get_missing_keys, paginate
-from rmmapi.models import Artist, Rater
-from .rater import RaterSerializer
-
-class ArtistSerializer(serializers.ModelSerializer):
+from rmmapi.helpers import get_missing_keys, paginate, cursor_paginate, conditional_response
+from rmmapi.helpers import RowRenderer, Arg
+from rmmapi.cache import get_count, CachedFragmentMixin, serialize_fragments
+from rmmapi.models import Artist
+from rmmapi.search import filter_by_search_term
+from .rater import RaterSerializer, get_rater_dependencies, serialize_raters
+
+def get_artist_queryset():
+    """Build an artists QuerySet that joins everything ArtistSerializer reads"""
+    return Artist.objects.select_related('creator__user')
+
+# renders the same dicts as ArtistSerializer, from values_list() rows and rendered creators
+ARTIST_ROWS = RowRenderer([
+    ('id', 'id'),
+    ('name', 'name'),
+    ('founded_year', 'founded_year'),
+    ('description', 'description'),
+    ('creator', Arg('creator'))
+], extra_lookups=('creator_id',))
+
+class ArtistSerializer(CachedFragmentMixin, serializers.ModelSerializer):
     """JSON serializer for artist"""
+    fragment_name = 'artist'
     creator = RaterSerializer()
 
     class Meta:
         model = Artist
         fields = ('id', 'name', 'founded_year', 'description', 'creator')
 
+    def render_fragments(self, queryset, ids):
+        rows = list(ARTIST_ROWS.values_list(queryset.filter(pk__in=ids)))
+        creators = serialize_raters([ row[-1] for row in rows ])
+
+        fragments = {}
+        for row in rows:
+            data = ARTIST_ROWS.render(row, creators[row[-1]])
+            self.cache_fragment(data['id'], data)
+            fragments[data['id']] = data
+        return fragments
+
+    def get_fragment_dependencies(self, data):
+        return get_rater_dependencies(data['creator'])
+
+class NestedArtistSerializer(serializers.ModelSerializer):
+    """JSON serializer for an artist nested in a song, with its creator as an id"""
+    class Meta:
+        model = Artist
+        fields = ('id', 'name', 'description', 'founded_year', 'creator')
+
 class ArtistViewSet(ViewSet):
     def create(self, request):
         """POST a new artist"""
@@ -23,7 +61,7 @@ class ArtistViewSet(ViewSet):
         if error_message:
             return Response({'message': error_message}, status=status.HTTP_400_BAD_REQUEST)
 
-        rater = Rater.objects.get(user=request.auth.user)
+        rater = request.rater
 
         artist = Artist(
             name=request.data['name'],
@@ -43,10 +81,11 @@ class ArtistViewSet(ViewSet):
 
     def retrieve(self, request, pk=None):
         """GET an artist"""
-        artist = get_object_or_404(Artist, pk=pk)
+        artists = serialize_fragments(ArtistSerializer, get_artist_queryset(), [ int(pk) ])
+        if not artists:
+            raise Http404
 
-        serializer = ArtistSerializer(artist)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return conditional_response(request, artists[0])
 
     def update(self, request, pk=None):
         """PUT an artist"""
@@ -86,20 +125,35 @@ class ArtistViewSet(ViewSet):
         q = request.query_params.get('q', None)
         page = request.query_params.get('page', None)
         pageSize = request.query_params.get('pageSize', 10)
+        cursor = request.query_params.get('cursor', None)
 
         if q is not None:
             artists = self._filter_by_search_term(artists, q)
 
-        count = len(artists)
+        count, count_is_estimate = get_count(artists, request, [ Artist ])
+
+        # only load the ids of the page, and render the artists from cached fragments
+        artists = artists.only('id')
 
-        if page is not None:
+        next_cursor = None
+        if cursor is not None:
+            artists, next_cursor = cursor_paginate(artists, cursor, pageSize)
+        elif page is not None:
             artists = paginate(artists, page, pageSize)
 
-        serializer = ArtistSerializer(artists, many=True)
-        return Response({
-            "data": serializer.data,
+        artist_ids = [ artist.id for artist in artists ]
+        data = {
+            "data": serialize_fragments(ArtistSerializer, get_artist_queryset(), artist_ids),
             "count": count
-        })
+        }
+
+        if count_is_estimate:
+            data["countIsEstimate"] = True
+
+        if cursor is not None:
+            data["next"] = next_cursor
+
+        return conditional_response(request, data)
 
     def _validate(self):
         """Validate values sent in POST/PUT body - 
@@ -114,4 +168,4 @@ class ArtistViewSet(ViewSet):
 
     def _filter_by_search_term(self, artists, q):
         """Given an artists QuerySet, return it filtered by artist name containing q"""
-        return artists.filter(name__icontains=q)
+        return filter_by_search_term(artists, q)
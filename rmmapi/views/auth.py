@@ -1,12 +1,18 @@
 """Authentication Module"""
-import json
 from django.core.exceptions import ValidationError
+from django.conf import settings
 from django.http import HttpResponse
 from django.contrib.auth import authenticate, get_user_model
 from django.http.response import HttpResponseBadRequest, HttpResponseServerError
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rmmapi.authentication import RaterTokenAuthentication, create_signed_token
+from rmmapi.authentication import is_signed_token, revoke_signed_token
 from rmmapi.models import Rater
+from rmmapi.parsers import loads
+from rmmapi.renderers import dumps
+from rmmapi.routers import mark_primary_sticky
 
 User = get_user_model()
 
@@ -17,7 +23,7 @@ def login_user(request):
         request -- The full HTTP request object
     """
 
-    req_body = json.loads(request.body.decode())
+    req_body = loads(request.body)
 
     if request.method == 'POST':
 
@@ -25,7 +31,7 @@ def login_user(request):
         required_fields = [ 'username', 'password' ]
         for field in required_fields:
             if not field in req_body:
-                return HttpResponseBadRequest(json.dumps({ "message": f"Field `{field}` is required." }))
+                return HttpResponseBadRequest(dumps({ "message": f"Field `{field}` is required." }))
 
         # verify using the builtin authenticate method
         username = req_body['username']
@@ -34,13 +40,18 @@ def login_user(request):
 
         # If authentication successful, respond with the token
         if authenticated_user is not None:
-            token = Token.objects.get(user=authenticated_user)
-            data = json.dumps({ "valid": True, "token": token.key })
+            if settings.RMM_AUTH_TOKEN_FORMAT == 'signed':
+                rater_id = Rater.objects.filter(user=authenticated_user).values_list('id', flat=True).first()
+                token = create_signed_token(authenticated_user.id, rater_id)
+            else:
+                token = Token.objects.get(user=authenticated_user).key
+
+            data = dumps({ "valid": True, "token": token })
             return HttpResponse(data, content_type='application/json')
 
         # Credentials did not match existing user, cannot log user in
         else:
-            data = json.dumps({ "valid": False })
+            data = dumps({ "valid": False })
             return HttpResponseBadRequest(data, content_type='application/json')
 
 @csrf_exempt
@@ -52,23 +63,23 @@ def register_user(request):
 
     if request.method == "POST":
         # Get the POST body
-        req_body = json.loads(request.body.decode())
+        req_body = loads(request.body)
 
         # Verify all required values are present
         required_fields = [ 'username', 'email', 'password', 'first_name', 'last_name', 'bio' ]
         for field in required_fields:
             if not field in req_body:
-                return HttpResponseBadRequest(json.dumps({ "message": f"Field `{field}` is required." }))
+                return HttpResponseBadRequest(dumps({ "message": f"Field `{field}` is required." }))
 
         try:
             User.objects.get(username=req_body['username'])
-            return HttpResponseBadRequest(json.dumps({ "message": "A user with that username already exists." }))
+            return HttpResponseBadRequest(dumps({ "message": "A user with that username already exists." }))
         except:
             pass
 
         try:
             User.objects.get(email=req_body['email'])
-            return HttpResponseBadRequest(json.dumps({ "message": "A user with that email already exists." }))
+            return HttpResponseBadRequest(dumps({ "message": "A user with that email already exists." }))
         except:
             pass
 
@@ -91,9 +102,48 @@ def register_user(request):
         )
         rater.save()
 
-        # Generate a new token for the new user using REST framework's token generator
-        token = Token.objects.create(user=new_user)
+        # Generate a new token for the new user using REST framework's token generator,
+        # which database tokens are still looked up in even if a signed token is sent back
+        token = Token.objects.create(user=new_user).key
+
+        if settings.RMM_AUTH_TOKEN_FORMAT == 'signed':
+            token = create_signed_token(new_user.id, rater.id)
+
+        # The new rater may not be on the read replica yet, so their first requests read from the primary
+        mark_primary_sticky(token)
 
         # Return the token to the client
-        data = json.dumps({ "token": token.key })
+        data = dumps({ "token": token })
         return HttpResponse(data, content_type="application/json")
+
+@csrf_exempt
+def refresh_token(request):
+    """Exchange a valid token of either format for a new signed token, revoking the old
+    one if it was a signed token. Unless RMM_AUTH_TOKEN_FORMAT is 'signed', the database
+    token is sent back as it is instead.
+    Method arguments:
+        request -- The full HTTP request object
+    """
+
+    if request.method == 'POST':
+        try:
+            credentials = RaterTokenAuthentication().authenticate(request)
+        except AuthenticationFailed as ex:
+            return HttpResponse(dumps({ "message": ex.detail }), content_type='application/json', status=401)
+
+        if credentials is None:
+            data = dumps({ "message": "Authentication credentials were not provided." })
+            return HttpResponse(data, content_type='application/json', status=401)
+
+        user, token = credentials
+
+        # signed tokens may only be handed out when their denylist is shared by every worker
+        if settings.RMM_AUTH_TOKEN_FORMAT != 'signed':
+            return HttpResponse(dumps({ "token": token }), content_type='application/json')
+
+        if is_signed_token(token):
+            revoke_signed_token(token)
+
+        rater_id = request.rater.id if request.rater is not None else None
+        data = dumps({ "token": create_signed_token(user.id, rater_id) })
+        return HttpResponse(data, content_type='application/json')
@@ -1,9 +1,9 @@
 """Genre ViewSet and Serializers"""
 from rest_framework import serializers
 from rest_framework.viewsets import ViewSet
-from rest_framework.response import Response
 from rmmapi.models import Genre
-from rmmapi.helpers import paginate
+from rmmapi.helpers import paginate, cursor_paginate, conditional_response
+from rmmapi.cache import get_count
 
 class GenreSerializer(serializers.ModelSerializer):
     """JSON serializer for genre"""
@@ -19,20 +19,32 @@ class GenreViewSet(ViewSet):
         q = request.query_params.get('q', None)
         page = request.query_params.get('page', None)
         pageSize = request.query_params.get('pageSize', 10)
+        cursor = request.query_params.get('cursor', None)
 
         if q is not None:
             genres = self._filter_by_search_term(genres, q)
 
-        count = len(genres)
+        count, count_is_estimate = get_count(genres, request, [ Genre ])
 
-        if page is not None:
+        next_cursor = None
+        if cursor is not None:
+            genres, next_cursor = cursor_paginate(genres, cursor, pageSize)
+        elif page is not None:
             genres = paginate(genres, page, pageSize)
 
         serializer = GenreSerializer(genres, many=True)
-        return Response({
+        data = {
             "data": serializer.data,
             "count": count
-        })
+        }
+
+        if count_is_estimate:
+            data["countIsEstimate"] = True
+
+        if cursor is not None:
+            data["next"] = next_cursor
+
+        return conditional_response(request, data)
 
     def _filter_by_search_term(self, genres, q):
         """Given a Genres QuerySet, filter by those whose name contains search term q, case-insensitive"""
@@ -1,4 +1,7 @@
 """List ViewSet and Serializers"""
+from django.contrib.auth import get_user_model
+from django.db.models import BooleanField, Count, Exists, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.core.exceptions import ValidationError
@@ -6,17 +9,50 @@ from rest_framework import serializers, status
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rmmapi.helpers import get_missing_keys, paginate
-from rmmapi.models import List, Song, ListSong, Rater, ListFavorite
-from .rater import RaterSerializer
-
-class SongSerializer(serializers.ModelSerializer):
+from rmmapi.helpers import get_missing_keys, paginate, cursor_paginate, RowRenderer, Arg
+from rmmapi.helpers import conditional_response, get_generation_etag, is_not_modified, not_modified_response
+from rmmapi.cache import get_count, CachedFragmentMixin, CACHE_FRAGMENTS_CONTEXT
+from rmmapi.instrumentation import times_serialization
+from rmmapi.models import Artist, List, Song, SongSource, ListSong, Rater, ListFavorite
+from .artist import NestedArtistSerializer
+from .rater import RaterSerializer, serialize_raters
+
+# models that the data of a single list is built from
+LIST_DEPENDS_ON = [ List, ListSong, ListFavorite, Song, Artist, SongSource, Rater, get_user_model() ]
+
+def annotate_lists(lists, rater=None):
+    """Make a lists QuerySet load everything SimpleListSerializer reads up front -
+        creator (with user) is joined, and fav_count and has_rater_favorited (False
+        without a requesting rater) are annotated as subqueries, so serializing any
+        number of lists costs a single query
+    """
+    favorites = ListFavorite.objects.filter(list=OuterRef('pk'))
+    favorite_counts = favorites.order_by().values('list').annotate(count=Count('pk')).values('count')
+
+    lists = lists.select_related('creator__user').annotate(
+        fav_count=Coalesce(Subquery(favorite_counts), 0)
+    )
+
+    if rater is not None:
+        lists = lists.annotate(has_rater_favorited=Exists(favorites.filter(rater=rater)))
+    else:
+        lists = lists.annotate(has_rater_favorited=Value(False, output_field=BooleanField()))
+
+    return lists
+
+class SongSerializer(CachedFragmentMixin, serializers.ModelSerializer):
     """JSON serializer for a song"""
+    fragment_name = 'list_song'
+    artist = NestedArtistSerializer()
+
     class Meta:
         model = Song
         fields = ('id', 'name', 'year', 'artist', 'sources')
         depth = 1
 
+    def get_fragment_dependencies(self, data):
+        return [ (Artist._meta.label_lower, data['artist']['id']) ]
+
 class ListSongSerializer(serializers.ModelSerializer):
     """JSON serializer for ListSongs"""
     song = SongSerializer()
@@ -25,20 +61,43 @@ class ListSongSerializer(serializers.ModelSerializer):
         fields = ('id', 'song', 'description')
 
 class ListSerializer(serializers.ModelSerializer):
-    """JSON serializer for list"""
+    """JSON serializer for list, read from a QuerySet annotated by annotate_lists(lists, rater)"""
     songs = ListSongSerializer(many=True)
     creator = RaterSerializer()
+    fav_count = serializers.IntegerField()
+    has_rater_favorited = serializers.BooleanField()
     class Meta:
         model = List
         fields = ('id', 'name', 'description', 'songs', 'creator', 'fav_count', 'has_rater_favorited')
 
 class SimpleListSerializer(serializers.ModelSerializer):
-    """JSON serializer for list, sending fewer properties"""
+    """JSON serializer for list, sending fewer properties, read from a QuerySet annotated by annotate_lists"""
     creator = RaterSerializer()
+    fav_count = serializers.IntegerField()
     class Meta:
         model = List
         fields = ('id', 'name', 'description', 'creator', 'fav_count')
 
+# renders the same dicts as SimpleListSerializer, from values_list() rows of a QuerySet
+# annotated by annotate_lists, with the creator of each list passed in
+SIMPLE_LIST_ROWS = RowRenderer([
+    ('id', 'id'),
+    ('name', 'name'),
+    ('description', 'description'),
+    ('creator', Arg('creator')),
+    ('fav_count', 'fav_count')
+], extra_lookups=('creator_id',))
+
+@times_serialization
+def serialize_simple_lists(ids):
+    """Serialize the lists with the given ids, in order, as SimpleListSerializer does, from
+    values_list() rows and the cached fragments of their creators"""
+    lists = annotate_lists(List.objects.filter(pk__in=ids))
+    rows = { row[0]: row for row in SIMPLE_LIST_ROWS.values_list(lists) }
+    creators = serialize_raters([ row[-1] for row in rows.values() ])
+
+    return [ SIMPLE_LIST_ROWS.render(rows[id], creators[rows[id][-1]]) for id in ids if id in rows ]
+
 class ListViewSet(ViewSet):
     def create(self, request):
         """POST a new list"""
@@ -49,7 +108,7 @@ class ListViewSet(ViewSet):
         name = request.data['name']
         description = request.data['description']
         songs = request.data['songs']
-        rater = Rater.objects.get(user=request.auth.user)
+        rater = request.rater
 
         list = List(
             name=name,
@@ -58,8 +117,6 @@ class ListViewSet(ViewSet):
             created_at=timezone.now()
         )
 
-        list.has_rater_favorited = rater
-
         try:
             list.save()
         except ValidationError as ex:
@@ -76,16 +133,20 @@ class ListViewSet(ViewSet):
             except ValidationError as ex:
                 return Response({ "message": ex.args[0] }, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = ListSerializer(list)
+        serializer = ListSerializer(self._get_list(list.pk))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def retrieve(self, request, pk=None):
         """GET a single list by id"""
-        list = get_object_or_404(List, pk=pk)
-        list.has_rater_favorited = Rater.objects.get(user=request.auth.user)
+        rater = request.rater
+
+        # answer polling clients before loading the list if nothing it shows has changed
+        etag = get_generation_etag(LIST_DEPENDS_ON, pk, rater.id if rater is not None else None)
+        if etag is not None and is_not_modified(request, etag):
+            return not_modified_response(etag)
 
-        serializer = ListSerializer(list)
-        return Response(serializer.data)
+        serializer = ListSerializer(self._get_list(pk), context=CACHE_FRAGMENTS_CONTEXT)
+        return conditional_response(request, serializer.data, etag)
 
     def update(self, request, pk=None):
         """PUT a list"""
@@ -97,8 +158,6 @@ class ListViewSet(ViewSet):
         if error_message:
             return Response({'message': error_message}, status=status.HTTP_400_BAD_REQUEST)
 
-        list.has_rater_favorited = Rater.objects.get(user=request.auth.user)
-
         name = request.data["name"]
         description = request.data["description"]
         songs = request.data["songs"]
@@ -134,7 +193,7 @@ class ListViewSet(ViewSet):
             except ValidationError as ex:
                 return Response({ "message": ex.args[0] }, status=status.HTTP_400_BAD_REQUEST)
             
-        serializer = ListSerializer(list)
+        serializer = ListSerializer(self._get_list(list.pk))
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def destroy(self, request, pk=None):
@@ -155,6 +214,7 @@ class ListViewSet(ViewSet):
         favoritedBy = request.query_params.get('favoritedBy', None)
         page = request.query_params.get('page', None)
         pageSize = request.query_params.get('pageSize', 10)
+        cursor = request.query_params.get('cursor', None)
 
         if song_id is not None:
             lists = lists.filter(songs__song_id=song_id).distinct()
@@ -165,21 +225,35 @@ class ListViewSet(ViewSet):
         if favoritedBy is not None:
             lists = lists.filter(favorites__rater_id=favoritedBy)
 
-        count = len(lists)
+        count, count_is_estimate = get_count(lists, request, [ List, ListSong, ListFavorite ])
+
+        # only load the ids of the page, and render the lists from values() rows
+        lists = lists.only('id')
 
-        if page is not None:
+        next_cursor = None
+        if cursor is not None:
+            lists, next_cursor = cursor_paginate(lists, cursor, pageSize)
+        elif page is not None:
             lists = paginate(lists, page, pageSize)
 
-        serializer = SimpleListSerializer(lists, many=True)
-        return Response({
-            "data": serializer.data,
+        list_ids = [ list.id for list in lists ]
+        data = {
+            "data": serialize_simple_lists(list_ids),
             "count": count
-        })
+        }
+
+        if count_is_estimate:
+            data["countIsEstimate"] = True
+
+        if cursor is not None:
+            data["next"] = next_cursor
+
+        return conditional_response(request, data)
 
     @action(methods=['post', 'delete'], detail=True)
     def favorite(self, request, pk=None):
         list = get_object_or_404(List, pk=pk)
-        rater = Rater.objects.get(user=request.auth.user)
+        rater = request.rater
 
         if request.method == 'POST':
             """POST a new ListFavorite"""
@@ -215,6 +289,13 @@ class ListViewSet(ViewSet):
             list_favorite.delete()
             return Response({}, status=status.HTTP_204_NO_CONTENT)
 
+    def _get_list(self, pk):
+        """Get a list by id with everything ListSerializer reads, or raise Http404"""
+        lists = annotate_lists(List.objects.all(), self.request.rater).prefetch_related(
+            'songs__song__artist', 'songs__song__sources'
+        )
+        return get_object_or_404(lists, pk=pk)
+
     def _validate(self):
         """Validate values sent in POST/PUT body - 
             ensure all required properties are present,
@@ -0,0 +1,19 @@
+"""Metrics ViewSet"""
+from rest_framework import permissions
+from rest_framework.viewsets import ViewSet
+from rest_framework.response import Response
+from rmmapi.cache import fragment_cache, token_cache, compressed_cache
+from rmmapi.instrumentation import endpoint_metrics
+
+class MetricsViewSet(ViewSet):
+    permission_classes = [ permissions.IsAdminUser ]
+
+    def list(self, request):
+        """GET the in-process cache statistics and per-endpoint request statistics of the
+        worker serving the request, for monitoring"""
+        return Response({
+            "token_cache": token_cache.get_stats(),
+            "fragment_cache": fragment_cache.get_stats(),
+            "compressed_cache": compressed_cache.get_stats(),
+            "endpoints": endpoint_metrics.get_stats()
+        })
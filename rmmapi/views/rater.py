@@ -1,9 +1,10 @@
 """Rater ViewSet and Serializers"""
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from rest_framework.viewsets import ViewSet
-from rest_framework.response import Response
+from rmmapi.cache import CachedFragmentMixin, serialize_fragments
+from rmmapi.helpers import conditional_response, RowRenderer
 from rmmapi.models import Rater
 
 class UserSerializer(serializers.ModelSerializer):
@@ -12,25 +13,66 @@ class UserSerializer(serializers.ModelSerializer):
         model = get_user_model()
         fields = ('id', 'username', 'first_name', 'last_name')
 
-class RaterSerializer(serializers.ModelSerializer):
+# renders the same dicts as RaterSerializer, from values_list() rows
+RATER_ROWS = RowRenderer([
+    ('id', 'id'),
+    ('bio', 'bio'),
+    ('user', [
+        ('id', 'user__id'),
+        ('username', 'user__username'),
+        ('first_name', 'user__first_name'),
+        ('last_name', 'user__last_name')
+    ])
+])
+
+class RaterSerializer(CachedFragmentMixin, serializers.ModelSerializer):
     """JSON serializer for a rater"""
+    fragment_name = 'rater'
     user = UserSerializer()
 
     class Meta:
         model = Rater
         fields = ('id', 'bio', 'user')
 
+    def render_fragments(self, queryset, ids):
+        fragments = {}
+        for row in RATER_ROWS.values_list(queryset.filter(pk__in=ids)):
+            data = RATER_ROWS.render(row)
+            self.cache_fragment(data['id'], data)
+            fragments[data['id']] = data
+        return fragments
+
+    def get_fragment_dependencies(self, data):
+        return [ (get_user_model()._meta.label_lower, data['user']['id']) ]
+
+def get_rater_dependencies(rater_data):
+    """Get the fragment dependencies of a fragment that nests a rendered rater"""
+    return [
+        (Rater._meta.label_lower, rater_data['id']),
+        (get_user_model()._meta.label_lower, rater_data['user']['id'])
+    ]
+
+def serialize_raters(ids):
+    """Serialize raters from cached fragments, for nesting in other fragments
+    Returns: dictionary of rendered raters by id
+    """
+    raters = serialize_fragments(RaterSerializer, Rater.objects.select_related('user'), list(set(ids)))
+    return { rater['id']: rater for rater in raters }
+
 class RaterViewSet(ViewSet):
     def list(self, request):
         """GET the logged-in rater"""
-        rater = Rater.objects.get(user=request.auth.user)
+        # users made with `createsuperuser` have no rater
+        if request.rater is None:
+            raise Http404
 
-        serializer = RaterSerializer(rater)
-        return Response(serializer.data)
+        raters = serialize_fragments(RaterSerializer, Rater.objects.select_related('user'), [ request.rater.id ])
+        return conditional_response(request, raters[0])
 
     def retrieve(self, request, pk=None):
         """GET a single rater"""
-        rater = get_object_or_404(Rater, pk=pk)
+        raters = serialize_fragments(RaterSerializer, Rater.objects.select_related('user'), [ int(pk) ])
+        if not raters:
+            raise Http404
 
-        serializer = RaterSerializer(rater)
-        return Response(serializer.data)
+        return conditional_response(request, raters[0])
@@ -1,14 +1,19 @@
 """Rating ViewSet and Serializers"""
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from rest_framework import status, serializers
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
-from rmmapi.models import Rating, Song, Rater
-from rmmapi.helpers import get_missing_keys, paginate
-from .rater import RaterSerializer
-from .song import SongSerializer
+from rmmapi.models import Rating, Song
+from rmmapi.instrumentation import times_serialization
+from rmmapi.helpers import get_missing_keys, paginate, cursor_paginate, conditional_response
+from rmmapi.helpers import RowRenderer, Arg
+from rmmapi.cache import get_count, serialize_fragments
+from .rater import RaterSerializer, serialize_raters
+from .song import SongSerializer, get_song_queryset
 
 class RatingSerializer(serializers.ModelSerializer):
     """JSON serializer for rating"""
@@ -20,6 +25,32 @@ class RatingSerializer(serializers.ModelSerializer):
         fields = ('id', 'rating', 'review', 'created_at', 'rater', 'song')
         depth = 1
 
+# renders the same dicts as RatingSerializer, from values_list() rows, with the rater and
+# song of each rating passed in
+RATING_ROWS = RowRenderer([
+    ('id', 'id'),
+    ('rating', 'rating'),
+    ('review', 'review'),
+    ('created_at', ('created_at', serializers.DateTimeField().to_representation)),
+    ('rater', Arg('rater')),
+    ('song', Arg('song'))
+], extra_lookups=('rater_id', 'song_id'))
+
+@times_serialization
+def serialize_ratings(ids):
+    """Serialize the ratings with the given ids, in order, as RatingSerializer does, from
+    values_list() rows and the cached fragments of their raters and songs"""
+    rows = { row[0]: row for row in RATING_ROWS.values_list(Rating.objects.filter(pk__in=ids)) }
+
+    raters = serialize_raters([ row[-2] for row in rows.values() ])
+    song_ids = list({ row[-1] for row in rows.values() })
+    songs = { song['id']: song for song in serialize_fragments(SongSerializer, get_song_queryset(), song_ids) }
+
+    return [
+        RATING_ROWS.render(rows[id], raters[rows[id][-2]], songs[rows[id][-1]])
+        for id in ids if id in rows
+    ]
+
 class RatingViewSet(ViewSet):
     def create(self, request):
         """POST a new rating"""
@@ -27,7 +58,7 @@ class RatingViewSet(ViewSet):
         if error_message:
             return Response({'message': error_message}, status=status.HTTP_400_BAD_REQUEST)
 
-        rater = Rater.objects.get(user=request.auth.user)
+        rater = request.rater
         try:
             Rating.objects.get(song_id=request.data['song_id'], rater=rater)
             return Response({'message': 'User has already rated that song.'}, status=status.HTTP_400_BAD_REQUEST)
@@ -35,15 +66,17 @@ class RatingViewSet(ViewSet):
             pass
 
         rating = Rating(
-            rating=request.data['rating'],
+            rating=int(request.data['rating']),
             review=request.data['review'],
-            song_id=request.data['song_id'],
+            song_id=int(request.data['song_id']),
             rater=rater,
             created_at=timezone.now()
         )
 
         try:
-            rating.save()
+            with transaction.atomic():
+                rating.save()
+                Song.apply_rating_change(rating.song_id, 1, rating.rating)
         except ValidationError as ex:
             return Response({ "message": ex.args[0] }, status=status.HTTP_400_BAD_REQUEST)
         
@@ -52,10 +85,11 @@ class RatingViewSet(ViewSet):
 
     def retrieve(self, request, pk=None):
         """GET a single rating by id"""
-        rating = get_object_or_404(Rating, pk=pk)
+        ratings = serialize_ratings([ int(pk) ])
+        if not ratings:
+            raise Http404
 
-        serializer = RatingSerializer(rating)
-        return Response(serializer.data)
+        return conditional_response(request, ratings[0])
 
     def update(self, request, pk=None):
         """PUT a rating"""
@@ -67,12 +101,26 @@ class RatingViewSet(ViewSet):
         if error_message:
             return Response({'message': error_message}, status=status.HTTP_400_BAD_REQUEST)
 
-        rating.rating = request.data['rating']
-        rating.review = request.data['review']
-        rating.song_id = request.data['song_id']
-
         try:
-            rating.save()
+            with transaction.atomic():
+                # read the values being replaced under a row lock, so that concurrent
+                # updates of the rating each move the aggregates from the other's values
+                rating = get_object_or_404(Rating.objects.select_for_update(), pk=pk)
+                previous_song_id = rating.song_id
+                previous_rating = rating.rating
+
+                rating.rating = int(request.data['rating'])
+                rating.review = request.data['review']
+                rating.song_id = int(request.data['song_id'])
+                rating.save()
+
+                # move the rating between songs' aggregates if its song changed,
+                # otherwise just apply the change in value
+                if rating.song_id != previous_song_id:
+                    Song.apply_rating_change(previous_song_id, -1, -previous_rating)
+                    Song.apply_rating_change(rating.song_id, 1, rating.rating)
+                else:
+                    Song.apply_rating_change(rating.song_id, 0, rating.rating - previous_rating)
         except ValidationError as ex:
             return Response({ "message": ex.args[0] }, status=status.HTTP_400_BAD_REQUEST)
 
@@ -85,7 +133,13 @@ class RatingViewSet(ViewSet):
 
         self.check_object_permissions(request, rating.rater)
 
-        rating.delete()
+        with transaction.atomic():
+            # reload the rating under a row lock, so that of concurrent deletes of the
+            # rating only the one that removes it takes it out of its song's aggregates
+            rating = get_object_or_404(Rating.objects.select_for_update(), pk=pk)
+            rating.delete()
+            Song.apply_rating_change(rating.song_id, -1, -rating.rating)
+
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
     def list(self, request):
@@ -96,6 +150,7 @@ class RatingViewSet(ViewSet):
         song_id = request.query_params.get('songId', None)
         page = request.query_params.get('page', None)
         pageSize = request.query_params.get('pageSize', 10)
+        cursor = request.query_params.get('cursor', None)
 
         if user_id is not None:
             ratings = ratings.filter(rater_id=user_id)
@@ -105,16 +160,30 @@ class RatingViewSet(ViewSet):
 
         ratings = self._sort_by_query_string_param(ratings)
 
-        count = len(ratings)
+        count, count_is_estimate = get_count(ratings, request, [ Rating ])
 
-        if page is not None:
+        # only load the ids of the page, and render the ratings from values() rows
+        ratings = ratings.only('id')
+
+        next_cursor = None
+        if cursor is not None:
+            ratings, next_cursor = cursor_paginate(ratings, cursor, pageSize)
+        elif page is not None:
             ratings = paginate(ratings, page, pageSize)
 
-        serializer = RatingSerializer(ratings, many=True)
-        return Response({
-            "data": serializer.data,
+        rating_ids = [ rating.id for rating in ratings ]
+        data = {
+            "data": serialize_ratings(rating_ids),
             "count": count
-        })
+        }
+
+        if count_is_estimate:
+            data["countIsEstimate"] = True
+
+        if cursor is not None:
+            data["next"] = next_cursor
+
+        return conditional_response(request, data)
 
     def _validate(self):
         """Validate values sent in POST/PUT body - 
@@ -128,6 +197,13 @@ class RatingViewSet(ViewSet):
         if len(missing_keys) > 0:
             return f"Request body is missing the following required properties: {', '.join(missing_keys)}."
 
+        # form-encoded bodies hold strings, which the aggregates cannot be summed with
+        for key in [ 'rating', 'song_id' ]:
+            try:
+                int(self.request.data[key])
+            except (TypeError, ValueError):
+                return f"The {key} must be an integer."
+
         song_id = self.request.data['song_id']
         try:
             Song.objects.get(pk=song_id)
@@ -1,35 +1,60 @@
 """Search ViewSet and Serializers"""
+from functools import partial
+from django.conf import settings
 from rest_framework.viewsets import ViewSet
-from rest_framework.response import Response
 from rmmapi.models import Artist, Song, List
-from .artist import ArtistSerializer
-from .song import SongSerializer
-from .list import SimpleListSerializer
+from rmmapi.cache import serialize_fragments
+from rmmapi.helpers import conditional_response, fan_out
+from rmmapi.search import search, fuzzy_search, get_search_deadline
+from .artist import ArtistSerializer, get_artist_queryset
+from .song import SongSerializer, get_song_queryset
+from .list import serialize_simple_lists
+
+MAX_RESULTS = 25
 
 class SearchViewSet(ViewSet):
     def list(self, request):
-        """GET results for search query across artist, songs, and lists"""
+        """GET results for search query across artist, songs, and lists, best matches first.
+        If nothing of a type contains the search term, fall back to names similar to it.
+
+        The three searches run concurrently. Those that take longer than
+        RMM_SEARCH_BRANCH_TIMEOUT are left out, with `partial` set and their types
+        listed in `timedOut`."""
         search_term = self.request.query_params.get('q', None)
 
-        artists = []
-        songs = []
-        lists = []
+        results = { 'artists': [], 'songs': [], 'lists': [] }
+        timed_out = []
 
         if search_term is not None:
-            artists = Artist.objects.filter(name__icontains=search_term)
-            songs = Song.objects.filter(name__icontains=search_term)
-            lists = List.objects.filter(name__icontains=search_term)
-
-        artists = artists[0:25]
-        songs = songs[0:25]
-        lists = lists[0:25]
-
-        artists_data = ArtistSerializer(artists, many=True)
-        songs_data = SongSerializer(songs, many=True)
-        lists_data = SimpleListSerializer(lists, many=True)
-
-        return Response({
-            "artists": artists_data.data,
-            "songs": songs_data.data,
-            "lists": lists_data.data
-        })        
+            deadline = get_search_deadline()
+            found, timed_out = fan_out({
+                'artists': partial(self._search_artists, search_term, deadline),
+                'songs': partial(self._search_songs, search_term, deadline),
+                'lists': partial(self._search_lists, search_term, deadline)
+            }, settings.RMM_SEARCH_BRANCH_TIMEOUT)
+            results.update(found)
+
+        return conditional_response(request, {
+            **results,
+            "partial": bool(timed_out),
+            "timedOut": timed_out
+        })
+
+    def _search_artists(self, search_term, deadline):
+        ids = self._get_ids(Artist, search_term, deadline)
+        return serialize_fragments(ArtistSerializer, get_artist_queryset(), ids)
+
+    def _search_songs(self, search_term, deadline):
+        ids = self._get_ids(Song, search_term, deadline)
+        return serialize_fragments(SongSerializer, get_song_queryset(), ids)
+
+    def _search_lists(self, search_term, deadline):
+        return serialize_simple_lists(self._get_ids(List, search_term, deadline))
+
+    def _get_ids(self, model, search_term, deadline):
+        """Get the ids of the best matches for search_term, in ranked order,
+        falling back to a fuzzy search that must finish by deadline"""
+        ids = search(model, search_term, MAX_RESULTS)
+        if not ids:
+            ids = fuzzy_search(model, search_term, MAX_RESULTS, deadline)
+        return ids
@@ -1,16 +1,38 @@
 """Song ViewSet and Serializers"""
-from django.db.models import Q, Avg
-from django.db.models.expressions import Value
-from django.db.models.functions import Lower
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, F, Prefetch
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from rest_framework import status, serializers
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
-from rmmapi.helpers import get_missing_keys, paginate
-from rmmapi.models import Artist, Genre, Rater, Song, SongGenre, SongSource
-from .rater import RaterSerializer
+from rmmapi.helpers import get_missing_keys, paginate, cursor_paginate, conditional_response
+from rmmapi.helpers import RowRenderer, Arg
+from rmmapi.cache import get_count, get_channel, genre_bitmap_index, CachedFragmentMixin, serialize_fragments
+from rmmapi.models import Artist, Genre, Song, SongGenre, SongSource
+from rmmapi.search import filter_by_search_term
+from .artist import NestedArtistSerializer
+from .rater import RaterSerializer, get_rater_dependencies, serialize_raters
+
+# query parameters left for the other filters, cursor keys and count of /songs when the
+# genre bitmaps' candidate song ids are bound as parameters of the query
+GENRE_FILTER_RESERVED_PARAMS = 100
+
+def get_song_queryset():
+    """Build a songs QuerySet that loads everything SongSerializer reads up front -
+        artist and creator (with user) are joined, and genres (with genre) and sources
+        are prefetched, so serializing any number of songs costs a fixed number of queries.
+        Genres and sources are in the order they were added, as SongSerializer renders them.
+    """
+    return Song.objects.select_related(
+        'artist', 'creator__user'
+    ).prefetch_related(
+        Prefetch('genres', queryset=SongGenre.objects.select_related('genre').order_by('pk')),
+        Prefetch('sources', queryset=SongSource.objects.order_by('pk'))
+    )
 
 class SongGenresSerializer(serializers.ModelSerializer):
     class Meta:
@@ -18,7 +40,42 @@ class SongGenresSerializer(serializers.ModelSerializer):
         fields = ('id', 'genre')
         depth = 1
 
-class SongSerializer(serializers.ModelSerializer):
+# render the same dicts as SongSerializer, from values_list() rows, with the genres,
+# sources and creator of each song passed in
+SONG_ROWS = RowRenderer([
+    ('id', 'id'),
+    ('name', 'name'),
+    ('year', 'year'),
+    ('artist', [
+        ('id', 'artist__id'),
+        ('name', 'artist__name'),
+        ('description', 'artist__description'),
+        ('founded_year', 'artist__founded_year'),
+        ('creator', 'artist__creator_id')
+    ]),
+    ('genres', Arg('genres')),
+    ('sources', Arg('sources')),
+    ('created_at', ('created_at', serializers.DateTimeField().to_representation)),
+    ('avg_rating', 'avg_rating'),
+    ('creator', Arg('creator'))
+], extra_lookups=('creator_id',))
+
+SONG_GENRE_ROWS = RowRenderer([
+    ('id', 'id'),
+    ('genre', [ ('id', 'genre__id'), ('name', 'genre__name') ])
+], extra_lookups=('song_id',))
+
+SONG_SOURCE_ROWS = RowRenderer([
+    ('id', 'id'),
+    ('url', 'url'),
+    ('service', 'service'),
+    ('is_primary', 'is_primary'),
+    ('song', 'song_id')
+])
+
+class SongSerializer(CachedFragmentMixin, serializers.ModelSerializer):
+    fragment_name = 'song'
+    artist = NestedArtistSerializer()
     genres = SongGenresSerializer(many=True)
     creator = RaterSerializer()
     class Meta:
@@ -26,6 +83,37 @@ class SongSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'year', 'artist', 'genres', 'sources', 'created_at', 'avg_rating', 'creator')
         depth = 1
 
+    def render_fragments(self, queryset, ids):
+        # the genres and sources are queried separately rather than prefetched
+        rows = list(SONG_ROWS.values_list(queryset.prefetch_related(None).filter(pk__in=ids)))
+        song_ids = [ row[0] for row in rows ]
+
+        genres = { id: [] for id in song_ids }
+        for row in SONG_GENRE_ROWS.values_list(SongGenre.objects.filter(song_id__in=song_ids).order_by('pk')):
+            genres[row[-1]].append(SONG_GENRE_ROWS.render(row))
+
+        sources = { id: [] for id in song_ids }
+        for row in SONG_SOURCE_ROWS.values_list(SongSource.objects.filter(song_id__in=song_ids).order_by('pk')):
+            source = SONG_SOURCE_ROWS.render(row)
+            sources[source['song']].append(source)
+
+        creators = serialize_raters([ row[-1] for row in rows ])
+
+        fragments = {}
+        for row in rows:
+            data = SONG_ROWS.render(row, genres[row[0]], sources[row[0]], creators[row[-1]])
+            self.cache_fragment(data['id'], data)
+            fragments[data['id']] = data
+        return fragments
+
+    def get_fragment_dependencies(self, data):
+        dependencies = [ (Artist._meta.label_lower, data['artist']['id']) ]
+        dependencies.extend(
+            (Genre._meta.label_lower, song_genre['genre']['id']) for song_genre in data['genres']
+        )
+        dependencies.extend(get_rater_dependencies(data['creator']))
+        return dependencies
+
 class SongViewSet(ViewSet):
     def create(self, request):
         """POST a new song"""
@@ -39,7 +127,7 @@ class SongViewSet(ViewSet):
         genre_ids = request.data['genre_ids']
         sources = request.data['sources']
 
-        rater = Rater.objects.get(user=request.auth.user)
+        rater = request.rater
 
         song = Song(
             name=name,
@@ -83,10 +171,11 @@ class SongViewSet(ViewSet):
 
     def retrieve(self, request, pk=None):
         """GET a single song by id"""
-        song = get_object_or_404(Song, pk=pk)
+        songs = serialize_fragments(SongSerializer, get_song_queryset(), [ int(pk) ])
+        if not songs:
+            raise Http404
 
-        serializer = SongSerializer(song)
-        return Response(serializer.data)
+        return conditional_response(request, songs[0])
 
     def update(self, request, pk=None):
         """PUT a song"""
@@ -176,20 +265,24 @@ class SongViewSet(ViewSet):
             startYear - start year of songs to return results for
             endYear - end year of songs to return results for
             genres - comma-separated list of genre ids to return results for
+            genreMode - whether songs must have all of `genres` or any of them (one of: all, any)
             artist - id of artist to return results for
             q - search term to search song or artist names
             orderBy - field (one of: name, artist, year) to sort results by
             direction - direction to sort results in (one of: asc, desc)
+            cursor - `next` token from a previous response to page by cursor (empty for the first page)
         """
         songs = Song.objects.all()
 
         startYear = request.query_params.get('startYear', None)
         endYear = request.query_params.get('endYear', None)
         genres = request.query_params.get('genres', None)
+        genreMode = request.query_params.get('genreMode', 'all')
         artist = request.query_params.get('artist', None)
         q = request.query_params.get('q', None)
         page = request.query_params.get('page', None)
         pageSize = request.query_params.get('pageSize', 10)
+        cursor = request.query_params.get('cursor', None)
 
         if startYear is not None:
             try:
@@ -206,28 +299,40 @@ class SongViewSet(ViewSet):
             songs = songs.filter(year__lte=endYear)
         
         if genres is not None:
-            genres = genres.split(',')
-            for genre in genres:
-                songs = songs.filter(genres__genre_id=genre).distinct()
+            songs = self._filter_by_genres(songs, genres.split(','), genreMode)
 
         if artist is not None:
             songs = songs.filter(artist_id=artist)
 
         if q is not None:
-            songs = songs.filter(Q(artist__name__icontains=q) | Q(name__icontains=q))
+            songs = filter_by_search_term(songs, q)
 
         songs = self._sort_by_query_string_param(songs)
 
-        count = len(songs)
+        count, count_is_estimate = get_count(songs, request, [ Song, SongGenre, Artist ])
+
+        # only load the ids of the page, and render the songs from cached fragments
+        songs = songs.only('id')
 
-        if page is not None:
+        next_cursor = None
+        if cursor is not None:
+            songs, next_cursor = cursor_paginate(songs, cursor, pageSize)
+        elif page is not None:
             songs = paginate(songs, page, pageSize)
 
-        serializer = SongSerializer(songs, many=True)
-        return Response({
-            "data": serializer.data,
+        song_ids = [ song.id for song in songs ]
+        data = {
+            "data": serialize_fragments(SongSerializer, get_song_queryset(), song_ids),
             "count": count
-        })
+        }
+
+        if count_is_estimate:
+            data["countIsEstimate"] = True
+
+        if cursor is not None:
+            data["next"] = next_cursor
+
+        return conditional_response(request, data)
         
     def _validate(self):
         """Validate values sent in POST/PUT body - 
@@ -253,6 +358,9 @@ class SongViewSet(ViewSet):
         if len(genre_ids) == 0:
             return "You must specify at least one genre id in `genreIds` array."
 
+        if len(set(genre_ids)) != len(genre_ids):
+            return "`genreIds` array cannot contain any duplicate genre ids."
+
         for genre_id in genre_ids:
             try:
                 Genre.objects.get(pk=genre_id)
@@ -273,12 +381,53 @@ class SongViewSet(ViewSet):
 
         return False
 
+    def _filter_by_genres(self, songs, genre_ids, genre_mode):
+        """Given a songs QuerySet, filter it to songs with all (or, if genre_mode is `any`,
+        any) of the given genre ids, using the in-memory genre bitmaps when they match few
+        enough songs to list their ids in the query"""
+        genre_ids = { int(genre_id) for genre_id in genre_ids if genre_id.strip().isdigit() }
+
+        # without the invalidation channel, the bitmaps miss the writes of other workers
+        if get_channel().enabled:
+            song_ids = genre_bitmap_index.get_song_ids(
+                genre_ids, genre_mode, self._get_max_genre_bitmap_candidates(songs)
+            )
+            if song_ids is not None:
+                return songs.filter(pk__in=song_ids)
+
+        return self._filter_by_genres_subquery(songs, genre_ids, genre_mode)
+
+    def _get_max_genre_bitmap_candidates(self, songs):
+        """Get the most song ids that can be bound as parameters of the songs query,
+        leaving room for the parameters of the other filters"""
+        max_candidates = settings.RMM_GENRE_BITMAP_MAX_CANDIDATES
+
+        max_query_params = connections[songs.db].features.max_query_params
+        if max_query_params is not None:
+            max_candidates = min(max_candidates, max_query_params - GENRE_FILTER_RESERVED_PARAMS)
+
+        return max_candidates
+
+    def _filter_by_genres_subquery(self, songs, genre_ids, genre_mode):
+        """Filter songs by genre ids using a single subquery on SongGenre, rather than
+        joining SongGenre once per genre"""
+        song_genres = SongGenre.objects.filter(genre_id__in=genre_ids).values('song_id')
+
+        if genre_mode != 'any':
+            song_genres = song_genres.annotate(
+                genre_count=Count('genre_id', distinct=True)
+            ).filter(
+                genre_count=len(genre_ids)
+            ).values('song_id')
+
+        return songs.filter(pk__in=song_genres)
+
     def _sort_by_query_string_param(self, songs):
         """Sort songs QuerySet by `orderBy` query string param"""
         orderable_fields_dict = {
-            'name': Lower('name'),
-            'artist': Lower('artist__name'),
-            'avgRating': 'average_rating',
+            'name': 'sort_name',
+            'artist': 'artist__sort_name',
+            'avgRating': 'avg_rating',
             'year': 'year'
         }
 
@@ -290,17 +439,16 @@ class SongViewSet(ViewSet):
             # sort in direction indicated by `direction` query string param
             # or ascending, by default
             direction = self.request.query_params.get('direction', 'asc')
-            if direction == 'desc':
-                if order_by == 'name' or order_by == 'artist':
-                    order_field = order_field.desc()
-                else:
-                    order_field = '-' + order_field
 
-            # add annotation for average_rating to sort by computed property
             if order_by == 'avgRating':
-                songs = songs.annotate(
-                    average_rating=Avg('ratings__rating')
-                )
+                # unrated songs sort first in ascending order and last in descending order,
+                # on PostgreSQL too, which sorts NULLs the other way around by default
+                if direction == 'desc':
+                    return songs.order_by(F(order_field).desc(nulls_last=True))
+                return songs.order_by(F(order_field).asc(nulls_first=True))
+
+            if direction == 'desc':
+                order_field = '-' + order_field
 
             songs = songs.order_by(order_field)
 
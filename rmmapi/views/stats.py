@@ -1,8 +1,13 @@
 """Stats ViewSet and Serializers"""
+import datetime
+from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.viewsets import ViewSet
-from rest_framework.response import Response
-from rmmapi.models import Rater, Artist, Song, List
+from rmmapi.helpers import conditional_response, get_etag, is_not_modified, not_modified_response
+from rmmapi.models import SiteStats, SiteStatsSnapshot
+from rmmapi.models.site_stats import COUNTED_MODELS
+
+MAX_HISTORY_DAYS = 366
 
 class StatsSerializer(serializers.Serializer):
     users = serializers.IntegerField()
@@ -10,15 +15,50 @@ class StatsSerializer(serializers.Serializer):
     songs = serializers.IntegerField()
     lists = serializers.IntegerField()
 
+class StatsSnapshotSerializer(serializers.ModelSerializer):
+    """JSON serializer for the counts at the end of a day"""
+    class Meta:
+        model = SiteStatsSnapshot
+        fields = ('date', 'users', 'artists', 'songs', 'lists')
+
 class StatsViewSet(ViewSet):
     def list(self, request):
-        """GET stats for RateMyMusic site"""
-        data = {
-            "users": Rater.objects.count(),
-            "artists": Artist.objects.count(),
-            "songs": Song.objects.count(),
-            "lists": List.objects.count()
-        }
-
-        serializer = StatsSerializer(data)
-        return Response(serializer.data)
+        """GET stats for RateMyMusic site
+        Query string parameters:
+            history - number of days of daily snapshots of the stats to include, oldest first
+        """
+        history = request.query_params.get('history', None)
+
+        serializer = StatsSerializer(SiteStats.get())
+        data = serializer.data
+
+        if history is None:
+            return conditional_response(request, data)
+
+        # snapshots are only recorded (for today) by reconcile_stats, so the history is
+        # current as long as its window and the latest snapshot are; answer polling clients
+        # from those rather than loading every snapshot of the window
+        start_date = self._get_history_start_date(history)
+        latest_snapshot = SiteStatsSnapshot.objects.order_by('-date').values_list('date', *COUNTED_MODELS).first()
+        etag = get_etag([ data, start_date, latest_snapshot ])
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+
+        data['history'] = self._get_history(start_date)
+        return conditional_response(request, data, etag)
+
+    def _get_history_start_date(self, days):
+        """Get the date before the first day of a history of the last `days` days"""
+        try:
+            days = min(int(days), MAX_HISTORY_DAYS)
+        except ValueError:
+            days = 0
+
+        return timezone.localdate() - datetime.timedelta(days=days)
+
+    def _get_history(self, start_date):
+        """Get the daily snapshots after start_date, oldest first"""
+        snapshots = SiteStatsSnapshot.objects.filter(date__gt=start_date).order_by('date')
+
+        serializer = StatsSnapshotSerializer(snapshots, many=True)
+        return serializer.data
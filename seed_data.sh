@@ -16,3 +16,7 @@ python manage.py loaddata song_sources
 python manage.py loaddata song_genres
 python manage.py loaddata list_favorites
 python manage.py loaddata list_songs
+python manage.py rebuild_rating_aggregates
+python manage.py rebuild_sort_keys
+python manage.py rebuild_search_index
+python manage.py reconcile_stats
@@ -0,0 +1,49 @@
+"""Test runner for running the suite against SQLite or PostgreSQL
+
+Tests expect the ids of the rows they create to start after those already in the table,
+at 1 for an empty one, as SQLite does once a test's transaction is rolled back. The
+sequences of PostgreSQL are not rolled back, so they are reset before every test.
+
+PostgreSQL does not drop a database other sessions are connected to, so the connections
+kept open by the threads of rmmapi.helpers.fan_out and by the connection pools are
+closed before the test databases are destroyed.
+"""
+import unittest
+from django.apps import apps
+from django.core.management.color import no_style
+from django.db import connections
+from django.test import TestCase
+from django.test.runner import DiscoverRunner
+from rmmapi.backends.pool import get_pools
+from rmmapi.helpers.fan_out import shutdown as shutdown_fan_out
+
+class ResetSequencesMixin:
+    """Test result mixin resetting the sequences of every PostgreSQL database before each test"""
+    def startTest(self, test):
+        if isinstance(test, TestCase):
+            reset_sequences()
+        super().startTest(test)
+
+def reset_sequences():
+    for connection in connections.all():
+        if connection.vendor != 'postgresql' or connection.settings_dict['TEST'].get('MIRROR'):
+            continue
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), apps.get_models()):
+                cursor.execute(sql)
+
+class TestRunner(DiscoverRunner):
+    def get_resultclass(self):
+        resultclass = super().get_resultclass() or unittest.TextTestResult
+        return type(resultclass.__name__, (ResetSequencesMixin, resultclass), {})
+
+    def teardown_databases(self, old_config, **kwargs):
+        shutdown_fan_out()
+
+        # closing a pooled connection gives it back to its pool, which is then emptied
+        connections.close_all()
+        for pool in get_pools().values():
+            pool.clear()
+
+        super().teardown_databases(old_config, **kwargs)
@@ -2,9 +2,9 @@
 from django.urls import path
 from django.conf.urls import include
 from rest_framework import routers
-from rmmapi.views import login_user, register_user
+from rmmapi.views import login_user, register_user, refresh_token
 from rmmapi.views import ArtistViewSet, GenreViewSet, SongViewSet, SearchViewSet
-from rmmapi.views import ListViewSet, RatingViewSet, RaterViewSet, StatsViewSet
+from rmmapi.views import ListViewSet, RatingViewSet, RaterViewSet, StatsViewSet, MetricsViewSet
 
 router = routers.DefaultRouter(trailing_slash=False)
 router.register(r'artists', ArtistViewSet, 'artist')
@@ -15,9 +15,11 @@ router.register(r'ratings', RatingViewSet, 'rating')
 router.register(r'raters', RaterViewSet, 'rater')
 router.register(r'stats', StatsViewSet, 'stats')
 router.register(r'search', SearchViewSet, 'search')
+router.register(r'metrics', MetricsViewSet, 'metrics')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('register', register_user),
-    path('login', login_user)
+    path('login', login_user),
+    path('refresh', refresh_token)
 ]
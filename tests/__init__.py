@@ -1,9 +1,19 @@
 from .auth import AuthTests 
 from .artist import ArtistTests
 from .genre import GenreTests
-from .song import SongTests
+from .song import SongTests, SongGenreBitmapTests
 from .list import ListTests
 from .rating import RatingTests
 from .rater import RaterTests
 from .stats import StatsTests
-from .search import SearchTests
+from .search import SearchTests, SearchFanOutTests
+from .cache import CacheTests, FragmentCacheTests
+from .indexes import IndexTests
+from .sqlite import SQLiteTests
+from .database import DatabaseTests, PostgresBackendTests
+from .routers import RouterTests
+from .serializers import SerializerParityTests
+from .renderers import RendererTests, OrjsonRendererTests
+from .compression import CompressionTests, CompressionNegotiationTests
+from .budgets import QueryBudgetTests
+from .instrumentation import InstrumentationTests, InstrumentationHelperTests
@@ -1,6 +1,8 @@
 import json
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rmmapi.models import Artist
+from rmmapi.models.sort_key import get_sort_key
 
 class ArtistTests(APITestCase):
     def setUp(self):
@@ -144,6 +146,28 @@ class ArtistTests(APITestCase):
         self.assertEqual(updated_artist['founded_year'], 1996)
         self.assertEqual(updated_artist['description'], 'So good.')
 
+    def test_artist_sort_name(self):
+        """The sort name of an artist is normalized on create and on update"""
+        self.test_create_artist()
+        self.assertEqual(Artist.objects.get(pk=1).sort_name, 'magnetic fields')
+
+        data = {
+            'name': 'of Montreal',
+            'founded_year': 1996,
+            'description': 'So good.'
+        }
+
+        response = self.client.put('/artists/1', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Artist.objects.get(pk=1).sort_name, 'of montreal')
+
+    def test_get_sort_key(self):
+        self.assertEqual(get_sort_key('  Björk  Guðmundsdóttir '), 'bjork guðmundsdottir')
+        self.assertEqual(get_sort_key('The   Beatles'), 'beatles')
+        self.assertEqual(get_sort_key('Theatre of Tragedy'), 'theatre of tragedy')
+        self.assertEqual(get_sort_key('The'), 'the')
+        self.assertEqual(get_sort_key('STRASSE'), get_sort_key('Straße'))
+
     def test_update_artist_invalid_id(self):
         """Test attempting to update an artist by nonexistent id"""
         data = {
@@ -1,6 +1,15 @@
 import json
+import tempfile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
+from rmmapi.checks import check_signed_token_denylist
+
+User = get_user_model()
 
 class AuthTests(APITestCase):
     def test_register_user(self):
@@ -89,3 +98,197 @@ class AuthTests(APITestCase):
 
         json_response = json.loads(response.content)
         self.assertEqual(json_response['valid'], False)
+
+    def test_authenticated_request_resolves_rater_in_one_query(self):
+        self._login()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/raters')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['user']['username'], 'jweckert17')
+        self.assertEqual(len(self._get_auth_queries(queries)), 1)
+
+    def test_authenticated_request_with_cached_token_does_not_query(self):
+        self._login()
+        self.client.get('/raters')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/raters')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self._get_auth_queries(queries)), 0)
+
+    def test_cached_token_revoked_with_token(self):
+        self._login()
+        self.client.get('/raters')
+
+        Token.objects.all().delete()
+
+        response = self.client.get('/raters')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_token_revoked_with_inactive_user(self):
+        self._login()
+        self.client.get('/raters')
+
+        user = User.objects.get(username='jweckert17')
+        user.is_active = False
+        user.save()
+
+        response = self.client.get('/raters')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalid_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token notarealtoken')
+
+        response = self.client.get('/raters')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(RMM_AUTH_TOKEN_FORMAT='signed')
+    def test_signed_token_does_not_query_tokens(self):
+        self._login()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/raters')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['user']['username'], 'jweckert17')
+        self.assertEqual(len(self._get_auth_queries(queries)), 0)
+
+    @override_settings(RMM_AUTH_TOKEN_FORMAT='signed', RMM_SIGNED_TOKEN_MAX_AGE=-1)
+    def test_expired_signed_token(self):
+        self._login()
+
+        response = self.client.get('/raters')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(RMM_AUTH_TOKEN_FORMAT='signed')
+    def test_tampered_signed_token(self):
+        token = self._login()
+
+        tampered_token = token[:-1] + ('A' if token[-1] != 'A' else 'B')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + tampered_token)
+
+        response = self.client.get('/raters')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_database_token_to_signed_token(self):
+        self._login()
+
+        with override_settings(RMM_AUTH_TOKEN_FORMAT='signed'):
+            response = self.client.post('/refresh')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            token = json.loads(response.content)['token']
+            self.assertIn(':', token)
+            self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+
+            response = self.client.get('/raters')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_refresh_database_token_in_database_mode(self):
+        database_token = self._login()
+
+        # no signed token is handed out, as their denylist need not be shared in this mode
+        response = self.client.post('/refresh')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['token'], database_token)
+
+    def test_signed_token_rejected_in_database_mode(self):
+        with override_settings(RMM_AUTH_TOKEN_FORMAT='signed'):
+            self._login()
+
+        response = self.client.get('/raters')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.post('/refresh')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(RMM_AUTH_TOKEN_FORMAT='signed')
+    def test_refresh_revokes_old_signed_token(self):
+        old_token = self._login()
+
+        response = self.client.post('/refresh')
+        token = json.loads(response.content)['token']
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + old_token)
+        response = self.client.get('/raters')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        response = self.client.get('/raters')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_refresh_without_token(self):
+        response = self.client.post('/refresh')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(RMM_AUTH_TOKEN_FORMAT='signed')
+    def test_signed_token_revoked_with_inactive_user(self):
+        self._login()
+
+        user = User.objects.get(username='jweckert17')
+        user.is_active = False
+        user.save()
+
+        response = self.client.get('/raters')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_signed_tokens_require_shared_cache(self):
+        self.assertEqual(check_signed_token_denylist(None), [])
+
+        with override_settings(RMM_AUTH_TOKEN_FORMAT='signed'):
+            errors = check_signed_token_denylist(None)
+            self.assertEqual([ error.id for error in errors ], [ 'rmmapi.E001' ])
+
+            shared_cache = { 'default': { 'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp() } }
+            with override_settings(CACHES=shared_cache):
+                self.assertEqual(check_signed_token_denylist(None), [])
+
+    def _login(self):
+        self.test_register_user()
+        response = self.client.post('/login', { 'username': 'jweckert17', 'password': 'test' }, format='json')
+        token = json.loads(response.content)['token']
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+        return token
+
+    def _get_auth_queries(self, queries):
+        return [ query for query in queries.captured_queries if 'authtoken_token' in query['sql'] ]
+
+    def test_get_metrics(self):
+        self._login()
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        User.objects.filter(username='jweckert17').update(is_staff=True)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        metrics = json.loads(response.content)
+        self.assertGreater(metrics['token_cache']['hits'], 0)
+        self.assertIn('hit_ratio', metrics['token_cache'])
+        self.assertIn('evictions', metrics['fragment_cache'])
+
+    def test_get_metrics_as_staff_user_without_rater(self):
+        # as made by `createsuperuser`, with no Rater
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'test')
+        token = Token.objects.create(user=admin)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # and again with the token cached, and with a signed token
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with override_settings(RMM_AUTH_TOKEN_FORMAT='signed'):
+            response = self.client.post('/refresh')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.client.credentials(HTTP_AUTHORIZATION='Token ' + json.loads(response.content)['token'])
+
+            response = self.client.get('/metrics')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
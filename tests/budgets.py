@@ -0,0 +1,130 @@
+import json
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rmmapi.cache import token_cache
+from rmmapi.models import Genre, Rater
+
+class QueryBudgetMixin:
+    """Mixin for API test cases asserting the number of queries the requests they make
+    run, on every database and thread, as counted by rmmapi.middleware.InstrumentationMiddleware"""
+    def assertQueryBudget(self, response, budget):
+        """Assert that the request of a test client response ran at most `budget` queries"""
+        request = getattr(response, 'wsgi_request', None) or response.asgi_request
+        metrics = request.metrics
+        self.assertLessEqual(
+            metrics.queries, budget,
+            f"{metrics.endpoint} ran {metrics.queries} queries, over its budget of {budget}"
+        )
+
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """The number of queries of each endpoint does not grow with the number of objects it
+    returns, i.e. there are no N+1 queries"""
+    # number of artists, songs, ratings and lists, enough to make N+1 queries stand out
+    OBJECT_COUNT = 10
+
+    def setUp(self):
+        """Create two accounts, and OBJECT_COUNT artists, songs with two genres and two
+        sources, ratings and lists of every song, half of them favorited"""
+        self.tokens = [ self._register('jweckert17'), self._register('bjork') ]
+        self._use_token(0)
+
+        for name in [ 'Indie Pop', 'Post-Rock' ]:
+            Genre.objects.create(name=name)
+
+        for index in range(1, self.OBJECT_COUNT + 1):
+            self._post('/artists', { 'name': f"Artist {index}", 'description': 'A great band.', 'founded_year': 1990 })
+            self._post('/songs', {
+                'name': f"Song {index}",
+                'year': 1996,
+                'artist_id': index,
+                'genre_ids': [ 1, 2 ],
+                'sources': [
+                    { 'service': 'YouTube', 'url': f"https://www.youtube.com/watch?v={index}", 'is_primary': True },
+                    { 'service': 'Spotify', 'url': f"https://open.spotify.com/track/{index}", 'is_primary': False }
+                ]
+            })
+
+        for index in range(1, self.OBJECT_COUNT + 1):
+            self._use_token(index % 2)
+            self._post('/ratings', { 'rating': index % 5 + 1, 'review': 'Good.', 'song_id': index })
+            self._post('/lists', {
+                'name': f"List {index}",
+                'description': 'Some songs.',
+                'songs': [ { 'id': id, 'description': 'a song' } for id in range(1, self.OBJECT_COUNT + 1) ]
+            })
+
+            self._use_token(1 - index % 2)
+            if index % 2:
+                self._post(f"/lists/{index}/favorite", {})
+
+        self._use_token(0)
+
+        # count the queries of requests whose token is not cached
+        token_cache.clear()
+
+    def test_artists(self):
+        self.assertBudget('/artists', 5, self.OBJECT_COUNT)
+        self.assertBudget('/artists/1', 3)
+
+    def test_songs(self):
+        self.assertBudget('/songs', 7, self.OBJECT_COUNT)
+        # with the invalidation channel, the first genre filter also builds the genre
+        # bitmap index, in one query
+        self.assertBudget('/songs?genres=1', 8, self.OBJECT_COUNT)
+        self.assertBudget('/songs?genres=1,2&genreMode=any', 7, self.OBJECT_COUNT)
+        self.assertBudget('/songs/1', 5)
+
+    def test_ratings(self):
+        self.assertBudget('/ratings', 9, self.OBJECT_COUNT)
+        self.assertBudget('/ratings?songId=1', 9, 1)
+        self.assertBudget('/ratings/1', 7)
+
+    def test_lists(self):
+        rater = Rater.objects.get(user__username='jweckert17')
+
+        self.assertBudget('/lists', 5, self.OBJECT_COUNT)
+        self.assertBudget(f"/lists?favoritedBy={rater.id}", 5, self.OBJECT_COUNT // 2)
+        self.assertBudget('/lists/1', 6)
+
+    def test_raters(self):
+        rater = Rater.objects.get(user__username='bjork')
+
+        self.assertBudget('/raters', 2)
+        self.assertBudget(f"/raters/{rater.id}", 2)
+
+    def test_search(self):
+        self.assertBudget('/search?q=1', 12)
+
+    def test_stats(self):
+        self.assertBudget('/stats', 2)
+
+    def assertBudget(self, url, budget, count=None):
+        """GET a url, and assert that it ran at most `budget` queries and returned `count` objects"""
+        token_cache.clear()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertQueryBudget(response, budget)
+
+        if count is not None:
+            self.assertEqual(len(json.loads(response.content)['data']), count)
+
+    def _register(self, username):
+        data = {
+            'username': username,
+            'email': f"{username}@gmail.com",
+            'password': 'test',
+            'first_name': 'Jacob',
+            'last_name': 'Eckert',
+            'bio': 'I am just a cool boi.'
+        }
+
+        response = self.client.post('/register', data, format='json')
+        return json.loads(response.content)['token']
+
+    def _use_token(self, index):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.tokens[index])
+
+    def _post(self, url, data):
+        response = self.client.post(url, data, format='json')
+        self.assertLess(response.status_code, 300, response.content)
+        return response
@@ -0,0 +1,285 @@
+import json
+import os
+import tempfile
+from unittest.mock import patch
+from io import StringIO
+from django.core.management import call_command
+from django.db import transaction
+from django.test import SimpleTestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APITransactionTestCase
+from rmmapi.cache import fragment_cache, genre_bitmap_index, token_cache
+from rmmapi.cache.channel import InvalidationChannel
+from rmmapi.cache.genre_bitmap import GenreBitmapIndex
+from rmmapi.cache.tokens import TokenCache, CachedToken
+from rest_framework.authtoken.models import Token
+from rmmapi.models import Artist, Genre, Rater, Song
+
+class CacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.channel_path = os.path.join(directory.name, 'channel')
+
+    def test_channel_delivers_messages_to_other_channels(self):
+        publisher = InvalidationChannel(self.channel_path)
+        subscriber = InvalidationChannel(self.channel_path)
+
+        published_messages = []
+        publisher.subscribe('songs', published_messages.append)
+
+        received_messages = []
+        subscriber.subscribe('songs', received_messages.append)
+
+        publisher.publish('songs', 1)
+        subscriber.poll()
+        publisher.publish('songs', 2)
+        publisher.publish('artists', 3)
+        subscriber.poll()
+        publisher.poll()
+
+        self.assertEqual(received_messages, [ 2 ])
+        self.assertEqual(published_messages, [])
+
+    def test_channel_flushes_after_rotation(self):
+        publisher = InvalidationChannel(self.channel_path, max_size=64)
+        subscriber = InvalidationChannel(self.channel_path)
+
+        received_messages = []
+        subscriber.subscribe('songs', received_messages.append)
+
+        publisher.publish('songs', 1)
+        subscriber.poll()
+
+        publisher.publish('songs', 'a key long enough to go past the size limit')
+        subscriber.poll()
+
+        self.assertEqual(received_messages, [ None ])
+
+    def test_channel_delivers_messages_of_a_file_created_after_first_poll(self):
+        publisher = InvalidationChannel(self.channel_path)
+        subscriber = InvalidationChannel(self.channel_path)
+
+        received_messages = []
+        subscriber.subscribe('songs', received_messages.append)
+
+        # no file yet, so everything later written to it is new to the subscriber
+        subscriber.poll()
+        publisher.publish('songs', 1)
+        publisher.publish('songs', 2)
+        subscriber.poll()
+
+        self.assertEqual(received_messages, [ 1, 2 ])
+
+    def test_genre_bitmap_index(self):
+        index = GenreBitmapIndex()
+        index._bitmaps = {}
+        index._expires_at = float('inf')
+
+        index.add(1, 3, publish=False)
+        index.add(1, 200, publish=False)
+        index.add(2, 200, publish=False)
+        index.add(2, 9, publish=False)
+
+        self.assertEqual(index.get_song_ids({ 1, 2 }, 'all', 10), [ 200 ])
+        self.assertEqual(index.get_song_ids({ 1, 2 }, 'any', 10), [ 3, 9, 200 ])
+        self.assertEqual(index.get_song_ids({ 1, 2 }, 'any', 2), None)
+        self.assertEqual(index.get_song_ids({ 1, 3 }, 'all', 10), [])
+
+        index.remove(1, 200, publish=False)
+        self.assertEqual(index.get_song_ids({ 1, 2 }, 'all', 10), [])
+
+    @override_settings(RMM_GENRE_BITMAP_TTL=0)
+    def test_genre_bitmap_index_expires(self):
+        index = GenreBitmapIndex()
+        index._bitmaps = { 1: 1 << 3 }
+
+        # rebuilt from the database, where there are no songs
+        with patch.object(GenreBitmapIndex, '_build', return_value={}) as build:
+            self.assertEqual(index.get_song_ids({ 1 }, 'all', 10), [])
+        build.assert_called_once()
+
+    def test_genre_bitmap_index_rebuild_keeps_concurrent_changes(self):
+        index = GenreBitmapIndex()
+
+        def build_before_add():
+            """A song gets genre 1 (and is added to the index) after the build read SongGenre"""
+            if build.call_count == 1:
+                index.add(1, 3, publish=False)
+                return {}
+            return { 1: 1 << 3 }
+
+        with patch.object(GenreBitmapIndex, '_build', side_effect=build_before_add) as build:
+            self.assertEqual(index.get_song_ids({ 1 }, 'all', 10), [ 3 ])
+        self.assertEqual(build.call_count, 2)
+
+    def test_genre_bitmap_index_rebuild_gives_up_on_constant_changes(self):
+        index = GenreBitmapIndex()
+
+        def build_before_add():
+            index.add(1, 3, publish=False)
+            return {}
+
+        with patch.object(GenreBitmapIndex, '_build', side_effect=build_before_add):
+            self.assertIsNone(index.get_song_ids({ 1 }, 'all', 10))
+
+    @override_settings(RMM_TOKEN_CACHE_SIZE=2)
+    def test_token_cache_evicts_least_recently_used(self):
+        cache = TokenCache()
+        cache.set('a', CachedToken(1, 1, True))
+        cache.set('b', CachedToken(2, 2, True))
+        cache.get('a')
+        cache.set('c', CachedToken(3, 3, True))
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), CachedToken(1, 1, True))
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+        self.assertEqual(cache.get_stats()['hit_ratio'], 2 / 3)
+
+    @override_settings(RMM_TOKEN_CACHE_TTL=0)
+    def test_token_cache_entries_expire(self):
+        cache = TokenCache()
+        cache.set('a', CachedToken(1, 1, True))
+
+        self.assertIsNone(cache.get('a'))
+
+    def test_token_cache_invalidate_user(self):
+        cache = TokenCache()
+        cache.set('a', CachedToken(1, 1, True))
+        cache.set('b', CachedToken(1, 1, True))
+        cache.set('c', CachedToken(2, 2, True))
+
+        cache.invalidate_user(1, publish=False)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+
+class FragmentCacheTests(APITransactionTestCase):
+    """Fragments are not cached inside a transaction, so these tests commit their writes"""
+    def setUp(self):
+        fragment_cache.clear()
+        genre_bitmap_index.clear()
+
+        data = {
+            'username': 'jweckert17',
+            'email': 'jweckert17@gmail.com',
+            'password': 'test',
+            'first_name': 'Jacob',
+            'last_name': 'Eckert',
+            'bio': 'I am just a cool boi.'
+        }
+
+        response = self.client.post('/register', data, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + json.loads(response.content)['token'])
+
+        self.genre = Genre.objects.create(name="Indie Pop")
+        self.artist = Artist.objects.create(
+            name="The Magnetic Fields",
+            description="A great band.",
+            founded_year=1990,
+            creator=Rater.objects.get(user__username='jweckert17')
+        )
+
+        data = {
+            'name': 'Save a Secret for the Moon',
+            'year': 1996,
+            'artist_id': self.artist.id,
+            'genre_ids': [ self.genre.id ],
+            'sources': [ { 'service': 'YouTube', 'url': 'https://www.youtube.com/watch?v=4rk_9cYOp8A', 'is_primary': True }]
+        }
+
+        response = self.client.post('/songs', data, format='json')
+        self.song_id = json.loads(response.content)['id']
+
+    def test_song_fragment_is_reused(self):
+        self.client.get(f"/songs/{self.song_id}")
+        hits = fragment_cache.hits
+
+        response = self.client.get(f"/songs/{self.song_id}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['name'], 'Save a Secret for the Moon')
+        self.assertEqual(fragment_cache.hits, hits + 1)
+
+        response = self.client.get('/songs')
+        self.assertEqual(json.loads(response.content)['data'][0]['name'], 'Save a Secret for the Moon')
+        self.assertEqual(fragment_cache.hits, hits + 2)
+
+    def test_song_fragment_invalidated_by_artist_change(self):
+        self.client.get('/songs')
+
+        self.artist.name = 'Future Bible Heroes'
+        self.artist.save()
+
+        response = self.client.get('/songs')
+        self.assertEqual(json.loads(response.content)['data'][0]['artist']['name'], 'Future Bible Heroes')
+
+    def test_song_fragment_invalidated_by_genre_and_rating_changes(self):
+        self.client.get(f"/songs/{self.song_id}")
+
+        self.genre.name = 'Synth Pop'
+        self.genre.save()
+
+        response = self.client.get(f"/songs/{self.song_id}")
+        self.assertEqual(json.loads(response.content)['genres'][0]['genre']['name'], 'Synth Pop')
+
+        data = {
+            "rating": 4,
+            "song_id": self.song_id,
+            "review": "So good!"
+        }
+        self.client.post('/ratings', data, format='json')
+
+        response = self.client.get(f"/songs/{self.song_id}")
+        self.assertEqual(json.loads(response.content)['avg_rating'], 4)
+
+    def test_song_fragment_removed_after_delete(self):
+        self.client.get(f"/songs/{self.song_id}")
+        self.client.delete(f"/songs/{self.song_id}")
+
+        response = self.client.get(f"/songs/{self.song_id}")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(RMM_FRAGMENT_CACHE_SIZE=2)
+    def test_fragment_cache_size_is_bounded(self):
+        self.client.get(f"/songs/{self.song_id}")
+        self.client.get(f"/artists/{self.artist.id}")
+
+        self.assertEqual(fragment_cache.get_stats()['size'], 2)
+
+    @override_settings(RMM_FRAGMENT_CACHE_TTL=0)
+    def test_song_fragment_expires(self):
+        self.client.get(f"/songs/{self.song_id}")
+
+        # a write that sends no signals, as one made by another worker without a channel
+        Song.objects.filter(pk=self.song_id).update(name='Strange Powers')
+
+        response = self.client.get(f"/songs/{self.song_id}")
+        self.assertEqual(json.loads(response.content)['name'], 'Strange Powers')
+
+    def test_song_fragment_invalidated_by_rebuilt_rating_aggregates(self):
+        self.client.post('/ratings', { 'rating': 4, 'song_id': self.song_id, 'review': 'So good!' }, format='json')
+
+        # the aggregates drift, and the song is cached as it then is
+        Song.objects.filter(pk=self.song_id).update(rating_count=0, rating_sum=0, avg_rating=None)
+        response = self.client.get(f"/songs/{self.song_id}")
+        self.assertIsNone(json.loads(response.content)['avg_rating'])
+
+        call_command('rebuild_rating_aggregates', stdout=StringIO())
+
+        response = self.client.get(f"/songs/{self.song_id}")
+        self.assertEqual(json.loads(response.content)['avg_rating'], 4)
+
+    def test_token_invalidated_again_on_commit(self):
+        token = Token.objects.get(user__username='jweckert17')
+        cached_token = token_cache.get(token.key)
+        self.assertIsNotNone(cached_token)
+
+        with transaction.atomic():
+            token.user.is_active = False
+            token.user.save()
+
+            # a request on another connection resolves the token before the write commits
+            token_cache.set(token.key, cached_token)
+
+        self.assertIsNone(token_cache.get(token.key))
@@ -0,0 +1,172 @@
+import gzip
+import json
+import zlib
+from unittest import skipIf, skipUnless
+from unittest.mock import patch
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rmmapi import compression
+from rmmapi.cache import compressed_cache
+from rmmapi.compression import negotiate_encoding
+from rmmapi.middleware import CompressionMiddleware
+from rmmapi.models import Artist, Genre, Rater
+
+class CompressionTests(APITestCase):
+    def setUp(self):
+        """Create an account, and enough artists for a page of them to be worth compressing"""
+        compressed_cache.clear()
+
+        data = {
+            'username': 'jweckert17',
+            'email': 'jweckert17@gmail.com',
+            'password': 'test',
+            'first_name': 'Jacob',
+            'last_name': 'Eckert',
+            'bio': 'I am just a cool boi.'
+        }
+
+        response = self.client.post('/register', data, format='json')
+        json_response = json.loads(response.content)
+        self.token = json_response['token']
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+        Genre.objects.create(name="Indie Pop")
+        rater = Rater.objects.get(user__username='jweckert17')
+        for index in range(20):
+            Artist.objects.create(
+                name=f"The Magnetic Fields {index}",
+                description="An amazing band.",
+                founded_year=1990,
+                creator=rater
+            )
+
+    @patch.object(compression, 'brotli', None)
+    def test_gzip(self):
+        response = self.client.get('/artists', HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+
+        artists = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(artists['data']), 20)
+
+    @skipUnless(compression.brotli, 'brotli is not installed')
+    def test_brotli(self):
+        response = self.client.get('/artists', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        artists = json.loads(compression.brotli.decompress(response.content))
+        self.assertEqual(len(artists['data']), 20)
+
+    def test_not_compressed_without_accept_encoding(self):
+        response = self.client.get('/artists')
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(len(json.loads(response.content)['data']), 20)
+
+    def test_not_compressed_below_min_size(self):
+        response = self.client.get('/genres', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(len(json.loads(response.content)['data']), 1)
+
+        with override_settings(RMM_COMPRESSION_MIN_SIZE=1024 * 1024):
+            response = self.client.get('/artists', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        # nor is a body that compression would make larger
+        with override_settings(RMM_COMPRESSION_MIN_SIZE=0):
+            response = self.client.get('/genres', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(len(json.loads(response.content)['data']), 1)
+
+    @patch.object(compression, 'brotli', None)
+    def test_compressed_bodies_are_cached(self):
+        first = self.client.get('/artists', HTTP_ACCEPT_ENCODING='gzip')
+
+        with patch.object(compression, 'compress') as compress:
+            second = self.client.get('/artists', HTTP_ACCEPT_ENCODING='gzip')
+        compress.assert_not_called()
+
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(compressed_cache.get_stats()['hits'], 1)
+
+        # a change to the artists changes the ETag, and so the cached body
+        artist = Artist.objects.first()
+        artist.name = 'Stephin Merritt'
+        artist.save()
+        third = self.client.get('/artists', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertIn('Stephin Merritt', gzip.decompress(third.content).decode())
+
+    @patch.object(compression, 'brotli', None)
+    def test_compressed_bodies_are_cached_by_content(self):
+        hits = compressed_cache.get_stats()['hits']
+
+        # indented and compact JSON share an ETag, but not a body
+        indented = self.client.get('/artists', HTTP_ACCEPT='application/json; indent=4', HTTP_ACCEPT_ENCODING='gzip')
+        compact = self.client.get('/artists', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertIn(b'\n    ', gzip.decompress(indented.content))
+        self.assertNotIn(b'\n', gzip.decompress(compact.content))
+        self.assertEqual(compressed_cache.get_stats()['hits'], hits)
+
+    @patch.object(compression, 'brotli', None)
+    def test_compressed_etag_is_weak(self):
+        response = self.client.get('/artists', HTTP_ACCEPT_ENCODING='gzip')
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+
+        response = self.client.get('/artists', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+class CompressionNegotiationTests(SimpleTestCase):
+    @patch.object(compression, 'brotli', None)
+    def test_negotiate_gzip(self):
+        self.assertEqual(negotiate_encoding('gzip, deflate, br'), 'gzip')
+        self.assertEqual(negotiate_encoding('GZIP;q=0.5'), 'gzip')
+        self.assertEqual(negotiate_encoding('*'), 'gzip')
+        self.assertIsNone(negotiate_encoding('gzip;q=0'))
+        self.assertIsNone(negotiate_encoding('*;q=0'))
+        self.assertIsNone(negotiate_encoding('deflate, identity'))
+        self.assertIsNone(negotiate_encoding(''))
+
+    @patch.object(compression, 'brotli', object())
+    def test_negotiate_brotli(self):
+        self.assertEqual(negotiate_encoding('gzip, deflate, br'), 'br')
+        self.assertEqual(negotiate_encoding('br;q=0, gzip'), 'gzip')
+
+    @patch.object(compression, 'brotli', None)
+    def test_streaming_response(self):
+        chunks = [ b'[', *([ b'{"name":"The Magnetic Fields"},' ] * 100), b'{}]' ]
+        request = RequestFactory().get('/songs', HTTP_ACCEPT_ENCODING='gzip')
+
+        middleware = CompressionMiddleware(lambda request: StreamingHttpResponse(iter(chunks), content_type='application/json'))
+        response = middleware(request)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+
+        # every chunk is flushed as it is compressed
+        compressed = list(response.streaming_content)
+        self.assertGreater(len(compressed), len(chunks) / 2)
+
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.assertEqual(decompressor.decompress(compressed[0]), b'[')
+        self.assertEqual(gzip.decompress(b''.join(compressed)), b''.join(chunks))
+
+    @skipIf(compression.brotli is None, 'brotli is not installed')
+    def test_streaming_response_brotli(self):
+        chunks = [ b'{"name":"The Magnetic Fields"}' ] * 100
+        request = RequestFactory().get('/songs', HTTP_ACCEPT_ENCODING='br')
+
+        middleware = CompressionMiddleware(lambda request: StreamingHttpResponse(iter(chunks), content_type='application/json'))
+        response = middleware(request)
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(b''.join(response.streaming_content)), b''.join(chunks))
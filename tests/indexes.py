@@ -0,0 +1,140 @@
+import json
+import re
+from unittest import skipUnless
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rmmapi.views.list import serialize_simple_lists
+
+@skipUnless(connection.vendor == 'sqlite', 'query plans are read with EXPLAIN QUERY PLAN of SQLite')
+class IndexTests(APITestCase):
+    def setUp(self):
+        """Create an account"""
+        data = {
+            'username': 'jweckert17',
+            'email': 'jweckert17@gmail.com',
+            'password': 'test',
+            'first_name': 'Jacob',
+            'last_name': 'Eckert',
+            'bio': 'I am just a cool boi.'
+        }
+
+        response = self.client.post('/register', data, format='json')
+        json_response = json.loads(response.content)
+        self.token = json_response['token']
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+    def test_ratings_by_user_sorted_by_date_use_index(self):
+        self.assertUsesIndex('/ratings?userId=1&orderBy=date&page=1', 'rmmapi_rating', 'rater_id', 'created_at')
+        self.assertUsesIndex('/ratings?userId=1&orderBy=date&direction=desc&page=1', 'rmmapi_rating', 'rater_id', 'created_at')
+
+    def test_ratings_by_song_sorted_by_date_use_index(self):
+        self.assertUsesIndex('/ratings?songId=1&orderBy=date&page=1', 'rmmapi_rating', 'song_id', 'created_at')
+
+    def test_songs_by_artist_sorted_by_year_use_index(self):
+        self.assertUsesIndex('/songs?artist=1&orderBy=year&page=1', 'rmmapi_song', 'artist_id', 'year')
+
+    def test_songs_by_year_range_use_index(self):
+        self.assertUsesIndex('/songs?startYear=1990&endYear=1999&page=1', 'rmmapi_song', 'year')
+        self.assertUsesIndex('/songs?startYear=1990&orderBy=year&page=1', 'rmmapi_song', 'year')
+
+    def test_songs_sorted_by_year_or_rating_use_index(self):
+        self.assertUsesIndex('/songs?orderBy=year&direction=desc&page=1', 'rmmapi_song', 'year')
+        self.assertUsesIndex('/songs?orderBy=avgRating&page=1', 'rmmapi_song', 'avg_rating')
+
+    def test_songs_sorted_by_name_use_index(self):
+        self.assertUsesIndex('/songs?orderBy=name&page=1', 'rmmapi_song', 'sort_name')
+        self.assertUsesIndex('/songs?orderBy=name&direction=desc&page=1', 'rmmapi_song', 'sort_name')
+
+    def test_songs_sorted_by_artist_use_index(self):
+        self.assertUsesIndex('/songs?orderBy=artist&page=1', 'rmmapi_artist', 'sort_name')
+
+    def test_lists_by_song_use_index(self):
+        self.assertUsesIndex('/lists?songId=1&page=1', 'rmmapi_listsong', 'song_id')
+
+    def test_lists_by_user_use_index(self):
+        self.assertUsesIndex('/lists?userId=1&page=1', 'rmmapi_list', 'creator_id')
+
+    def test_lists_favorited_by_user_use_index(self):
+        self.assertUsesIndex('/lists?favoritedBy=1&page=1', 'rmmapi_listfavorite', 'rater_id')
+
+    def test_list_favorite_counts_use_index(self):
+        """The fav_count subquery of every list endpoint finds favorites by list"""
+        with CaptureQueriesContext(connection) as queries:
+            serialize_simple_lists([ 1 ])
+
+        plan = self._explain(queries[0]['sql'])
+        self.assertIndexed(plan, 'rmmapi_listfavorite', 'list_id')
+
+    def test_unique_constraints(self):
+        """Songs are unique in a list and genres are unique on a song"""
+        with connection.cursor() as cursor:
+            for table, columns in [ ('rmmapi_listsong', [ 'list_id', 'song_id' ]), ('rmmapi_songgenre', [ 'song_id', 'genre_id' ]) ]:
+                constraints = connection.introspection.get_constraints(cursor, table)
+                self.assertTrue(
+                    any(constraint['unique'] and constraint['columns'] == columns for constraint in constraints.values()),
+                    f"{table} has no unique constraint on {columns}"
+                )
+
+    def assertUsesIndex(self, url, table, *columns):
+        """Assert that the main (paginated) query of a GET endpoint reads `table` through
+        an index starting with `columns`, and sorts without a temporary B-tree"""
+        plan = self._explain_main_query(url, 'rmmapi_' + url.split('?')[0].strip('/').rstrip('s'))
+        self.assertIndexed(plan, table, *columns)
+        self.assertFalse(
+            any('TEMP B-TREE FOR ORDER BY' in line for line in plan),
+            f"GET {url} sorts without an index:\n" + '\n'.join(plan)
+        )
+
+    def assertIndexed(self, plan, table, *columns):
+        """Assert that every step of a query plan reading `table` uses an index, and that one
+        of them is an index on `columns`"""
+        steps = [ line for line in plan if re.search(rf"\b(SCAN|SEARCH)( TABLE)? {table}\b", line) ]
+        self.assertTrue(steps, f"{table} is not read by the query:\n" + '\n'.join(plan))
+
+        for line in steps:
+            self.assertTrue(
+                'INDEX' in line or 'INTEGER PRIMARY KEY' in line,
+                f"{table} is scanned without an index:\n" + '\n'.join(plan)
+            )
+
+        index_columns = [ self._get_index_columns(table, re.search(r"INDEX (\w+)", line)) for line in steps ]
+        self.assertIn(
+            list(columns), [ index[:len(columns)] for index in index_columns ],
+            f"{table} is not read through an index on {columns}:\n" + '\n'.join(plan)
+        )
+
+    def _explain_main_query(self, url, table):
+        """Get the lines of the query plan of the paginated query that GET `url` runs on `table`"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        main_queries = [
+            query['sql'] for query in queries
+            if f'FROM "{table}"' in query['sql'] and 'LIMIT' in query['sql'] and not query['sql'].startswith('SELECT COUNT(')
+        ]
+        self.assertEqual(len(main_queries), 1, f"GET {url} did not run one paginated query on {table}")
+
+        return self._explain(main_queries[0])
+
+    def _explain(self, sql):
+        """Get the lines of the query plan of a query"""
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = [ row[-1] for row in cursor.fetchall() ]
+
+        # name the tables of subqueries, which the plan refers to by their aliases
+        for table, alias in re.findall(r'"(\w+)" (U\d+)\b', sql):
+            plan = [ re.sub(rf"\b{alias}\b", table, line) for line in plan ]
+
+        return plan
+
+    def _get_index_columns(self, table, index_match):
+        if index_match is None:
+            return []
+
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+        return constraints.get(index_match.group(1), {}).get('columns', [])
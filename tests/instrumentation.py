@@ -0,0 +1,124 @@
+import json
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rmmapi.instrumentation import endpoint_metrics, get_endpoint_name, start_request, stop_request
+from rmmapi.instrumentation import times_serialization
+from rmmapi.models import Genre
+from rmmapi.views import SongViewSet
+from rmmapi.views.auth import register_user
+
+class InstrumentationTests(APITestCase):
+    def setUp(self):
+        """Create an account, a genre, an artist and a song"""
+        endpoint_metrics.clear()
+
+        data = {
+            'username': 'jweckert17',
+            'email': 'jweckert17@gmail.com',
+            'password': 'test',
+            'first_name': 'Jacob',
+            'last_name': 'Eckert',
+            'bio': 'I am just a cool boi.'
+        }
+
+        response = self.client.post('/register', data, format='json')
+        json_response = json.loads(response.content)
+        self.token = json_response['token']
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+        Genre.objects.create(name="Indie Pop")
+        self.client.post('/artists', { 'name': 'The Magnetic Fields', 'description': 'A great band.', 'founded_year': 1990 }, format='json')
+        self.client.post('/songs', {
+            'name': 'Save a Secret for the Moon',
+            'year': 1996,
+            'artist_id': 1,
+            'genre_ids': [ 1 ],
+            'sources': [ { 'service': 'YouTube', 'url': 'https://www.youtube.com/watch?v=4rk_9cYOp8A', 'is_primary': True } ]
+        }, format='json')
+
+    def test_request_metrics(self):
+        response = self.client.get('/songs')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        metrics = response.wsgi_request.metrics
+        self.assertEqual(metrics.endpoint, 'song-list')
+        self.assertGreater(metrics.queries, 0)
+        self.assertGreater(metrics.db_time, 0)
+        self.assertGreater(metrics.serialization_time, 0)
+
+    def test_endpoint_metrics(self):
+        endpoint_metrics.clear()
+        responses = [ self.client.get('/songs'), self.client.get('/songs'), self.client.get('/songs/1') ]
+        self.client.get('/nothing-here')
+
+        stats = endpoint_metrics.get_stats()
+        self.assertEqual(sorted(stats), [ 'song-list', 'song-retrieve' ])
+        self.assertEqual(stats['song-list']['requests'], 2)
+        self.assertEqual(stats['song-retrieve']['requests'], 1)
+
+        self.assertEqual(stats['song-list']['size']['max'], len(responses[0].content))
+        self.assertEqual(stats['song-retrieve']['queries']['max'], responses[2].wsgi_request.metrics.queries)
+        self.assertGreaterEqual(stats['song-list']['duration_ms']['max'], stats['song-list']['db_ms']['max'])
+
+    def test_get_metrics(self):
+        User.objects.filter(username='jweckert17').update(is_staff=True)
+        self.client.get('/songs')
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        endpoints = json.loads(response.content)['endpoints']
+        self.assertEqual(endpoints['song-list']['requests'], 1)
+        self.assertIn('avg', endpoints['song-list']['serialization_ms'])
+
+    def test_no_server_timing(self):
+        response = self.client.get('/songs')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(DEBUG=True)
+    def test_server_timing(self):
+        response = self.client.get('/songs')
+
+        timings = dict(metric.split(';', 1) for metric in response['Server-Timing'].split(', '))
+        self.assertEqual(sorted(timings), [ 'db', 'serialization', 'total' ])
+        self.assertIn(f'desc="{response.wsgi_request.metrics.queries} queries"', timings['db'])
+
+class InstrumentationHelperTests(SimpleTestCase):
+    def test_endpoint_names(self):
+        view = SongViewSet.as_view({ 'get': 'list', 'post': 'create' }, basename='song')
+
+        self.assertEqual(get_endpoint_name(view, 'GET'), 'song-list')
+        self.assertEqual(get_endpoint_name(view, 'HEAD'), 'song-list')
+        self.assertEqual(get_endpoint_name(view, 'POST'), 'song-create')
+        self.assertEqual(get_endpoint_name(view, 'DELETE'), 'song-delete')
+        self.assertEqual(get_endpoint_name(register_user, 'POST'), 'register_user')
+
+    def test_serialization_timing(self):
+        calls = []
+
+        @times_serialization
+        def inner():
+            calls.append('inner')
+
+        @times_serialization
+        def outer():
+            inner()
+            inner()
+
+        metrics, token = start_request()
+        try:
+            outer()
+            serialization_time = metrics.serialization_time
+            outer()
+        finally:
+            stop_request(token)
+
+        self.assertEqual(len(calls), 4)
+        self.assertGreater(serialization_time, 0)
+        self.assertGreater(metrics.serialization_time, serialization_time)
+
+        # outside of a request there is nothing to count it against
+        outer()
+        self.assertEqual(len(calls), 6)
@@ -1,7 +1,15 @@
 import json
+import os
+import tempfile
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
-from rmmapi.models import Genre, Artist
+from rmmapi.helpers import get_etag
+from rmmapi.models import Genre, Artist, List
 
 class ListTests(APITestCase):
     def setUp(self):
@@ -173,6 +181,82 @@ class ListTests(APITestCase):
         self.assertEqual(len(list['songs'][1]['song']['sources']), 1)
         self.assertEqual(list['songs'][1]['description'], 'baby song')
 
+    def test_get_by_id_not_modified(self):
+        self.test_create_valid_list()
+
+        response = self.client.get('/lists/1')
+        etag = response['ETag']
+
+        response = self.client.get('/lists/1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.post('/lists/1/favorite')
+
+        response = self.client.get('/lists/1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(json.loads(response.content)['has_rater_favorited'], True)
+
+    def test_get_by_id_changed_by_another_worker(self):
+        self.test_create_valid_list()
+
+        response = self.client.get('/lists/1')
+        etag = response['ETag']
+
+        # a write whose signals this process never sees, as one handled by another worker
+        List.objects.filter(pk=1).update(name='Renamed')
+
+        response = self.client.get('/lists/1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['name'], 'Renamed')
+
+    @override_settings(
+        CACHES={ 'default': { 'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp() } },
+        RMM_INVALIDATION_CHANNEL=os.path.join(tempfile.mkdtemp(), 'channel')
+    )
+    def test_get_by_id_not_modified_with_shared_cache(self):
+        self.test_create_valid_list()
+
+        response = self.client.get('/lists/1')
+        etag = response['ETag']
+
+        # answered from the generation tokens, without loading the list
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/lists/1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse([ query for query in queries if 'rmmapi_list' in query['sql'] ])
+
+        self.client.post('/lists/1/favorite')
+
+        response = self.client.get('/lists/1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(CACHES={ 'default': { 'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp() } })
+    def test_get_by_id_not_modified_with_shared_cache_without_channel(self):
+        self.test_create_valid_list()
+
+        # fragments of other workers' writes are not invalidated here, so the ETag hashes the body
+        response = self.client.get('/lists/1')
+        etag = response['ETag']
+        self.assertEqual(etag, get_etag(json.loads(response.content)))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/lists/1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertTrue([ query for query in queries if 'rmmapi_list' in query['sql'] ])
+
+    def test_get_by_id_as_user_without_rater(self):
+        self.test_create_valid_list()
+
+        # as made by `createsuperuser`, with no Rater
+        admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'test')
+        token = Token.objects.create(user=admin)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        response = self.client.get('/lists/1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['has_rater_favorited'], False)
+
     def test_update_by_invalid_id(self):
         data = {
             "name": "My UPDATED List",
@@ -394,6 +478,35 @@ class ListTests(APITestCase):
         list = json.loads(response.content)
         self.assertEqual(list['fav_count'], 1)
 
+    def test_fav_count_of_lists_favorited_by_rater(self):
+        self.test_favorite_list()
+        self._create_second_valid_list_as_second_user()
+        self.client.post('/lists/1/favorite')
+
+        # fav_count counts every favorite, not just the ones matched by favoritedBy
+        response = self.client.get('/lists?favoritedBy=2')
+        lists = json.loads(response.content)
+        self.assertEqual(lists['count'], 1)
+        self.assertEqual(lists['data'][0]['fav_count'], 2)
+
+    def test_get_all_lists_query_count_does_not_grow_with_lists(self):
+        self.test_favorite_list()
+
+        with CaptureQueriesContext(connection) as one_list_queries:
+            self.client.get('/lists')
+
+        self._create_second_valid_list_as_second_user()
+        self.client.post('/lists/2/favorite')
+
+        with CaptureQueriesContext(connection) as two_list_queries:
+            response = self.client.get('/lists')
+
+        lists = json.loads(response.content)
+        self.assertEqual(lists['count'], 2)
+        self.assertEqual(lists['data'][0]['fav_count'], 1)
+        self.assertEqual(lists['data'][1]['fav_count'], 1)
+        self.assertEqual(len(two_list_queries), len(one_list_queries))
+
     def _create_second_valid_list_as_second_user(self):
         data = {
             'username': 'test',
@@ -1,5 +1,7 @@
 import json
+from django.contrib.auth import get_user_model
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
 
 class RaterTests(APITestCase):
@@ -40,3 +42,12 @@ class RaterTests(APITestCase):
         self.assertEqual(rater['id'], 1)
         self.assertEqual(rater['bio'], 'I am just a cool boi.')
         self.assertEqual(rater['user']['username'], 'jweckert17')
+
+    def test_get_logged_in_rater_as_user_without_rater(self):
+        # as made by `createsuperuser`, with no Rater
+        admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'test')
+        token = Token.objects.create(user=admin)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+        response = self.client.get('/raters')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
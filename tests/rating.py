@@ -1,7 +1,15 @@
+import base64
+import datetime
 import json
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from rest_framework import status
 from rest_framework.test import APITestCase
-from rmmapi.models import Genre, Artist
+from django.utils import timezone
+from rmmapi.models import Genre, Artist, Song, Rating, Rater
+from rmmapi.views import RatingViewSet
 
 class RatingTests(APITestCase):
     def setUp(self):
@@ -301,6 +309,200 @@ class RatingTests(APITestCase):
         self.assertEqual(ratings['data'][0]['id'], 2)
         self.assertEqual(ratings['data'][1]['id'], 1)
 
+    def test_get_all_ratings_by_cursor_sorted_by_date_desc(self):
+        self.test_create_valid_rating()
+        self._create_second_song_and_rating_as_second_user()
+
+        response = self.client.get('/ratings?orderBy=date&direction=desc&pageSize=1&cursor=')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        ratings = json.loads(response.content)
+        self.assertEqual(ratings['count'], 2)
+        self.assertEqual(ratings['data'][0]['id'], 2)
+
+        response = self.client.get(f"/ratings?orderBy=date&direction=desc&pageSize=1&cursor={ratings['next']}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        ratings = json.loads(response.content)
+        self.assertEqual(ratings['data'][0]['id'], 1)
+        self.assertIsNone(ratings['next'])
+
+    def test_get_all_ratings_by_cursor_of_another_order(self):
+        self.test_create_valid_rating()
+        self._create_second_song_and_rating_as_second_user()
+
+        # a cursor whose key is not a date returns the first page
+        cursor = base64.urlsafe_b64encode(json.dumps([ 'notadate', 1 ]).encode()).decode()
+        response = self.client.get(f'/ratings?orderBy=date&direction=desc&pageSize=1&cursor={cursor}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        ratings = json.loads(response.content)
+        self.assertEqual(ratings['data'][0]['id'], 2)
+        self.assertIsNotNone(ratings['next'])
+
+    def test_get_all_ratings_by_cursor_sorted_by_date_within_a_millisecond(self):
+        # microseconds apart, so cursors must keep the microseconds of their dates
+        rater = Rater.objects.get(user__username='jweckert17')
+        created_at = datetime.datetime(2021, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc)
+        for index in range(4):
+            Rating.objects.create(
+                rating=3, review='', song_id=1, rater=rater,
+                created_at=created_at + datetime.timedelta(microseconds=index * 100)
+            )
+        rating_ids = list(Rating.objects.order_by('created_at').values_list('id', flat=True))
+
+        for direction, expected_ids in [ ('asc', rating_ids), ('desc', rating_ids[::-1]) ]:
+            ids = []
+            cursor = ''
+            # bounded, as a cursor that repeats rows can page forever
+            while cursor is not None and len(ids) <= len(expected_ids):
+                response = self.client.get(f"/ratings?orderBy=date&direction={direction}&pageSize=2&cursor={cursor}")
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+                ratings = json.loads(response.content)
+                ids += [ rating['id'] for rating in ratings['data'] ]
+                cursor = ratings['next']
+
+            self.assertEqual(ids, expected_ids)
+
+    def test_song_rating_aggregates_after_create(self):
+        self.test_create_valid_rating()
+        self._create_second_song_and_rating_as_second_user()
+
+        song = Song.objects.get(pk=1)
+        self.assertEqual(song.rating_count, 1)
+        self.assertEqual(song.rating_sum, 3)
+        self.assertEqual(song.avg_rating, 3)
+
+    def test_song_rating_aggregates_after_update(self):
+        self.test_update_valid_rating()
+
+        song = Song.objects.get(pk=1)
+        self.assertEqual(song.rating_count, 1)
+        self.assertEqual(song.rating_sum, 5)
+        self.assertEqual(song.avg_rating, 5)
+
+    def test_song_rating_aggregates_after_update_to_different_song(self):
+        self._create_second_song_and_rating_as_second_user()
+
+        data = {
+            "rating": 2,
+            "song_id": 1,
+            "review": "Changed my mind, wrong song"
+        }
+
+        response = self.client.put('/ratings/1', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        rating = json.loads(response.content)
+        self.assertEqual(rating['song']['avg_rating'], 2)
+
+        song = Song.objects.get(pk=1)
+        self.assertEqual(song.rating_count, 1)
+        self.assertEqual(song.avg_rating, 2)
+
+        song = Song.objects.get(pk=2)
+        self.assertEqual(song.rating_count, 0)
+        self.assertEqual(song.rating_sum, 0)
+        self.assertEqual(song.avg_rating, None)
+
+    def test_song_rating_aggregates_after_form_encoded_update(self):
+        self.test_create_valid_rating()
+
+        response = self.client.put('/ratings/1', { 'rating': '5', 'song_id': '1', 'review': 'Actually, perfect' })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        song = Song.objects.get(pk=1)
+        self.assertEqual(song.rating_sum, 5)
+        self.assertEqual(song.avg_rating, 5)
+
+        response = self.client.put('/ratings/1', { 'rating': 'five', 'song_id': '1', 'review': 'Actually, perfect' })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_song_rating_aggregates_after_concurrent_update(self):
+        self.test_create_valid_rating()
+
+        def update_concurrently(viewset, request, obj):
+            """Another request changes the rating from 3 to 4 after this one loaded it"""
+            Rating.objects.filter(pk=1).update(rating=4)
+            Song.apply_rating_change(1, 0, 1)
+
+        data = {
+            "rating": 5,
+            "song_id": 1,
+            "review": "Actually, perfect"
+        }
+
+        with patch.object(RatingViewSet, 'check_object_permissions', update_concurrently):
+            response = self.client.put('/ratings/1', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        song = Song.objects.get(pk=1)
+        self.assertEqual(song.rating_sum, 5)
+        self.assertEqual(song.avg_rating, 5)
+
+    def test_song_rating_aggregates_after_delete(self):
+        self.test_delete_valid_rating()
+
+        song = Song.objects.get(pk=1)
+        self.assertEqual(song.rating_count, 0)
+        self.assertEqual(song.rating_sum, 0)
+        self.assertEqual(song.avg_rating, None)
+
+    def test_song_rating_aggregates_after_concurrent_delete(self):
+        self.test_create_valid_rating()
+
+        def delete_concurrently(viewset, request, obj):
+            """Another request deletes the rating after this one loaded it"""
+            Rating.objects.filter(pk=1).delete()
+            Song.apply_rating_change(1, -1, -3)
+
+        with patch.object(RatingViewSet, 'check_object_permissions', delete_concurrently):
+            response = self.client.delete('/ratings/1')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        song = Song.objects.get(pk=1)
+        self.assertEqual(song.rating_count, 0)
+        self.assertEqual(song.rating_sum, 0)
+        self.assertEqual(song.avg_rating, None)
+
+    def test_rebuild_rating_aggregates(self):
+        self.test_create_valid_rating()
+        self._create_second_song_and_rating_as_second_user()
+        Song.objects.filter(pk=1).update(rating_count=0, rating_sum=0, avg_rating=None)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rating_aggregates', check=True, stdout=StringIO())
+
+        call_command('rebuild_rating_aggregates', stdout=StringIO())
+        call_command('rebuild_rating_aggregates', check=True, stdout=StringIO())
+
+        song = Song.objects.get(pk=1)
+        self.assertEqual(song.rating_count, 1)
+        self.assertEqual(song.rating_sum, 3)
+        self.assertEqual(song.avg_rating, 3)
+
+    def test_rebuild_rating_aggregates_with_drifted_average(self):
+        self.test_create_valid_rating()
+        self._create_second_song_and_rating_as_second_user()
+
+        # only the averages drift: one is wrong, and one is left over on a song without ratings
+        Song.objects.filter(pk=1).update(avg_rating=2.5)
+        Rating.objects.filter(song_id=2).delete()
+        Song.objects.filter(pk=2).update(rating_count=0, rating_sum=0)
+
+        stdout = StringIO()
+        with self.assertRaisesMessage(CommandError, '2 song(s)'):
+            call_command('rebuild_rating_aggregates', check=True, stdout=stdout)
+        self.assertIn('Song 1:', stdout.getvalue())
+        self.assertIn('Song 2:', stdout.getvalue())
+
+        call_command('rebuild_rating_aggregates', stdout=StringIO())
+        call_command('rebuild_rating_aggregates', check=True, stdout=StringIO())
+
+        self.assertEqual(Song.objects.get(pk=1).avg_rating, 3)
+        self.assertIsNone(Song.objects.get(pk=2).avg_rating)
+
     def _create_second_song_and_rating_as_second_user(self):
         # create second user and use their credentials
         data = {
@@ -0,0 +1,82 @@
+import datetime
+import io
+import json
+from decimal import Decimal
+from unittest import skipIf
+from unittest.mock import patch
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict
+from rmmapi import parsers, renderers
+from rmmapi.renderers import FastJSONRenderer, dumps
+from rmmapi.parsers import FastJSONParser
+
+DATA = {
+    'data': [
+        ReturnDict([
+            ('id', 1),
+            ('name', 'Sigur Rós – Svefn-g-englar ✨'),
+            ('created_at', datetime.datetime(2021, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc)),
+            ('naive', datetime.datetime(2021, 1, 2, 3, 4, 5)),
+            ('day', datetime.date(2021, 1, 2)),
+            ('avg_rating', 3.6666666666666665),
+            ('price', Decimal('1.10')),
+            ('review', 'line separator \u2028 paragraph separator \u2029'),
+            ('message', gettext_lazy('Invalid token.')),
+            ('is_primary', True),
+            ('missing', None)
+        ], serializer=None)
+    ],
+    'count': 1,
+    1: 'non-string key'
+}
+
+class RendererTests(SimpleTestCase):
+    def test_renders_like_json_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(DATA), JSONRenderer().render(DATA))
+
+    def test_renders_without_orjson(self):
+        with patch.object(renderers, 'orjson', None):
+            self.assertEqual(FastJSONRenderer().render(DATA), JSONRenderer().render(DATA))
+
+    def test_renders_large_integers(self):
+        self.assertEqual(FastJSONRenderer().render({ 'id': 2 ** 70 }), JSONRenderer().render({ 'id': 2 ** 70 }))
+
+    def test_renders_indented(self):
+        rendered = FastJSONRenderer().render(DATA, 'application/json; indent=4')
+        self.assertEqual(rendered, JSONRenderer().render(DATA, 'application/json; indent=4'))
+
+    def test_renders_nothing_for_none(self):
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_dumps_sorted_keys(self):
+        self.assertEqual(dumps({ 'b': 1, 'a': [ 2 ] }, sort_keys=True), b'{"a":[2],"b":1}')
+
+    def test_parses_json(self):
+        content = json.dumps({ 'name': 'Sigur Rós', 'genre_ids': [ 1, 2 ], 'rating': 4.5 }).encode()
+
+        self.assertEqual(self._parse(FastJSONParser(), content), self._parse(JSONParser(), content))
+        with patch.object(parsers, 'orjson', None):
+            self.assertEqual(self._parse(FastJSONParser(), content), self._parse(JSONParser(), content))
+
+    def test_rejects_invalid_json(self):
+        for content in [ b'{"name": ', b'{"rating": NaN}' ]:
+            with self.assertRaises(ParseError):
+                self._parse(FastJSONParser(), content)
+
+            with patch.object(parsers, 'orjson', None), self.assertRaises(ParseError):
+                self._parse(FastJSONParser(), content)
+
+    def _parse(self, parser, content):
+        return parser.parse(io.BytesIO(content), 'application/json', { 'encoding': 'utf-8' })
+
+@skipIf(renderers.orjson is None, 'orjson is not installed')
+class OrjsonRendererTests(SimpleTestCase):
+    def test_renders_with_orjson(self):
+        with patch.object(renderers.orjson, 'dumps', wraps=renderers.orjson.dumps) as orjson_dumps:
+            FastJSONRenderer().render(DATA)
+        orjson_dumps.assert_called_once()
@@ -0,0 +1,177 @@
+import json
+import tempfile
+from unittest.mock import patch
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rmmapi.models import Artist
+from rmmapi.cache import fragment_cache, genre_bitmap_index
+from rmmapi.checks import check_replica_sticky_cache
+from rmmapi.routers import ReplicaRouter, start_routing, stop_routing, read_from_replica, reading_from_primary
+from rmmapi.views.artist import ArtistSerializer
+
+@override_settings(RMM_REPLICA_DATABASE='replica')
+class RouterTests(APITestCase):
+    def setUp(self):
+        """Create two accounts and an artist"""
+        cache.clear()
+
+        self.token = self.register('jweckert17')
+        self.other_token = self.register('otherrater')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+
+        Artist.objects.create(name="Beach House", description="Dream pop duo", founded_year=2004, creator_id=1)
+
+        # the replica catches up with the registrations
+        cache.clear()
+
+    def register(self, username):
+        """Register an account
+        Returns: the token of the account
+        """
+        data = {
+            'username': username,
+            'email': f"{username}@gmail.com",
+            'password': 'test',
+            'first_name': 'Jacob',
+            'last_name': 'Eckert',
+            'bio': 'I am just a cool boi.'
+        }
+
+        response = self.client.post('/register', data, format='json')
+        return json.loads(response.content)['token']
+
+    def record_reads(self):
+        """Record the databases the router picks for reads, while running them all on the
+        default database (the tests have no replica)
+        Returns: patcher to use as a context manager, and the list the picks are added to
+        """
+        reads = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def record_read(router, model, **hints):
+            reads.append(db_for_read(router, model, **hints))
+            return DEFAULT_DB_ALIAS
+
+        return patch.object(ReplicaRouter, 'db_for_read', record_read), reads
+
+    def test_list_and_retrieve_read_from_replica(self):
+        for url in [ '/artists', '/artists/1', '/stats' ]:
+            patcher, reads = self.record_reads()
+            with patcher:
+                response = self.client.get(url)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn('replica', reads)
+
+    def test_writes_read_from_primary(self):
+        patcher, reads = self.record_reads()
+        with patcher:
+            response = self.client.put('/artists/1', {
+                'name': 'Beach House',
+                'description': 'Baltimore dream pop duo',
+                'founded_year': 2004
+            }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('replica', reads)
+
+    def test_reads_stick_to_primary_after_write(self):
+        self.client.put('/artists/1', {
+            'name': 'Beach House',
+            'description': 'Baltimore dream pop duo',
+            'founded_year': 2004
+        }, format='json')
+
+        patcher, reads = self.record_reads()
+        with patcher:
+            response = self.client.get('/artists/1')
+
+        self.assertEqual(json.loads(response.content)['description'], 'Baltimore dream pop duo')
+        self.assertTrue(reads)
+        self.assertNotIn('replica', reads)
+
+        # other tokens still read from the replica
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.other_token)
+        patcher, reads = self.record_reads()
+        with patcher:
+            self.client.get('/artists')
+        self.assertIn('replica', reads)
+
+    def test_registration_sticks_to_primary(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.register('newrater'))
+
+        patcher, reads = self.record_reads()
+        with patcher:
+            self.client.get('/artists')
+        self.assertNotIn('replica', reads)
+
+    def test_replica_requires_shared_cache(self):
+        errors = check_replica_sticky_cache(None)
+        self.assertEqual([ error.id for error in errors ], [ 'rmmapi.E002' ])
+
+        shared_cache = { 'default': { 'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp() } }
+        with override_settings(CACHES=shared_cache):
+            self.assertEqual(check_replica_sticky_cache(None), [])
+
+        with override_settings(RMM_REPLICA_DATABASE=None):
+            self.assertEqual(check_replica_sticky_cache(None), [])
+
+    @override_settings(RMM_REPLICA_DATABASE=None)
+    def test_no_replica(self):
+        patcher, reads = self.record_reads()
+        with patcher:
+            self.client.get('/artists')
+
+        self.assertTrue(reads)
+        self.assertNotIn('replica', reads)
+
+    def test_router_reads_own_writes(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Artist), DEFAULT_DB_ALIAS)
+
+        token = start_routing()
+        read_from_replica()
+        self.assertEqual(router.db_for_read(Artist), 'replica')
+
+        self.assertEqual(router.db_for_write(Artist), DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_read(Artist), DEFAULT_DB_ALIAS)
+        self.assertTrue(stop_routing(token))
+
+    def test_cache_filling_reads_from_primary(self):
+        """The rows cached in process are read from the primary, which the replica may lag behind"""
+        patcher, reads = self.record_reads()
+        with patcher:
+            token = start_routing()
+            read_from_replica()
+            try:
+                Artist.objects.count()
+
+                genre_bitmap_index.clear()
+                genre_bitmap_index.get_song_ids([ 1 ], 'all', 100)
+
+                with reading_from_primary():
+                    Artist.objects.count()
+            finally:
+                stop_routing(token)
+
+        # the genre bitmaps are read from the primary without consulting the router
+        self.assertEqual(reads, [ 'replica', DEFAULT_DB_ALIAS ])
+
+    def test_fragments_read_from_replica_not_cached(self):
+        fragment_cache.clear()
+        token = start_routing()
+        read_from_replica()
+        try:
+            serializer = ArtistSerializer(context={ 'cache_fragments': True })
+            with patch.object(fragment_cache, 'set') as set_fragment:
+                serializer.cache_fragment(1, { 'id': 1 })
+                set_fragment.assert_not_called()
+
+                with reading_from_primary():
+                    serializer.cache_fragment(1, { 'id': 1, 'creator': { 'id': 1, 'user': { 'id': 1 } } })
+                set_fragment.assert_called_once()
+        finally:
+            stop_routing(token)
@@ -1,7 +1,18 @@
 import json
+import threading
+from asgiref.sync import sync_to_async
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rmmapi.models import Genre
+from rmmapi.search import rebuild_search_index
+from rmmapi.views import SearchViewSet
+from .budgets import QueryBudgetMixin
 
 class SearchTests(APITestCase):
     def setUp(self):
@@ -102,6 +113,85 @@ class SearchTests(APITestCase):
         self.assertEqual(results['songs'][0]['name'], 'Famous')
         self.assertEqual(results['lists'][0]['name'], 'Bangers')
 
+    def test_search_results_use_search_index(self):
+        self._create_artist('The Magnetic Fields')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/search?q=magnetic')
+
+        results = json.loads(response.content)
+        self.assertEqual(len(results['artists']), 1)
+
+        if connection.vendor == 'sqlite':
+            self.assertTrue(any('MATCH' in query['sql'] for query in queries))
+
+    def test_search_results_matching_songs_by_artist_name_after_rename(self):
+        self._create_artist('zzz')
+        self._create_song('ABC', 1)
+
+        data = {
+            'name': 'The Magnetic Fields',
+            'founded_year': 1990,
+            'description': 'An amazing band.'
+        }
+        self.client.put('/artists/1', data, format='json')
+
+        response = self.client.get('/search?q=magnetic')
+        results = json.loads(response.content)
+
+        self.assertEqual(len(results['artists']), 1)
+        self.assertEqual(len(results['songs']), 1)
+        self.assertEqual(results['songs'][0]['name'], 'ABC')
+
+    def test_search_results_after_song_deleted(self):
+        self._create_artist('zzz')
+        self._create_song('Famous', 1)
+        self.client.delete('/songs/1')
+
+        response = self.client.get('/search?q=famous')
+        results = json.loads(response.content)
+
+        self.assertEqual(len(results['songs']), 0)
+
+    def test_search_results_after_rebuilding_index(self):
+        self._create_artist('The Magnetic Fields')
+        self._create_song('Famous', 1)
+
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        response = self.client.get('/search?q=famous')
+        results = json.loads(response.content)
+
+        self.assertEqual(len(results['songs']), 1)
+        self.assertEqual(results['songs'][0]['name'], 'Famous')
+
+    def test_search_results_matching_misspelled_names(self):
+        self._create_artist('The Magnetic Fields')
+        self._create_song('Famous', 1)
+        self._create_list('Bangers')
+
+        response = self.client.get('/search?q=magnetc feilds')
+        results = json.loads(response.content)
+
+        self.assertEqual(len(results['artists']), 1)
+        self.assertEqual(results['artists'][0]['name'], 'The Magnetic Fields')
+
+        response = self.client.get('/search?q=famos')
+        results = json.loads(response.content)
+
+        self.assertEqual(len(results['songs']), 1)
+        self.assertEqual(results['songs'][0]['name'], 'Famous')
+
+    def test_search_results_misspelled_names_past_deadline(self):
+        self._create_artist('The Magnetic Fields')
+
+        with override_settings(RMM_FUZZY_SEARCH_TIME_BUDGET=0):
+            response = self.client.get('/search?q=magnetc feilds')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = json.loads(response.content)
+        self.assertEqual(len(results['artists']), 0)
+
     def _create_artist(self, name):
         data = {
             'name': name,
@@ -131,4 +221,103 @@ class SearchTests(APITestCase):
                 { "id": 1, "description": "secret saving" }
             ]
         }
-        self.client.post('/lists', data, format='json')
\ No newline at end of file
+        self.client.post('/lists', data, format='json')
+
+class SearchFanOutTests(QueryBudgetMixin, APITransactionTestCase):
+    """Searches outside of a transaction, whose artist, song and list searches run concurrently"""
+    reset_sequences = True
+
+    def setUp(self):
+        # the search index is not flushed between tests
+        rebuild_search_index()
+        SearchTests.setUp(self)
+
+    _create_artist = SearchTests._create_artist
+    _create_song = SearchTests._create_song
+    _create_list = SearchTests._create_list
+
+    def test_search_results_all_matches(self):
+        self._create_artist('The Magnetic Fields')
+        self._create_song('Famous', 1)
+        self._create_list('Bangers')
+
+        threads = set()
+        search_artists = SearchViewSet._search_artists
+
+        def record_thread(viewset, *args):
+            threads.add(threading.get_ident())
+            return search_artists(viewset, *args)
+
+        with patch.object(SearchViewSet, '_search_artists', record_thread):
+            response = self.client.get('/search?q=a')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = json.loads(response.content)
+
+        self.assertEqual(results['artists'][0]['name'], 'The Magnetic Fields')
+        self.assertEqual(results['songs'][0]['name'], 'Famous')
+        self.assertEqual(results['lists'][0]['name'], 'Bangers')
+        self.assertFalse(results['partial'])
+        self.assertEqual(results['timedOut'], [])
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_search_results_partial_after_timeout(self):
+        self._create_artist('The Magnetic Fields')
+        self._create_song('Famous', 1)
+
+        release = threading.Event()
+
+        def slow_search(viewset, *args):
+            release.wait(5)
+            return []
+
+        try:
+            with patch.object(SearchViewSet, '_search_songs', slow_search):
+                with override_settings(RMM_SEARCH_BRANCH_TIMEOUT=0.1):
+                    response = self.client.get('/search?q=a')
+        finally:
+            release.set()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = json.loads(response.content)
+
+        self.assertTrue(results['partial'])
+        self.assertEqual(results['timedOut'], [ 'songs' ])
+        self.assertEqual(results['artists'][0]['name'], 'The Magnetic Fields')
+        self.assertEqual(results['songs'], [])
+
+    @override_settings(RMM_FAN_OUT_WORKERS=0)
+    def test_search_results_without_fan_out(self):
+        self._create_artist('The Magnetic Fields')
+
+        response = self.client.get('/search?q=mag')
+
+        results = json.loads(response.content)
+        self.assertEqual(results['artists'][0]['name'], 'The Magnetic Fields')
+        self.assertFalse(results['partial'])
+
+    def test_search_queries_of_every_thread_counted(self):
+        self._create_artist('The Magnetic Fields')
+        self._create_song('Famous', 1)
+        self._create_list('Bangers')
+
+        # the first search fills the caches the next ones read
+        self.client.get('/search?q=a')
+
+        with override_settings(RMM_FAN_OUT_WORKERS=0):
+            response = self.client.get('/search?q=a')
+        queries = response.wsgi_request.metrics.queries
+
+        response = self.client.get('/search?q=a')
+        self.assertEqual(response.wsgi_request.metrics.queries, queries)
+        self.assertQueryBudget(response, 5)
+
+    async def test_search_results_under_asgi(self):
+        await sync_to_async(self._create_artist)('The Magnetic Fields')
+
+        response = await self.async_client.get('/search?q=mag', AUTHORIZATION='Token ' + self.token)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = json.loads(response.content)
+        self.assertEqual(results['artists'][0]['name'], 'The Magnetic Fields')
+        self.assertFalse(results['partial'])
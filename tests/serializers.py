@@ -0,0 +1,138 @@
+import json
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rmmapi.cache import CachedFragmentMixin
+from rmmapi.models import Genre, List, Rater, Rating, Song
+from rmmapi.views.artist import ArtistSerializer, get_artist_queryset
+from rmmapi.views.list import SimpleListSerializer, annotate_lists, serialize_simple_lists
+from rmmapi.views.rater import RaterSerializer
+from rmmapi.views.rating import RatingSerializer, serialize_ratings
+from rmmapi.views.song import SongSerializer, get_song_queryset
+
+class SerializerParityTests(APITestCase):
+    """The values() row renderers render byte-identical JSON to the ModelSerializers"""
+    def setUp(self):
+        """Create two accounts, genres, artists, songs with several genres and sources,
+        ratings, and lists with favorites"""
+        self.tokens = [ self._register('jweckert17', 'Jacob'), self._register('bjork', 'Björk') ]
+        self._use_token(0)
+
+        for name in [ 'Indie Pop', 'Post-Rock', 'Shoegaze' ]:
+            Genre.objects.create(name=name)
+
+        self._post('/artists', { 'name': 'The Magnetic Fields', 'description': 'A great band.', 'founded_year': 1990 })
+        self._use_token(1)
+        self._post('/artists', { 'name': 'Sigur Rós', 'description': '"Hopelandic" ✨', 'founded_year': 1994 })
+
+        self._post('/songs', {
+            'name': 'Svefn-g-englar',
+            'year': 1999,
+            'artist_id': 2,
+            'genre_ids': [ 3, 1, 2 ],
+            'sources': [
+                { 'service': 'YouTube', 'url': 'https://www.youtube.com/watch?v=8L6O1l3pbzM', 'is_primary': False },
+                { 'service': 'Spotify', 'url': 'https://open.spotify.com/track/1', 'is_primary': True }
+            ]
+        })
+        self._use_token(0)
+        self._post('/songs', {
+            'name': 'Save a Secret for the Moon',
+            'year': 1996,
+            'artist_id': 1,
+            'genre_ids': [ 1 ],
+            'sources': [ { 'service': 'YouTube', 'url': 'https://www.youtube.com/watch?v=4rk_9cYOp8A', 'is_primary': True } ]
+        })
+
+        # the first song is rated twice, the second song is never rated
+        self._post('/ratings', { 'rating': 5, 'review': '', 'song_id': 1 })
+        self._use_token(1)
+        self._post('/ratings', { 'rating': 2, 'review': 'Tröllið 🎵', 'song_id': 1 })
+
+        self._post('/lists', { 'name': 'Post-rock', 'description': 'Long songs.', 'songs': [ { 'id': 1, 'description': 'the best one' } ] })
+        self._use_token(0)
+        self._post('/lists', { 'name': 'Mixtape', 'description': 'For the car.', 'songs': [ { 'id': 2, 'description': 'opener' } ] })
+        self.client.post('/lists/1/favorite')
+
+    def test_song_fragments(self):
+        song_ids = list(Song.objects.values_list('id', flat=True))
+        self.assertEqual(len(song_ids), 2)
+        self.assertIsNone(Song.objects.get(pk=2).avg_rating)
+
+        self.assertParity(SongSerializer(), get_song_queryset(), song_ids)
+
+    def test_song_fragments_query_count(self):
+        """Songs, their genres, their sources and their creators are one query each"""
+        with self.assertNumQueries(4):
+            SongSerializer().render_fragments(get_song_queryset(), [ 1, 2 ])
+
+    def test_artist_fragments(self):
+        self.assertParity(ArtistSerializer(), get_artist_queryset(), [ 1, 2 ])
+
+    def test_rater_fragments(self):
+        rater_ids = list(Rater.objects.values_list('id', flat=True))
+        self.assertParity(RaterSerializer(), Rater.objects.select_related('user'), rater_ids)
+
+    def test_fragments_of_missing_objects(self):
+        self.assertEqual(SongSerializer().render_fragments(get_song_queryset(), [ 404 ]), {})
+
+    def test_ratings(self):
+        rating_ids = [ 2, 1 ]
+        self.assertEqual(Rating.objects.count(), 2)
+
+        # songs are loaded as they are for song fragments, with their genres and sources in order
+        ratings = Rating.objects.prefetch_related(Prefetch('song', queryset=get_song_queryset())).in_bulk(rating_ids)
+        expected = RatingSerializer([ ratings[id] for id in rating_ids ], many=True).data
+
+        self.assertEqual(self._render(serialize_ratings(rating_ids + [ 404 ])), self._render(expected))
+
+    def test_lists(self):
+        list_ids = [ 2, 1 ]
+        self.assertEqual(List.objects.count(), 2)
+
+        lists = annotate_lists(List.objects.all()).in_bulk(list_ids)
+        expected = SimpleListSerializer([ lists[id] for id in list_ids ], many=True).data
+
+        self.assertEqual(self._render(serialize_simple_lists(list_ids)), self._render(expected))
+        self.assertEqual(expected[1]['fav_count'], 1)
+
+    def test_after_user_deleted(self):
+        """Objects of a deleted user are handed to the deleted rater"""
+        get_user_model().objects.get(username='bjork').delete()
+
+        self.assertParity(SongSerializer(), get_song_queryset(), [ 1, 2 ])
+        self.assertParity(ArtistSerializer(), get_artist_queryset(), [ 1, 2 ])
+
+    def assertParity(self, serializer, queryset, ids):
+        """Assert that a serializer renders the same fragments from rows as from instances"""
+        expected = CachedFragmentMixin.render_fragments(serializer, queryset, ids)
+        actual = serializer.render_fragments(queryset, ids)
+
+        self.assertEqual(sorted(actual), sorted(expected))
+        for id in ids:
+            self.assertEqual(self._render(actual[id]), self._render(expected[id]))
+
+    def _render(self, data):
+        return JSONRenderer().render(data)
+
+    def _register(self, username, first_name):
+        data = {
+            'username': username,
+            'email': f"{username}@gmail.com",
+            'password': 'test',
+            'first_name': first_name,
+            'last_name': 'Eckert',
+            'bio': 'I am just a cool boi.'
+        }
+
+        response = self.client.post('/register', data, format='json')
+        return json.loads(response.content)['token']
+
+    def _use_token(self, index):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.tokens[index])
+
+    def _post(self, url, data):
+        response = self.client.post(url, data, format='json')
+        self.assertLess(response.status_code, 300, response.content)
+        return response
@@ -1,11 +1,27 @@
+import base64
 import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from io import StringIO
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
-from rest_framework.test import APITestCase
-from rmmapi.models import Genre, Artist
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rmmapi.cache import genre_bitmap_index
+from rmmapi.models import Genre, Artist, Song, SongGenre
 
 class SongTests(APITestCase):
     def setUp(self):
         """Create an account, two genres, one artist"""
+        # the genre bitmaps outlive the test transaction, and are built from the rows of
+        # the test being run, so start each test from scratch
+        genre_bitmap_index.clear()
+
         data = {
             'username': 'jweckert17',
             'email': 'jweckert17@gmail.com',
@@ -95,6 +111,21 @@ class SongTests(APITestCase):
         error_message = json.loads(response.content)
         self.assertEqual(error_message['message'], "The genre id 666 does not match an existing genre.")
 
+    def test_create_song_duplicate_genre_ids(self):
+        data = {
+            'name': 'Save a Secret for the Moon',
+            'year': 1996,
+            'artist_id': 1,
+            'genre_ids': [ 1, 1 ],
+            'sources': [ { 'service': 'YouTube', 'url': 'https://www.youtube.com/watch?v=4rk_9cYOp8A', 'is_primary': True }]
+        }
+
+        response = self.client.post('/songs', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        error_message = json.loads(response.content)
+        self.assertEqual(error_message['message'], "`genreIds` array cannot contain any duplicate genre ids.")
+
     def test_create_song_empty_sources(self):
         data = {
             'name': 'Save a Secret for the Moon',
@@ -182,6 +213,29 @@ class SongTests(APITestCase):
         self.assertEqual(song['genres'][0]['genre']['name'], 'Indie Pop')
         self.assertEqual(song['sources'][0]['service'], 'YouTube')
 
+    def test_get_song_not_modified(self):
+        self.test_create_valid_song()
+
+        response = self.client.get('/songs/1')
+        etag = response['ETag']
+
+        response = self.client.get('/songs/1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        data = {
+            'name': 'Strange Powers',
+            'year': 1995,
+            'artist_id': 1,
+            'genre_ids': [ 1 ],
+            'sources': [ { 'service': 'YouTube', 'url': 'https://www.youtube.com/watch?v=8dNaXUwIeao', 'is_primary': True }]
+        }
+        self.client.put('/songs/1', data, format='json')
+
+        response = self.client.get('/songs/1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['name'], 'Strange Powers')
+
     def test_update_invalid_song_id(self):
         data = {
             'name': 'Strange Powers',
@@ -317,6 +371,19 @@ class SongTests(APITestCase):
         self.assertEqual(songs['data'][0]['name'], 'Save a Secret for the Moon')
         self.assertEqual(songs['data'][1]['name'], 'Baby')
 
+    @override_settings(RMM_COUNT_ESTIMATE_THRESHOLD=1)
+    def test_get_all_songs_estimated_count(self):
+        self.test_create_valid_song()
+        self._create_second_valid_song()
+
+        response = self.client.get('/songs?estimateCount=true')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        songs = json.loads(response.content)
+        self.assertEqual(songs['count'], 1)
+        self.assertTrue(songs['countIsEstimate'])
+        self.assertEqual(len(songs['data']), 2)
+
     def test_get_all_songs_with_start_year(self):
         self.test_create_valid_song()
         self._create_second_valid_song()
@@ -350,6 +417,18 @@ class SongTests(APITestCase):
         self.assertEqual(songs['count'], 1)
         self.assertEqual(songs['data'][0]['name'], 'Baby')
 
+    def test_get_all_songs_any_of_multiple_genres(self):
+        self.test_create_valid_song()
+        self._create_second_valid_song()
+
+        response = self.client.get('/songs?genres=1,2&genreMode=any')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        songs = json.loads(response.content)
+        self.assertEqual(songs['count'], 2)
+        self.assertEqual(songs['data'][0]['name'], 'Save a Secret for the Moon')
+        self.assertEqual(songs['data'][1]['name'], 'Baby')
+
     def test_get_all_songs_single_genre(self):
         self.test_create_valid_song()
         self._create_second_valid_song()
@@ -361,6 +440,29 @@ class SongTests(APITestCase):
         self.assertEqual(songs['count'], 1)
         self.assertEqual(songs['data'][0]['name'], 'Baby')
 
+    @override_settings(RMM_GENRE_BITMAP_MAX_CANDIDATES=0)
+    def test_get_all_songs_multiple_genres_without_bitmaps(self):
+        self.test_get_all_songs_multiple_genres()
+
+        response = self.client.get('/songs?genres=1,2&genreMode=any')
+        songs = json.loads(response.content)
+        self.assertEqual(songs['count'], 2)
+
+    def test_get_all_songs_by_genre_without_channel(self):
+        self.test_create_valid_song()
+
+        response = self.client.get('/songs?genres=2')
+        self.assertEqual(json.loads(response.content)['count'], 0)
+
+        # nothing commits inside the test transaction, so the genre bitmaps miss this
+        # write just as those of another worker would without the invalidation channel
+        SongGenre.objects.create(song_id=1, genre_id=2)
+
+        response = self.client.get('/songs?genres=2')
+        songs = json.loads(response.content)
+        self.assertEqual(songs['count'], 1)
+        self.assertEqual(songs['data'][0]['name'], 'Save a Secret for the Moon')
+
     def test_get_all_songs_by_artist(self):
         self.test_create_valid_song()
         self._create_second_valid_song()
@@ -449,10 +551,11 @@ class SongTests(APITestCase):
         response = self.client.get('/songs?orderBy=artist')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+        # "The Magnetic Fields" sorts as "magnetic fields", before "of Montreal"
         songs = json.loads(response.content)
         self.assertEqual(songs['count'], 2)
-        self.assertEqual(songs['data'][0]['name'], 'Baby')
-        self.assertEqual(songs['data'][1]['name'], 'Save a Secret for the Moon')
+        self.assertEqual(songs['data'][0]['name'], 'Save a Secret for the Moon')
+        self.assertEqual(songs['data'][1]['name'], 'Baby')
 
     def test_get_all_songs_ordered_by_artist_name_desc(self):
         self.test_create_valid_song()
@@ -463,8 +566,57 @@ class SongTests(APITestCase):
 
         songs = json.loads(response.content)
         self.assertEqual(songs['count'], 2)
-        self.assertEqual(songs['data'][0]['name'], 'Save a Secret for the Moon')
-        self.assertEqual(songs['data'][1]['name'], 'Baby')
+        self.assertEqual(songs['data'][0]['name'], 'Baby')
+        self.assertEqual(songs['data'][1]['name'], 'Save a Secret for the Moon')
+
+    def test_get_all_songs_ordered_by_normalized_name(self):
+        self.test_create_valid_song()
+        self._create_second_valid_song()
+
+        for name in [ 'the Zebra', 'ÉCLAIR', 'apple' ]:
+            data = {
+                'name': name,
+                'year': 1999,
+                'artist_id': 1,
+                'genre_ids': [ 1 ],
+                'sources': [ { 'service': 'YouTube', 'url': 'https://www.youtube.com/watch?v=4rk_9cYOp8A', 'is_primary': True }]
+            }
+            self.client.post('/songs', data, format='json')
+
+        response = self.client.get('/songs?orderBy=name')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        songs = json.loads(response.content)
+        self.assertEqual(
+            [ song['name'] for song in songs['data'] ],
+            [ 'apple', 'Baby', 'ÉCLAIR', 'Save a Secret for the Moon', 'the Zebra' ]
+        )
+
+        # the sort key is not part of the song or its nested artist
+        self.assertNotIn('sort_name', songs['data'][0])
+        self.assertNotIn('sort_name', songs['data'][0]['artist'])
+
+    def test_sort_name_follows_renamed_song(self):
+        self.test_create_valid_song()
+
+        song = Song.objects.get(pk=1)
+        self.assertEqual(song.sort_name, 'save a secret for the moon')
+
+        song.name = 'The Sort Key'
+        song.save(update_fields=[ 'name' ])
+        song.refresh_from_db()
+        self.assertEqual(song.sort_name, 'sort key')
+
+    def test_rebuild_sort_keys(self):
+        """Rows written without save(), like loaded fixtures, get their sort keys rebuilt"""
+        self.test_create_valid_song()
+        Song.objects.update(sort_name='')
+        Artist.objects.update(sort_name='')
+
+        call_command('rebuild_sort_keys', stdout=StringIO())
+
+        self.assertEqual(Song.objects.get(pk=1).sort_name, 'save a secret for the moon')
+        self.assertEqual(Artist.objects.get(pk=1).sort_name, 'magnetic fields')
 
     def test_get_all_songs_ordered_by_avg_rating_asc(self):
         # creates song id of 1 and two ratings -> avg rating of 4
@@ -532,6 +684,72 @@ class SongTests(APITestCase):
         self.assertEqual(songs['data'][1]['avg_rating'], 3)
         self.assertEqual(songs['data'][2]['avg_rating'], None)
 
+    def test_get_all_songs_by_cursor(self):
+        self.test_create_valid_song()
+        self._create_second_valid_song()
+
+        response = self.client.get('/songs?orderBy=name&direction=desc&pageSize=1&cursor=')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        songs = json.loads(response.content)
+        self.assertEqual(songs['count'], 2)
+        self.assertEqual(len(songs['data']), 1)
+        self.assertEqual(songs['data'][0]['name'], 'Save a Secret for the Moon')
+        self.assertIsNotNone(songs['next'])
+
+        response = self.client.get(f"/songs?orderBy=name&direction=desc&pageSize=1&cursor={songs['next']}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        songs = json.loads(response.content)
+        self.assertEqual(len(songs['data']), 1)
+        self.assertEqual(songs['data'][0]['name'], 'Baby')
+        self.assertIsNone(songs['next'])
+
+    def test_get_all_songs_by_cursor_ordered_by_avg_rating(self):
+        # creates songs with average ratings of null, 3, and 4
+        self.test_get_all_songs_ordered_by_avg_rating_asc()
+
+        for direction, expected_ratings in [ ('asc', [ None, 3, 4 ]), ('desc', [ 4, 3, None ]) ]:
+            ratings = []
+            cursor = ''
+            while cursor is not None:
+                response = self.client.get(f'/songs?orderBy=avgRating&direction={direction}&pageSize=1&cursor={cursor}')
+                songs = json.loads(response.content)
+                ratings += [ song['avg_rating'] for song in songs['data'] ]
+                cursor = songs['next']
+
+            self.assertEqual(ratings, expected_ratings)
+
+    def test_get_all_songs_by_invalid_cursor(self):
+        self.test_create_valid_song()
+        self._create_second_valid_song()
+
+        response = self.client.get('/songs?cursor=notacursor')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        songs = json.loads(response.content)
+        self.assertEqual(len(songs['data']), 2)
+        self.assertEqual(songs['data'][0]['name'], 'Save a Secret for the Moon')
+        self.assertIsNone(songs['next'])
+
+    def test_get_all_songs_by_cursor_of_another_order(self):
+        self.test_create_valid_song()
+        self._create_second_valid_song()
+
+        response = self.client.get('/songs?orderBy=name&pageSize=1&cursor=')
+        name_cursor = json.loads(response.content)['next']
+        forged_cursor = base64.urlsafe_b64encode(json.dumps([ 'abc', 1 ]).encode()).decode()
+
+        # a cursor whose key does not fit the year field returns the first page
+        for cursor in [ name_cursor, forged_cursor ]:
+            response = self.client.get(f'/songs?orderBy=year&pageSize=1&cursor={cursor}')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            songs = json.loads(response.content)
+            self.assertEqual(len(songs['data']), 1)
+            self.assertEqual(songs['data'][0]['year'], 1996)
+            self.assertIsNotNone(songs['next'])
+
     def test_avg_rating_with_no_ratings(self):
         self.test_create_valid_song()
 
@@ -597,6 +815,21 @@ class SongTests(APITestCase):
         song = json.loads(response.content)
         self.assertEqual(song['avg_rating'], 4)
 
+    def test_get_all_songs_query_count_does_not_grow_with_songs(self):
+        self.test_create_valid_song()
+
+        with CaptureQueriesContext(connection) as one_song_queries:
+            self.client.get('/songs')
+
+        self._create_second_valid_song()
+
+        with CaptureQueriesContext(connection) as two_song_queries:
+            response = self.client.get('/songs')
+
+        songs = json.loads(response.content)
+        self.assertEqual(songs['count'], 2)
+        self.assertEqual(len(two_song_queries), len(one_song_queries))
+
     def _create_second_valid_song(self):
         artist = Artist(
             name="of Montreal",
@@ -616,3 +849,114 @@ class SongTests(APITestCase):
         }
         response = self.client.post('/songs', data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+class SongGenreBitmapTests(APITransactionTestCase):
+    """Songs filtered by genre as the genres of songs change, outside of a transaction so
+    that the genre bitmaps are updated as the changes commit"""
+    reset_sequences = True
+
+    def setUp(self):
+        # the bitmaps are only used when writes reach the other workers
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        channel_settings = override_settings(RMM_INVALIDATION_CHANNEL=os.path.join(directory.name, 'channel'))
+        channel_settings.enable()
+        self.addCleanup(channel_settings.disable)
+
+        SongTests.setUp(self)
+
+    def test_get_all_songs_count_after_new_song(self):
+        SongTests.test_create_valid_song(self)
+
+        response = self.client.get('/songs?genres=1')
+        songs = json.loads(response.content)
+        self.assertEqual(songs['count'], 1)
+
+        SongTests._create_second_valid_song(self)
+
+        response = self.client.get('/songs?genres=1')
+        songs = json.loads(response.content)
+        self.assertEqual(songs['count'], 2)
+
+    def test_get_all_songs_by_genre_after_genres_change(self):
+        SongTests.test_create_valid_song(self)
+
+        # build the genre bitmaps before the song changes
+        response = self.client.get('/songs?genres=1')
+        self.assertEqual(json.loads(response.content)['count'], 1)
+
+        data = {
+            'name': 'Strange Powers',
+            'year': 1995,
+            'artist_id': 1,
+            'genre_ids': [ 2 ],
+            'sources': [ { 'service': 'YouTube', 'url': 'https://www.youtube.com/watch?v=8dNaXUwIeao', 'is_primary': True }]
+        }
+
+        response = self.client.put('/songs/1', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get('/songs?genres=1')
+        self.assertEqual(json.loads(response.content)['count'], 0)
+
+        response = self.client.get('/songs?genres=2')
+        songs = json.loads(response.content)
+        self.assertEqual(songs['count'], 1)
+        self.assertEqual(songs['data'][0]['name'], 'Strange Powers')
+
+    def test_get_all_songs_by_genre_after_delete(self):
+        SongTests.test_create_valid_song(self)
+
+        response = self.client.get('/songs?genres=1')
+        self.assertEqual(json.loads(response.content)['count'], 1)
+
+        response = self.client.delete('/songs/1')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.get('/songs?genres=1')
+        self.assertEqual(json.loads(response.content)['count'], 0)
+
+    def test_genre_bitmaps_after_rollback(self):
+        SongTests.test_create_valid_song(self)
+
+        # build the genre bitmaps before the rolled back change
+        response = self.client.get('/songs?genres=2')
+        self.assertEqual(json.loads(response.content)['count'], 0)
+
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                SongGenre.objects.create(song_id=1, genre_id=2)
+                SongGenre.objects.filter(song_id=1, genre_id=1).delete()
+                raise DatabaseError('rolled back')
+
+        response = self.client.get('/songs?genres=2')
+        self.assertEqual(json.loads(response.content)['count'], 0)
+
+        response = self.client.get('/songs?genres=1')
+        self.assertEqual(json.loads(response.content)['count'], 1)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite' and hasattr(sqlite3.Connection, 'setlimit'),
+                         'needs to lower the SQLite limit on query parameters')
+    def test_get_all_songs_by_genre_at_query_parameter_limit(self):
+        SongTests.test_create_valid_song(self)
+
+        # builds of SQLite before 3.32 take at most 999 parameters per query
+        connection.ensure_connection()
+        connection.connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        self.addCleanup(connection.close)
+
+        # one genre with 1000 songs, bulk created without signals, so rebuild the bitmaps
+        Song.objects.bulk_create([
+            Song(id=song_id, name=f"Song {song_id}", year=1996, artist_id=1, creator_id=1, created_at=timezone.now())
+            for song_id in range(2, 1001)
+        ])
+        SongGenre.objects.bulk_create([ SongGenre(song_id=song_id, genre_id=1) for song_id in range(2, 1001) ])
+        genre_bitmap_index.clear()
+
+        response = self.client.get('/songs?genres=1&startYear=1990&endYear=2000&artist=1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['count'], 1000)
+
+        response = self.client.get('/songs?genres=1&genreMode=any&orderBy=name&cursor=')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['count'], 1000)
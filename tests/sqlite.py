@@ -0,0 +1,55 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import skipUnless
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+
+@skipUnless(connection.vendor == 'sqlite', 'PRAGMAs are only applied to SQLite connections')
+class SQLiteTests(TestCase):
+    def test_pragmas_applied_to_connection(self):
+        with connection.cursor() as cursor:
+            for pragma, expected in [ ('busy_timeout', 5000), ('synchronous', 1), ('temp_store', 2), ('cache_size', -65536) ]:
+                cursor.execute(f"PRAGMA {pragma}")
+                self.assertEqual(cursor.fetchone()[0], expected, pragma)
+
+    def test_pragmas_applied_to_new_file_database(self):
+        """A new connection to a database file switches it to WAL with incremental vacuum"""
+        with tempfile.TemporaryDirectory() as directory:
+            journal_mode, auto_vacuum = self._get_new_connection_pragmas(os.path.join(directory, 'db.sqlite3'))
+
+        self.assertEqual(journal_mode, 'wal')
+        self.assertEqual(auto_vacuum, 2)
+
+    @override_settings(RMM_SQLITE_PRAGMAS=None)
+    def test_pragmas_disabled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            journal_mode, auto_vacuum = self._get_new_connection_pragmas(os.path.join(directory, 'db.sqlite3'))
+
+        self.assertEqual(journal_mode, 'delete')
+        self.assertEqual(auto_vacuum, 0)
+
+    def test_optimize_database(self):
+        out = StringIO()
+        call_command('optimize_database', stdout=out)
+        self.assertIn('Analyzed and optimized the database', out.getvalue())
+
+        # ANALYZE stored statistics for the query planner
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def _get_new_connection_pragmas(self, path):
+        default = connections['default']
+        new_connection = default.__class__({ **default.settings_dict, 'NAME': path }, alias='pragmas')
+        try:
+            with new_connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+                cursor.execute('PRAGMA auto_vacuum')
+                auto_vacuum = cursor.fetchone()[0]
+        finally:
+            new_connection.close()
+
+        return journal_mode, auto_vacuum
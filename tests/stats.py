@@ -1,7 +1,15 @@
+import datetime
 import json
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
-from rmmapi.models import Genre
+from rmmapi.models import Artist, Genre, SiteStats, SiteStatsSnapshot
 
 class StatsTests(APITestCase):
     def setUp(self):
@@ -33,6 +41,24 @@ class StatsTests(APITestCase):
         self.assertEqual(stats['songs'], 0)
         self.assertEqual(stats['lists'], 0)
 
+    def test_get_stats_not_modified(self):
+        response = self.client.get('/stats')
+        etag = response['ETag']
+
+        response = self.client.get('/stats', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        data = {
+            'name': 'The Magnetic Fields',
+            'founded_year': 1990,
+            'description': 'An amazing band.'
+        }
+        self.client.post('/artists', data, format='json')
+
+        response = self.client.get('/stats', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['artists'], 1)
+
     def test_get_populated_stats(self):
         # create two artists
         data = {
@@ -96,4 +122,98 @@ class StatsTests(APITestCase):
         self.assertEqual(stats['artists'], 2)
         self.assertEqual(stats['songs'], 1)
         self.assertEqual(stats['lists'], 3)
-        
\ No newline at end of file
+        
+
+    def test_get_stats_reads_one_row(self):
+        self.client.get('/stats')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/stats')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stats_queries = [ query for query in queries.captured_queries if 'rmmapi_sitestats' in query['sql'] ]
+        self.assertEqual(len(stats_queries), 1)
+        self.assertFalse(any('COUNT' in query['sql'] for query in queries.captured_queries))
+
+    def test_get_stats_after_delete(self):
+        data = {
+            'name': 'The Magnetic Fields',
+            'founded_year': 1990,
+            'description': 'An amazing band.'
+        }
+        self.client.post('/artists', data, format='json')
+        self.client.delete('/artists/1')
+
+        response = self.client.get('/stats')
+        stats = json.loads(response.content)
+        self.assertEqual(stats['artists'], 0)
+
+    def test_get_stats_with_history(self):
+        today = timezone.localdate()
+        for days_ago, artists in [ (40, 1), (2, 2), (1, 3) ]:
+            SiteStatsSnapshot.objects.create(
+                date=today - datetime.timedelta(days=days_ago),
+                users=1,
+                artists=artists,
+                songs=0,
+                lists=0
+            )
+
+        response = self.client.get('/stats?history=30')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        stats = json.loads(response.content)
+        self.assertEqual(len(stats['history']), 2)
+        self.assertEqual(stats['history'][0]['date'], str(today - datetime.timedelta(days=2)))
+        self.assertEqual(stats['history'][0]['artists'], 2)
+        self.assertEqual(stats['history'][1]['artists'], 3)
+
+        response = self.client.get('/stats')
+        self.assertNotIn('history', json.loads(response.content))
+
+    def test_get_stats_with_history_not_modified(self):
+        response = self.client.get('/stats?history=30')
+        etag = response['ETag']
+
+        response = self.client.get('/stats?history=30', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # a snapshot recorded by reconcile_stats, e.g. from another process, changes it
+        call_command('reconcile_stats', stdout=StringIO())
+
+        response = self.client.get('/stats?history=30', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(json.loads(response.content)['history']), 1)
+        etag = response['ETag']
+
+        # and so does the window of the history moving on at midnight
+        tomorrow = timezone.localdate() + datetime.timedelta(days=1)
+        with patch.object(timezone, 'localdate', return_value=tomorrow):
+            response = self.client.get('/stats?history=30', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_get_stats_changed_without_signals(self):
+        response = self.client.get('/stats')
+        etag = response['ETag']
+
+        # as by a write handled by another worker, whose signals this process never sees
+        SiteStats.objects.update(artists=5)
+
+        response = self.client.get('/stats', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['artists'], 5)
+
+    def test_reconcile_stats_command(self):
+        # bulk creates do not send post_save, so the counts drift
+        Artist.objects.bulk_create([
+            Artist(name='The Magnetic Fields', founded_year=1990, description='An amazing band.', creator_id=1)
+        ])
+
+        with self.assertRaises(CommandError):
+            call_command('reconcile_stats', '--check', stdout=StringIO())
+
+        call_command('reconcile_stats', stdout=StringIO())
+
+        self.assertEqual(SiteStats.get().artists, 1)
+        self.assertEqual(SiteStatsSnapshot.objects.get(date=timezone.localdate()).artists, 1)
+        call_command('reconcile_stats', '--check', stdout=StringIO())